@@ -1,3 +1,4 @@
+import multiprocessing
 import flet as ft
 from src.app import App
 
@@ -19,6 +20,8 @@ def main(page: ft.Page) -> None:
         Catches close event and handles app exit correctly.
         """
         if e.data == "close":
+            app.jobs.shutdown()
+            app.thumbnails.shutdown()
             page.window.prevent_close = False
             page.window.close()
 
@@ -32,4 +35,6 @@ def main(page: ft.Page) -> None:
         sys.exit(1)
 
 if __name__ == "__main__":
+    # Required for the conversion process pool in the frozen .exe build
+    multiprocessing.freeze_support()
     ft.app(target=main)
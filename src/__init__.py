@@ -1,5 +1,28 @@
-from .app import App
-from .utils import filename_format_separator, convert, resource_path
+from typing import Any
 
+# Attributes are imported on first access so that headless use
+# ("from src import convert", "python -m src") never pays for Flet.
+_LAZY_ATTRS = {
+    "App": ".app",
+    "BatchResult": ".utils",
+    "ImageCache": ".cache",
+    "combine_pdf": ".pdf",
+    "filename_format_separator": ".utils",
+    "convert": ".utils",
+    "convert_archive": ".archives",
+    "convert_batch": ".utils",
+    "convert_fanout": ".utils",
+    "resource_path": ".utils",
+}
 
-__all__ = ["App", "filename_format_separator", "convert", "resource_path"]
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_ATTRS:
+        from importlib import import_module
+        value = getattr(import_module(_LAZY_ATTRS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["App", "BatchResult", "ImageCache", "combine_pdf", "filename_format_separator", "convert", "convert_archive", "convert_batch", "convert_fanout", "resource_path"]
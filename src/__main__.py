@@ -0,0 +1,7 @@
+import sys
+from .cli import main
+
+# Allows "python -m src in/ out/ --to webp" without starting the GUI
+
+if __name__ == "__main__":
+    sys.exit(main())
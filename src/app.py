@@ -1,6 +1,17 @@
+import os
 import flet as ft
-from typing import Optional, List, Tuple
-from .utils import filename_format_separator, convert, resource_path
+from queue import Full
+from typing import Any, Callable, Optional, List, Tuple
+from .formats import TO_FORMATS
+from .cache import ImageCache
+from .metrics import STAGES, MetricsSummary, add_hook
+from .preview import PreviewGrid
+from .thumbnails import ThumbnailCache
+from .jobs import Job, JobQueue, JobStatus, batch_job, convert_job, fanout_job, pdf_job
+from .pdf import PdfResult
+from .presets import PRESETS
+from .updates import ProgressModel, UpdateCoalescer
+from .utils import BatchResult, dedupe_report, filename_format_separator, resource_path
 
 
 class App:
@@ -48,13 +59,36 @@ class App:
         self.shadow_color: str = ft.Colors.with_opacity(0.1, ft.Colors.BLACK)
         
         # Supported Formats
-        self.to_formats: List[str] = [
-            "PNG", "JPEG", "JPG", "BMP", "GIF", "TIFF", "ICO", "ICNS", "WEBP", "PPM",
-            "PGM", "PBM", "PNM", "TGA", "DDS", "PCX", "IM", "MPO", "PFM", "SGI", "PDF",
-        ]
+        self.to_formats: List[str] = list(TO_FORMATS)
+        self.resize_options: List[int] = [3840, 2560, 1920, 1280, 800, 400]
+        # File size budgets of JPEG and WEBP outputs, in KB
+        self.target_size_options: List[int] = [1000, 500, 200, 100, 50]
 
         # State
         self.input_file: Optional[Tuple[str, Optional[str], str]] = None
+        self.input_files: List[Tuple[str, Optional[str], str]] = []
+
+        # UI changes are sent in batches at a capped frame rate, so bursts of
+        # events cost one round trip to the client per frame, not one each
+        self.updates = UpdateCoalescer(lambda controls: self.page.update(*controls))
+        # Throughput and time left of the job shown in the progress bar
+        self.progress = ProgressModel()
+        self.progress_job_id: Optional[int] = None
+
+        # Background conversions, so UI callbacks never block on Pillow
+        self.jobs = JobQueue(workers=2, max_pending=16)
+        self.jobs.subscribe(self.on_job_update)
+
+        # Decoded sources, so converting the same file again skips decoding
+        self.image_cache = ImageCache()
+
+        # Previews of multi-file selections, cached on disk between runs
+        self.thumbnails = ThumbnailCache()
+        self.preview_grid = PreviewGrid(self.thumbnails, self.updates)
+
+        # Per-stage conversion metrics, aggregated for the statistics panel
+        self.metrics_summary = MetricsSummary()
+        add_hook(self.metrics_summary)
 
         # UI Components Initialization
         self.selected_file_text = ft.Text(
@@ -95,13 +129,83 @@ class App:
             enable_filter=True,
         )
         
+        # Flet's Dropdown is single select, so additional targets are
+        # toggled in a checkable menu next to it
+        self.extra_formats_button = ft.PopupMenuButton(
+            icon=ft.Icons.LIBRARY_ADD,
+            icon_color=self.icon_color,
+            tooltip="Also convert to...",
+            items=[
+                ft.PopupMenuItem(text=fmt, checked=False, on_click=self.on_extra_format_toggle)
+                for fmt in self.to_formats
+            ],
+        )
+        
+        # Longest side of the output; None keeps the original size
+        self.max_size: Optional[int] = None
+        self.resize_button = ft.PopupMenuButton(
+            icon=ft.Icons.PHOTO_SIZE_SELECT_LARGE,
+            icon_color=self.icon_color,
+            tooltip="Resize: original size",
+            items=[
+                ft.PopupMenuItem(text="Original size", checked=True, data=None, on_click=self.on_resize_select)
+            ] + [
+                ft.PopupMenuItem(text=f"Fit in {size} px", checked=False, data=size, on_click=self.on_resize_select)
+                for size in self.resize_options
+            ],
+        )
+        
+        # File size budget of JPEG and WEBP outputs in bytes; None keeps
+        # the encoder's default quality
+        self.target_size: Optional[int] = None
+        self.target_size_button = ft.PopupMenuButton(
+            icon=ft.Icons.COMPRESS,
+            icon_color=self.icon_color,
+            tooltip="File size: default quality",
+            items=[
+                ft.PopupMenuItem(text="Default quality", checked=True, data=None, on_click=self.on_target_size_select)
+            ] + [
+                ft.PopupMenuItem(text=f"Under {size} KB", checked=False, data=size * 1024, on_click=self.on_target_size_select)
+                for size in self.target_size_options
+            ],
+        )
+        
+        # Encoder effort, one of PRESETS; None keeps the encoder defaults
+        self.preset: Optional[str] = None
+        self.preset_button = ft.PopupMenuButton(
+            icon=ft.Icons.SPEED,
+            icon_color=self.icon_color,
+            tooltip="Encoder: defaults",
+            items=[
+                ft.PopupMenuItem(text="Encoder defaults", checked=True, data=None, on_click=self.on_preset_select)
+            ] + [
+                ft.PopupMenuItem(text=preset.capitalize(), checked=False, data=preset, on_click=self.on_preset_select)
+                for preset in PRESETS
+            ],
+        )
+        
+        # Page order when several files are combined into one PDF;
+        # None writes one PDF per file
+        self.pdf_order: Optional[str] = None
+        self.pdf_button = ft.PopupMenuButton(
+            icon=ft.Icons.PICTURE_AS_PDF,
+            icon_color=self.icon_color,
+            tooltip="PDF: one file per image",
+            items=[
+                ft.PopupMenuItem(text="One file per image", checked=True, data=None, on_click=self.on_pdf_select),
+                ft.PopupMenuItem(text="One PDF, selection order", checked=False, data="selection", on_click=self.on_pdf_select),
+                ft.PopupMenuItem(text="One PDF, sorted by name", checked=False, data="name", on_click=self.on_pdf_select),
+            ],
+        )
+        
         self.file_picker = ft.FilePicker(on_result=self.on_file_result)
         self.save_file_picker = ft.FilePicker(on_result=self.on_save_result)
+        self.folder_picker = ft.FilePicker(on_result=self.on_folder_result)
         
         self.file_picker_button = ft.ElevatedButton(
-            "Choose File",
+            "Choose Files",
             icon=ft.Icons.UPLOAD_FILE,
-            on_click=lambda _: self.file_picker.pick_files(allow_multiple=False),
+            on_click=lambda _: self.file_picker.pick_files(allow_multiple=True),
             bgcolor=self.button_bg_color,
             color=self.button_color,
             width=180,
@@ -128,6 +232,23 @@ class App:
             )
         )
         
+        self.progress_bar = ft.ProgressBar(
+            width=410,
+            value=0,
+            color=self.primary_color,
+            visible=False
+        )
+
+        self.job_status_text = ft.Text("", color=self.text_color, size=14)
+
+        self.cancel_button = ft.IconButton(
+            icon=ft.Icons.CANCEL,
+            icon_color=self.icon_color,
+            tooltip="Cancel conversions",
+            on_click=self.on_cancel,
+            visible=False
+        )
+        
         self.reset_button = ft.IconButton(
             icon=ft.Icons.REFRESH,
             icon_color=self.icon_color,
@@ -136,6 +257,14 @@ class App:
             on_click=self.reset_state
         )
         
+        self.stats_button = ft.IconButton(
+            icon=ft.Icons.INSIGHTS,
+            icon_color=self.icon_color,
+            icon_size=50,
+            tooltip="Conversion statistics",
+            on_click=self.show_stats
+        )
+        
         self.theme_button = ft.IconButton(
             icon=ft.Icons.LIGHT_MODE,
             icon_color=self.icon_color,
@@ -158,15 +287,36 @@ class App:
         Resets the application state to default values.
         """
         self.input_file = None
+        self.input_files = []
         self.selected_file_text.value = "No file selected"
         self.txt_from.value = "FROM: NAN"
         self.dd.value = "PNG"
         self.txt_to.value = "TO: PNG"
+        for item in self.extra_formats_button.items:
+            item.checked = False
+        self.max_size = None
+        for item in self.resize_button.items:
+            item.checked = item.data is None
+        self.resize_button.tooltip = "Resize: original size"
+        self.target_size = None
+        for item in self.target_size_button.items:
+            item.checked = item.data is None
+        self.target_size_button.tooltip = "File size: default quality"
+        self.preset = None
+        for item in self.preset_button.items:
+            item.checked = item.data is None
+        self.preset_button.tooltip = "Encoder: defaults"
+        self.pdf_order = None
+        for item in self.pdf_button.items:
+            item.checked = item.data is None
+        self.pdf_button.tooltip = "PDF: one file per image"
+        self.preview_grid.clear()
         
-        self.selected_file_text.update()
-        self.txt_from.update()
-        self.dd.update()
-        self.txt_to.update()
+        self.updates.mark(
+            self.selected_file_text, self.txt_from, self.dd, self.txt_to, self.extra_formats_button,
+            self.resize_button, self.target_size_button, self.preset_button, self.pdf_button,
+            self.preview_grid.grid,
+        )
 
     def theme_switch(self, e: ft.ControlEvent) -> None:
         """
@@ -208,6 +358,16 @@ class App:
         # Update UI Elements
         self.theme_button.icon_color = self.icon_color
         self.reset_button.icon_color = self.icon_color
+        self.stats_button.icon_color = self.icon_color
+        self.extra_formats_button.icon_color = self.icon_color
+        self.resize_button.icon_color = self.icon_color
+        self.target_size_button.icon_color = self.icon_color
+        self.preset_button.icon_color = self.icon_color
+        self.pdf_button.icon_color = self.icon_color
+        self.preview_grid.set_border_color(self.icon_color)
+        self.cancel_button.icon_color = self.icon_color
+        self.progress_bar.color = self.primary_color
+        self.job_status_text.color = self.text_color
         self.txt_from.color = self.primary_color
         self.txt_to.color = self.primary_color
         self.selected_file_text.color = self.text_color
@@ -251,56 +411,153 @@ class App:
         if self.target_format_label:
             self.target_format_label.color = self.text_color
         
-        self.page.update()
+        self.updates.mark(self.page)
 
     def on_format_change(self, e: ft.ControlEvent) -> None:
         """
         Updates the 'TO' text when the dropdown selection changes.
         """
-        self.txt_to.value = f"TO: {self.dd.value}"
-        self.txt_to.update()
+        formats = self.selected_formats()
+        extra = f" +{len(formats) - 1}" if len(formats) > 1 else ""
+        self.txt_to.value = f"TO: {formats[0]}{extra}"
+        self.updates.mark(self.txt_to)
+
+    def on_extra_format_toggle(self, e: ft.ControlEvent) -> None:
+        """
+        Toggles an additional target format.
+        """
+        e.control.checked = not e.control.checked
+        self.updates.mark(self.extra_formats_button)
+        self.on_format_change(e)
+
+    def on_resize_select(self, e: ft.ControlEvent) -> None:
+        """
+        Sets the maximum output size from the resize menu.
+        """
+        self.max_size = e.control.data
+        for item in self.resize_button.items:
+            item.checked = item is e.control
+        self.resize_button.tooltip = f"Resize: {e.control.text.lower()}"
+        self.updates.mark(self.resize_button)
+
+    def on_target_size_select(self, e: ft.ControlEvent) -> None:
+        """
+        Sets the file size budget of JPEG and WEBP outputs from the file size menu.
+        """
+        self.target_size = e.control.data
+        for item in self.target_size_button.items:
+            item.checked = item is e.control
+        self.target_size_button.tooltip = f"File size: {e.control.text.lower()}"
+        self.updates.mark(self.target_size_button)
+
+    def on_preset_select(self, e: ft.ControlEvent) -> None:
+        """
+        Sets the encoder preset from the encoder menu.
+        """
+        self.preset = e.control.data
+        for item in self.preset_button.items:
+            item.checked = item is e.control
+        self.preset_button.tooltip = f"Encoder: {e.control.text.lower()}"
+        self.updates.mark(self.preset_button)
+
+    def on_pdf_select(self, e: ft.ControlEvent) -> None:
+        """
+        Sets whether and in which order PDF outputs are combined into one file.
+        """
+        self.pdf_order = e.control.data
+        for item in self.pdf_button.items:
+            item.checked = item is e.control
+        self.pdf_button.tooltip = f"PDF: {e.control.text.lower()}"
+        self.updates.mark(self.pdf_button)
+
+    def combining_pdf(self) -> bool:
+        """
+        Whether the selected files are to be combined into one PDF.
+        """
+        return bool(self.pdf_order) and len(self.input_files) > 1 and self.selected_formats() == ["PDF"]
+
+    def pdf_pages(self) -> List[str]:
+        """
+        Returns the selected file paths in the chosen page order.
+        """
+        paths = [path for _, _, path in self.input_files]
+        if self.pdf_order == "name":
+            paths.sort(key=lambda path: os.path.basename(path).lower())
+        return paths
+
+    def selected_formats(self) -> List[str]:
+        """
+        Returns the dropdown format followed by any checked additional formats.
+        """
+        formats = [self.dd.value]
+        for item in self.extra_formats_button.items:
+            if item.checked and item.text not in formats:
+                formats.append(item.text)
+        return formats
 
     def on_file_result(self, e: ft.FilePickerResultEvent) -> None:
         """
         Handles the result of the file picker dialog.
         """
         if e.files:
-            file = e.files[0]
-            name, ext = filename_format_separator(file.name)
-            path = file.path
-            self.input_file = (name, ext, path)
-            
-            # Truncate filename if too long
-            display_name = file.name if len(file.name) < 20 else file.name[:17] + "..."
-            self.selected_file_text.value = f"Selected: {display_name}"
-            
-            if ext:
-                self.txt_from.value = f"FROM: {ext.upper()}"
+            self.input_files = [
+                (*filename_format_separator(file.name), file.path) for file in e.files
+            ]
+            self.input_file = self.input_files[0]
+
+            if len(e.files) == 1:
+                file = e.files[0]
+                # Truncate filename if too long
+                display_name = file.name if len(file.name) < 20 else file.name[:17] + "..."
+                self.selected_file_text.value = f"Selected: {display_name}"
+            else:
+                self.selected_file_text.value = f"Selected: {len(e.files)} files"
+
+            if len(e.files) > 1:
+                self.preview_grid.show([path for _, _, path in self.input_files])
+            else:
+                self.preview_grid.clear()
+                self.updates.mark(self.preview_grid.grid)
+
+            exts = {ext for _, ext, _ in self.input_files}
+            if len(exts) > 1:
+                self.txt_from.value = "FROM: MIXED"
+            elif self.input_file[1]:
+                self.txt_from.value = f"FROM: {self.input_file[1].upper()}"
             else:
                 self.txt_from.value = "FROM: NAN"
             
-            self.selected_file_text.update()
-            self.txt_from.update()
+            self.updates.mark(self.selected_file_text, self.txt_from)
         else:
             self.input_file = None
+            self.input_files = []
             self.selected_file_text.value = "No file selected"
             self.txt_from.value = "FROM: NAN"
-            self.selected_file_text.update()
-            self.txt_from.update()
+            self.updates.mark(self.selected_file_text, self.txt_from)
 
     def on_convert(self, e: ft.ControlEvent) -> None:
         """
         Initiates the conversion process.
         """
         if not self.input_file:
-            snack_bar = ft.SnackBar(content=ft.Text("Please select a file first!"))
-            self.page.overlay.append(snack_bar)
-            snack_bar.open = True
-            self.page.update()
+            self.show_snack_bar("Please select a file first!")
             return
         
         target_format = self.dd.value
         name, ext, path = self.input_file
+
+        if self.combining_pdf():
+            self.save_file_picker.save_file(
+                dialog_title="Save Combined PDF",
+                file_name=f"{name}.pdf",
+                allowed_extensions=["pdf"]
+            )
+            return
+
+        if len(self.input_files) > 1 or len(self.selected_formats()) > 1:
+            # Several outputs: ask for an output folder instead of a file name
+            self.folder_picker.get_directory_path(dialog_title="Choose Output Folder")
+            return
         
         # Open save dialog
         self.save_file_picker.save_file(
@@ -311,30 +568,212 @@ class App:
 
     def on_save_result(self, e: ft.FilePickerResultEvent) -> None:
         """
-        Handles the result of the save file dialog and performs the conversion.
+        Handles the result of the save file dialog and queues the conversion.
         """
-        if e.path:
+        if e.path and self.combining_pdf():
+            self.submit_job(
+                pdf_job, self.pdf_pages(), e.path, self.max_size,
+                description=f"{len(self.input_files)} files to {os.path.basename(e.path)}",
+            )
+        elif e.path:
             name, ext, path = self.input_file
-            try:
-                img = convert(name, ext, path)
-                img.save(e.path)
-                
-                snack_bar = ft.SnackBar(
-                    content=ft.Text(f"Success! Saved to {e.path}"),
-                    bgcolor="green"
-                )
-                self.page.overlay.append(snack_bar)
-                snack_bar.open = True
-                self.page.update()
-
-            except Exception as ex:
-                snack_bar = ft.SnackBar(
-                    content=ft.Text(f"Error: {ex}"),
-                    bgcolor="red"
-                )
-                self.page.overlay.append(snack_bar)
-                snack_bar.open = True
-                self.page.update()
+            self.submit_job(
+                convert_job, path, self.dd.value, e.path, self.image_cache, self.max_size, self.target_size,
+                self.preset, description=f"{name}.{self.dd.value.lower()}",
+            )
+
+    def on_folder_result(self, e: ft.FilePickerResultEvent) -> None:
+        """
+        Handles the result of the output folder dialog and queues conversion of all selected files.
+        """
+        if not e.path:
+            return
+        formats = self.selected_formats()
+        if len(self.input_files) == 1:
+            # Decode once, encode every selected format concurrently
+            name, ext, path = self.input_file
+            self.submit_job(
+                fanout_job, path, formats, e.path, self.image_cache, self.max_size, self.target_size,
+                self.preset, description=f"{name} to {', '.join(formats)}",
+            )
+        else:
+            self.submit_job(
+                batch_job, [path for _, _, path in self.input_files], formats, e.path, None, self.max_size,
+                self.target_size, self.preset,
+                description=f"{len(self.input_files)} files to {', '.join(formats)}",
+            )
+
+    def submit_job(self, fn: Callable[..., Any], *args: Any, description: str = "") -> None:
+        """
+        Submits a job to the background queue, reporting a full queue to the user.
+        """
+        try:
+            self.jobs.submit(fn, *args, description=description)
+        except Full:
+            self.show_snack_bar("Too many conversions queued, please wait.", "red")
+
+    def on_job_update(self, job: Job) -> None:
+        """
+        Reflects background job changes in the UI. Runs on a worker thread,
+        for every file of a batch, so progress is only rendered once per frame.
+        """
+        self.updates.schedule(self.render_progress)
+        if not job.finished:
+            return
+        if job.status == JobStatus.DONE:
+            if isinstance(job.result, list):
+                self.show_batch_summary(job.result)
+            elif isinstance(job.result, PdfResult):
+                self.show_pdf_summary(job.result)
+            else:
+                self.show_snack_bar(f"Success! Saved to {job.result}", "green")
+        elif job.status == JobStatus.FAILED:
+            self.show_snack_bar(f"Error: {job.error}", "red")
+        else:
+            self.show_snack_bar(f"Cancelled {job.description}")
+        self.jobs.clear_finished()
+
+    def render_progress(self) -> List[ft.Control]:
+        """
+        Sets the progress bar and status line from the current jobs.
+        Runs on the update thread before each frame.
+        """
+        active = [j for j in self.jobs.jobs if not j.finished]
+        self.progress_bar.visible = bool(active)
+        self.cancel_button.visible = bool(active)
+        if active:
+            current = active[0]
+            if current.id != self.progress_job_id:
+                self.progress.reset()
+                self.progress_job_id = current.id
+            if current.total:
+                snapshot = self.progress.observe(current.done, current.total, current.failed)
+                self.progress_bar.value = snapshot.fraction
+                status = snapshot.describe()
+            else:
+                self.progress_bar.value = current.progress
+                status = current.message or current.status.value
+            self.job_status_text.value = (
+                f"{current.description}: {status}"
+                + (f" (+{len(active) - 1} queued)" if len(active) > 1 else "")
+            )
+        else:
+            self.job_status_text.value = ""
+        return [self.progress_bar, self.job_status_text, self.cancel_button]
+
+    def on_cancel(self, e: ft.ControlEvent) -> None:
+        """
+        Cancels all queued and running conversions.
+        """
+        self.jobs.cancel_all()
+
+    def show_batch_summary(self, results: List[BatchResult]) -> None:
+        """
+        Shows a snack bar summarizing a batch conversion.
+        """
+        failed = [result for result in results if result.error]
+        if failed:
+            first = failed[0]
+            message = (
+                f"Converted {len(results) - len(failed)}/{len(results)} files. "
+                f"{len(failed)} failed, e.g. {first.source}: {first.error}"
+            )
+        else:
+            message = f"Success! Converted {len(results)} files"
+        report = dedupe_report(results)
+        if report.duplicates:
+            message += f" ({report.duplicates} duplicate inputs converted once)"
+        self.show_snack_bar(message, "red" if failed else "green")
+
+    def show_pdf_summary(self, result: PdfResult) -> None:
+        """
+        Shows a snack bar summarizing a combined PDF.
+        """
+        message = (
+            f"Saved {result.pages} pages to {result.output} "
+            f"({result.pages_per_second:.1f} pages/s)"
+        )
+        if result.errors:
+            source, error = result.errors[0]
+            message += f". {len(result.errors)} files skipped, e.g. {source}: {error}"
+        self.show_snack_bar(message, "red" if result.errors else "green")
+
+    def show_stats(self, e: ft.ControlEvent) -> None:
+        """
+        Shows average per-stage timings and output sizes for each source/target
+        format pair and encoder preset, the decoded image cache usage and the
+        time spent updating the UI.
+        """
+        rows = self.metrics_summary.rows()
+        cache = self.image_cache.stats()
+        updates = self.updates.stats()
+        busy = self.jobs.busy_seconds
+        if not rows and not cache.hits + cache.misses:
+            self.show_snack_bar("No conversions measured yet.")
+            return
+
+        table = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("From → To")),
+                ft.DataColumn(ft.Text("Encoder")),
+                ft.DataColumn(ft.Text("Files"), numeric=True),
+            ]
+            + [ft.DataColumn(ft.Text(f"{stage} ms"), numeric=True) for stage in STAGES]
+            + [
+                ft.DataColumn(ft.Text("MP/s"), numeric=True),
+                ft.DataColumn(ft.Text("Peak MB"), numeric=True),
+                ft.DataColumn(ft.Text("Output KB"), numeric=True),
+            ],
+            rows=[
+                ft.DataRow(cells=[
+                    ft.DataCell(ft.Text(f"{row.source_format} → {row.target_format}")),
+                    ft.DataCell(ft.Text(row.preset or "defaults")),
+                    ft.DataCell(ft.Text(str(row.count))),
+                    *[ft.DataCell(ft.Text(f"{row.stage_wall.get(stage, 0) * 1000:.1f}")) for stage in STAGES],
+                    ft.DataCell(ft.Text(f"{row.megapixels_per_second:.1f}")),
+                    ft.DataCell(ft.Text(f"{row.peak_memory / 2**20:.0f}" if row.peak_memory else "-")),
+                    ft.DataCell(ft.Text(f"{row.output_bytes / 1024:.0f}" if row.output_bytes else "-")),
+                ])
+                for row in rows
+            ],
+        )
+        dialog = ft.AlertDialog(
+            title=ft.Text("Conversion statistics"),
+            content=ft.Column([
+                ft.Text(
+                    f"Decoded image cache: {cache.entries} images, "
+                    f"{cache.bytes / 2**20:.0f}/{cache.max_bytes / 2**20:.0f} MB, "
+                    f"hit rate {cache.hit_rate:.0%} ({cache.hits} hits, {cache.misses} misses, {cache.evictions} evicted)"
+                ),
+                ft.Text(
+                    f"UI updates: {updates.events} changes sent in {updates.frames} frames, "
+                    f"{updates.cpu_seconds * 1000:.0f} ms CPU"
+                    + (f" ({updates.cpu_seconds / busy:.1%} of {busy:.1f} s converting)" if busy else "")
+                ),
+                ft.Row([table], scroll=ft.ScrollMode.AUTO),
+            ], scroll=ft.ScrollMode.AUTO, height=400),
+            actions=[ft.TextButton("Clear", on_click=lambda _: self.clear_stats(dialog))],
+        )
+        self.page.open(dialog)
+
+    def clear_stats(self, dialog: ft.AlertDialog) -> None:
+        """
+        Clears the collected statistics and closes the statistics panel.
+        """
+        self.metrics_summary.clear()
+        self.page.close(dialog)
+
+    def show_snack_bar(self, message: str, bgcolor: Optional[str] = None) -> None:
+        """
+        Shows a message at the bottom of the page.
+        """
+        snack_bar = ft.SnackBar(
+            content=ft.Text(message),
+            bgcolor=bgcolor
+        )
+        self.page.overlay.append(snack_bar)
+        snack_bar.open = True
+        self.updates.mark(self.page)
 
     def get_options(self) -> List[ft.DropdownOption]:
         """
@@ -346,7 +785,7 @@ class App:
         """
         Builds and displays the main UI.
         """
-        self.page.overlay.extend([self.file_picker, self.save_file_picker])
+        self.page.overlay.extend([self.file_picker, self.save_file_picker, self.folder_picker])
  
         self.header_title = ft.Text(
             "Image Converter", 
@@ -373,6 +812,7 @@ class App:
                     content=ft.Row(
                         [
                           self.reset_button,
+                          self.stats_button,
                           self.theme_button
                         ],
                         spacing=30,
@@ -438,7 +878,14 @@ class App:
                                         ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=10),
 
                                         ft.Column([
-                                            self.dd,
+                                            ft.Row([
+                                                self.dd,
+                                                self.extra_formats_button,
+                                                self.resize_button,
+                                                self.target_size_button,
+                                                self.preset_button,
+                                                self.pdf_button
+                                            ], spacing=5),
                                             self.target_format_label
                                         ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=10)
                                     ],
@@ -447,12 +894,30 @@ class App:
                                     spacing=50
                                 ),
 
-                                ft.Row(
+                                self.preview_grid.grid,
+
+                                ft.Column(
                                     [
-                                        self.convert_button,
+                                        ft.Row(
+                                            [
+                                                self.convert_button,
+                                            ],
+                                            alignment=ft.MainAxisAlignment.CENTER,
+                                            vertical_alignment=ft.CrossAxisAlignment.CENTER,
+                                            spacing=10
+                                        ),
+                                        ft.Row(
+                                            [
+                                                self.progress_bar,
+                                                self.cancel_button,
+                                            ],
+                                            alignment=ft.MainAxisAlignment.CENTER,
+                                            vertical_alignment=ft.CrossAxisAlignment.CENTER,
+                                            spacing=10
+                                        ),
+                                        self.job_status_text,
                                     ],
-                                    alignment=ft.MainAxisAlignment.CENTER,
-                                    vertical_alignment=ft.CrossAxisAlignment.CENTER,
+                                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
                                     spacing=10
                                 )
                             ],
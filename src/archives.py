@@ -0,0 +1,402 @@
+import io
+import os
+import posixpath
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+from .metrics import emit, has_hooks
+from .utils import BatchResult, convert_targets, readable_extensions, unique_output_name
+
+# Conversion of images read from and written to ZIP and TAR archives,
+# without extracting anything to disk.
+#
+# Input archives are read once, front to back, in the calling process and
+# the member contents are sent to the worker processes, which decode them
+# from memory. Workers encode archive outputs into memory and send them
+# back; the calling process adds them to the single output archive in
+# input order, so the archive is the same whichever worker finishes first.
+
+# Archive suffixes; the TAR ones map to tarfile's compression names
+_TAR_COMPRESSION = {
+    ".tar": "", ".tar.gz": "gz", ".tgz": "gz", ".tar.bz2": "bz2", ".tbz2": "bz2", ".tar.xz": "xz", ".txz": "xz",
+}
+ARCHIVE_SUFFIXES: Tuple[str, ...] = (".zip",) + tuple(_TAR_COMPRESSION)
+# Formats compressed by themselves are stored in ZIP files without deflating them again
+_PRECOMPRESSED_FORMATS = frozenset({"PNG", "JPEG", "JPG", "GIF", "WEBP", "MPO", "PDF"})
+# Oldest timestamp a ZIP file can store
+_ZIP_MIN_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+def _suffix(path: str) -> Optional[str]:
+    lower = path.lower()
+    # Longest first, so ".tar.gz" wins over a plain ".gz" check
+    for suffix in sorted(ARCHIVE_SUFFIXES, key=len, reverse=True):
+        if lower.endswith(suffix):
+            return suffix
+    return None
+
+
+def is_archive(path: str) -> bool:
+    """
+    Checks by its suffix whether a path names a ZIP or TAR archive.
+
+    Args:
+        path (str): File path.
+
+    Returns:
+        bool: True for .zip, .tar, .tar.gz/.tgz, .tar.bz2/.tbz2 and .tar.xz/.txz.
+    """
+    return _suffix(path) is not None
+
+
+def safe_member_name(name: str) -> str:
+    """
+    Turns an archive member name into a relative "/" separated path.
+
+    Absolute paths, drive letters and ".." components are dropped, so a
+    crafted archive cannot make outputs land outside the output folder.
+
+    Args:
+        name (str): Member name as stored in the archive.
+
+    Returns:
+        str: The cleaned name, e.g. "scans/page1.jpg".
+    """
+    parts = name.replace("\\", "/").split("/")
+    return "/".join(part for part in parts if part not in ("", ".", "..") and not part.endswith(":"))
+
+
+class ArchiveEntry(NamedTuple):
+    """
+    An image file read from an archive.
+
+    Attributes:
+        name (str): Member name, cleaned with safe_member_name().
+        data (bytes): File content.
+        mtime (float): Modification time as a Unix timestamp.
+    """
+    name: str
+    data: bytes
+    mtime: float
+
+
+def iter_archive(path: str) -> Iterator[ArchiveEntry]:
+    """
+    Reads the image files of an archive one at a time, in archive order.
+
+    TAR archives are read as a stream, so compressed ones are decompressed
+    once from front to back. Members whose extension Pillow does not know
+    are skipped without being read.
+
+    Args:
+        path (str): ZIP or TAR archive path.
+
+    Yields:
+        ArchiveEntry: The next image file.
+
+    Raises:
+        zipfile.BadZipFile, tarfile.TarError, OSError: If the archive is
+            unreadable or truncated.
+    """
+    readable = readable_extensions()
+
+    def wanted(name: str) -> bool:
+        return os.path.splitext(name)[1].lower() in readable
+
+    suffix = _suffix(path)
+    if suffix == ".zip":
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not wanted(info.filename):
+                    continue
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                yield ArchiveEntry(safe_member_name(info.filename), archive.read(info), mtime)
+        return
+    with tarfile.open(path, f"r|{_TAR_COMPRESSION.get(suffix) or '*'}") as archive:
+        for member in archive:
+            if not member.isfile() or not wanted(member.name):
+                continue
+            with archive.extractfile(member) as fp:
+                yield ArchiveEntry(safe_member_name(member.name), fp.read(), float(member.mtime))
+
+
+class ArchiveWriter:
+    """
+    Writes files to a new ZIP or TAR archive, chosen by the path's suffix.
+    """
+
+    def __init__(self, path: str):
+        """
+        Creates the archive, replacing an existing file.
+
+        Args:
+            path (str): Archive path ending in one of ARCHIVE_SUFFIXES.
+
+        Raises:
+            ValueError: If the suffix is not an archive suffix.
+        """
+        suffix = _suffix(path)
+        if suffix is None:
+            raise ValueError(f"not an archive name: {path}")
+        self.path = path
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._tar: Optional[tarfile.TarFile] = None
+        if suffix == ".zip":
+            self._zip = zipfile.ZipFile(path, "w")
+        else:
+            self._tar = tarfile.open(path, f"w:{_TAR_COMPRESSION[suffix]}" if _TAR_COMPRESSION[suffix] else "w")
+
+    def add(self, name: str, data: bytes, mtime: Optional[float] = None) -> None:
+        """
+        Adds a file.
+
+        Args:
+            name (str): Member name, "/" separated.
+            data (bytes): File content.
+            mtime (Optional[float]): Modification time, by default now.
+        """
+        mtime = time.time() if mtime is None else mtime
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, max(_ZIP_MIN_DATE, time.localtime(mtime)[:6]))
+            info.external_attr = 0o644 << 16
+            fmt = posixpath.splitext(name)[1][1:].upper()
+            info.compress_type = zipfile.ZIP_STORED if fmt in _PRECOMPRESSED_FORMATS else zipfile.ZIP_DEFLATED
+            self._zip.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(mtime)
+            info.mode = 0o644
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        """
+        Finishes the archive.
+        """
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class _Input(NamedTuple):
+    # name: how results report the input, e.g. "photos.zip/a.jpg"
+    # relative: path the outputs are named after, None if unreadable
+    # source: file path, member content, or the error reading the archive
+    name: str
+    relative: Optional[str]
+    source: Union[str, bytes, Exception]
+    mtime: float
+
+
+def _iter_inputs(paths: Iterable[str]) -> Iterator[_Input]:
+    for path in paths:
+        if not is_archive(path):
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                # Reported by the conversion itself
+                mtime = time.time()
+            yield _Input(path, os.path.basename(path), path, mtime)
+            continue
+        try:
+            for entry in iter_archive(path):
+                yield _Input(f"{path}/{entry.name}", entry.name, entry.data, entry.mtime)
+        except (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError) as ex:
+            yield _Input(path, None, ex, 0.0)
+
+
+def _convert_input(
+    name: str,
+    source: Union[str, bytes],
+    targets: Sequence[Tuple[str, str, bool]],
+    max_size: Optional[int],
+    icon_sizes: Optional[Sequence[int]],
+    target_size: Optional[int],
+    preset: Optional[str],
+    collect_metrics: bool,
+) -> List[Tuple[BatchResult, Optional[bytes]]]:
+    """
+    Worker function converting one input held in memory or on disk.
+
+    Args:
+        name (str): Name the input is reported under.
+        source (Union[str, bytes]): File path or file content.
+        targets (Sequence[Tuple[str, str, bool]]): (target_format, output, in_memory)
+            triples; in-memory outputs are returned instead of written to output.
+        max_size (Optional[int]): Maximum width and height of the outputs.
+        icon_sizes (Optional[Sequence[int]]): Entry sizes of ICO and ICNS outputs.
+        target_size (Optional[int]): File size budget in bytes of JPEG and WEBP outputs.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+        collect_metrics (bool): Attach per-stage metrics to the results.
+
+    Returns:
+        List[Tuple[BatchResult, Optional[bytes]]]: Per target, the result and
+            the encoded file for in-memory outputs that succeeded.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+        source.name = name
+    outs = []
+    for _, output, in_memory in targets:
+        if in_memory:
+            buffer = io.BytesIO()
+            buffer.name = output
+            outs.append(buffer)
+        else:
+            outs.append(output)
+    results = convert_targets(
+        source, [(fmt, out) for (fmt, _, _), out in zip(targets, outs)],
+        collect_metrics=collect_metrics, max_size=max_size, icon_sizes=icon_sizes,
+        target_size=target_size, preset=preset,
+    )
+    return [
+        (result, out.getvalue() if not isinstance(out, str) and not result.error else None)
+        for result, out in zip(results, outs)
+    ]
+
+
+def convert_archive(
+    paths: Iterable[str],
+    target_format: Union[str, Sequence[str]],
+    out: str,
+    workers: Optional[int] = None,
+    on_result: Optional[Callable[[BatchResult], None]] = None,
+    is_cancelled: Optional[Callable[[], bool]] = None,
+    max_size: Optional[int] = None,
+    icon_sizes: Optional[Sequence[int]] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> List[BatchResult]:
+    """
+    Converts files and the images inside ZIP/TAR archives, writing to a folder or an archive.
+
+    Each input archive is read once and each output is written once; no
+    temporary files are used. Outputs keep the member's folder inside the
+    archive. At most twice as many inputs as workers are in memory at a
+    time, including finished ones waiting for an earlier input.
+
+    Args:
+        paths (Iterable[str]): Image files and archives, in order.
+        target_format (Union[str, Sequence[str]]): Target format, or several.
+        out (str): Output folder, or an archive path (see ARCHIVE_SUFFIXES)
+            to write all outputs into.
+        workers (Optional[int]): Number of worker processes. Defaults to the CPU count.
+        on_result (Optional[Callable[[BatchResult], None]]): Called for each output,
+            in input order then format order.
+        is_cancelled (Optional[Callable[[], bool]]): Polled after each input; when it
+            returns True no further inputs are read, submitted inputs that have not
+            started are reported with a "Cancelled" error and the output is closed.
+        max_size (Optional[int]): Maximum width and height of the outputs.
+        icon_sizes (Optional[Sequence[int]]): Entry sizes of ICO and ICNS outputs.
+        target_size (Optional[int]): File size budget in bytes of JPEG and WEBP outputs.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+
+    Returns:
+        List[BatchResult]: One result per input and target format, in input order then
+                           format order. Archive members are reported as
+                           "archive.zip/member", as are outputs written to an archive.
+    """
+    formats = [target_format] if isinstance(target_format, str) else list(target_format)
+    to_archive = is_archive(out)
+    if not to_archive:
+        os.makedirs(out, exist_ok=True)
+    workers = max(1, workers or os.cpu_count() or 1)
+    window = 2 * workers
+    collect_metrics = has_hooks()
+    # Output names taken per output folder and format
+    taken: Dict[Tuple[str, str], Set[str]] = {}
+    inputs = _iter_inputs(paths)
+    results: List[BatchResult] = []
+    # Finished inputs waiting for an earlier one, by input number
+    finished: Dict[int, List[Tuple[BatchResult, Optional[bytes]]]] = {}
+    # Input name, output names and modification time, by input number
+    members: Dict[int, Tuple[str, List[str], float]] = {}
+    writer = ArchiveWriter(out) if to_archive else None
+
+    def output_names(relative: str) -> List[str]:
+        folder, filename = posixpath.split(relative)
+        return [
+            posixpath.join(folder, unique_output_name(filename, fmt, taken.setdefault((folder, fmt), set())))
+            for fmt in formats
+        ]
+
+    def write(number: int) -> None:
+        _, names, mtime = members.pop(number)
+        for (result, data), name in zip(finished.pop(number), names):
+            if writer is not None and data is not None:
+                try:
+                    writer.add(name, data, mtime)
+                except Exception as ex:
+                    result = result._replace(output=None, error=f"{type(ex).__name__}: {ex}")
+            emit(result.metrics)
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            running: Dict[Future, int] = {}
+            submitted = written = 0
+            exhausted = cancelled = False
+            while True:
+                while not exhausted and not cancelled and submitted - written < window:
+                    item = next(inputs, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    number, submitted = submitted, submitted + 1
+                    if item.relative is None:
+                        error = f"{type(item.source).__name__}: {item.source}"
+                        finished[number] = [(BatchResult(item.name, None, error, 0.0), None) for _ in formats]
+                        members[number] = (item.name, [""] * len(formats), item.mtime)
+                        continue
+                    names = output_names(item.relative)
+                    members[number] = (item.name, names, item.mtime)
+                    if to_archive:
+                        targets = [(fmt, f"{out}/{name}", True) for fmt, name in zip(formats, names)]
+                    else:
+                        targets = [(fmt, os.path.join(out, *name.split("/")), False) for fmt, name in zip(formats, names)]
+                        os.makedirs(os.path.dirname(targets[0][1]), exist_ok=True)
+                    future = pool.submit(
+                        _convert_input, item.name, item.source, targets, max_size, icon_sizes, target_size, preset,
+                        collect_metrics,
+                    )
+                    running[future] = number
+                while written in finished:
+                    write(written)
+                    written += 1
+                if not running:
+                    if exhausted or cancelled:
+                        break
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    number = running.pop(future)
+                    if future.cancelled():
+                        error = "Cancelled"
+                    else:
+                        try:
+                            finished[number] = future.result()
+                            continue
+                        except Exception as ex:
+                            # The worker process itself died (e.g. out of memory)
+                            error = f"{type(ex).__name__}: {ex}"
+                    finished[number] = [(BatchResult(members[number][0], None, error, 0.0), None) for _ in formats]
+                if is_cancelled and is_cancelled() and not cancelled:
+                    cancelled = True
+                    for pending in running:
+                        pending.cancel()
+    finally:
+        if writer is not None:
+            writer.close()
+    return results
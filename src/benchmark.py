@@ -0,0 +1,492 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .formats import TO_FORMATS
+from .presets import PRESETS
+from .stats import percentile
+
+# Offline benchmark of the conversion pipeline over the format matrix.
+# Run with "python -m src.benchmark"; see --help for the options.
+# Images are generated from a fixed seed, so runs on the same machine
+# convert identical pixels and their JSON results can be compared.
+
+# Formats Pillow can write but not read back
+WRITE_ONLY_FORMATS = frozenset({"PDF"})
+
+CONTENTS: Tuple[str, ...] = ("photo", "flat")
+MODES: Tuple[str, ...] = ("1", "L", "LA", "P", "RGB", "RGBX", "RGBA", "CMYK", "I;16")
+
+# Encoder presets to measure; "default" stands for no preset
+PRESET_CHOICES: Tuple[str, ...] = ("default",) + PRESETS
+
+# A case is identified by these fields when comparing runs
+_CASE_KEY = ("source_format", "target_format", "content", "mode", "width", "height", "preset")
+
+
+class BenchmarkCase(NamedTuple):
+    """
+    Timings of converting one synthetic source file to one target format.
+
+    Attributes:
+        source_format (str): Format the source file was written in.
+        target_format (str): Target format.
+        content (str): "photo" (smooth gradients with grain) or "flat" (solid shapes).
+        mode (str): Mode of the generated image, before it was saved as the source.
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+        source_bytes (int): Size of the source file.
+        output_bytes (int): Size of the converted file.
+        latencies (List[float]): Wall time of each measured run in seconds.
+        stages (Dict[str, float]): Median wall time per stage in seconds.
+        peak_memory (Optional[int]): Highest stage peak RSS in bytes, if known.
+        error (Optional[str]): Error message if the conversion failed.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+    """
+    source_format: str
+    target_format: str
+    content: str
+    mode: str
+    width: int
+    height: int
+    source_bytes: int
+    output_bytes: int
+    latencies: List[float]
+    stages: Dict[str, float]
+    peak_memory: Optional[int]
+    error: Optional[str] = None
+    preset: Optional[str] = None
+
+    @property
+    def megapixels_per_second(self) -> float:
+        """
+        Throughput at the median latency.
+        """
+        median = percentile(self.latencies, 50)
+        return self.width * self.height / 1e6 / median if median else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns a JSON serializable representation with latency percentiles.
+        """
+        data = self._asdict()
+        data["latency"] = {
+            "min": min(self.latencies, default=0.0),
+            "p50": percentile(self.latencies, 50),
+            "p90": percentile(self.latencies, 90),
+            "p99": percentile(self.latencies, 99),
+        }
+        data["megapixels_per_second"] = self.megapixels_per_second
+        return data
+
+
+class Regression(NamedTuple):
+    """
+    A case that got worse compared to a baseline run.
+
+    Attributes:
+        case (Dict[str, Any]): The case key fields.
+        metric (str): "p50", "output_bytes" or "error".
+        baseline (Any): Value in the baseline run.
+        current (Any): Value in this run.
+    """
+    case: Dict[str, Any]
+    metric: str
+    baseline: Any
+    current: Any
+
+    def __str__(self) -> str:
+        case = self.case
+        label = f"{case['source_format']}->{case['target_format']} {case['content']} {case['mode']} {case['width']}x{case['height']}"
+        if self.metric == "error":
+            return f"{label}: now fails ({self.current})"
+        if self.metric == "p50":
+            return f"{label}: p50 {self.baseline * 1000:.1f} ms -> {self.current * 1000:.1f} ms"
+        return f"{label}: {self.metric} {self.baseline} -> {self.current}"
+
+
+def synthetic_image(width: int, height: int, mode: str, content: str, seed: int = 0):
+    """
+    Generates a reproducible test image.
+
+    "photo" images are smooth random color fields with fine grain, which
+    compress like photographs. "flat" images are solid rectangles on white,
+    like screenshots and diagrams.
+
+    Args:
+        width (int): Width in pixels.
+        height (int): Height in pixels.
+        mode (str): Image mode, one of MODES.
+        content (str): "photo" or "flat".
+        seed (int): Random seed.
+
+    Returns:
+        Image.Image: The generated image.
+    """
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(f"{seed}-{width}x{height}-{content}")
+    if content == "photo":
+        coarse_size = (max(2, width // 32), max(2, height // 32))
+        coarse = Image.frombytes("RGB", coarse_size, rng.randbytes(coarse_size[0] * coarse_size[1] * 3))
+        img = coarse.resize((width, height), Image.Resampling.BICUBIC)
+        grain = Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+        img = Image.blend(img, grain, 0.08)
+    elif content == "flat":
+        img = Image.new("RGB", (width, height), "white")
+        draw = ImageDraw.Draw(img)
+        for _ in range(24):
+            x0, y0 = rng.randrange(width), rng.randrange(height)
+            x1, y1 = rng.randrange(x0, width + 1), rng.randrange(y0, height + 1)
+            draw.rectangle((x0, y0, x1, y1), fill=tuple(rng.choice((0, 64, 128, 192, 255)) for _ in range(3)))
+    else:
+        raise ValueError(f"Unknown content {content!r}, choose from: {', '.join(CONTENTS)}")
+
+    if mode in ("RGBA", "LA"):
+        alpha = Image.radial_gradient("L").resize((width, height))
+        img = img.convert("L") if mode == "LA" else img
+        img.putalpha(alpha)
+    elif mode == "P":
+        img = img.quantize(256)
+    elif mode == "I;16":
+        img = img.convert("L").point(lambda value: value * 257, "I").convert("I;16")
+    elif mode != "RGB":
+        img = img.convert(mode)
+    return img
+
+
+def write_sources(
+    out_dir: str,
+    sizes: Iterable[Tuple[int, int]],
+    modes: Iterable[str],
+    contents: Iterable[str],
+    source_formats: Iterable[str],
+    seed: int = 0,
+) -> List[Tuple[str, str, str, str, Tuple[int, int]]]:
+    """
+    Writes one synthetic source file per size, mode, content and source format.
+
+    Args:
+        out_dir (str): Folder for the source files.
+        sizes (Iterable[Tuple[int, int]]): Image sizes.
+        modes (Iterable[str]): Image modes.
+        contents (Iterable[str]): Content kinds.
+        source_formats (Iterable[str]): Formats to write the sources in.
+        seed (int): Random seed.
+
+    Returns:
+        List[Tuple[str, str, str, str, Tuple[int, int]]]: (path, source_format,
+            content, mode, size) for every source that could be written.
+    """
+    from .utils import save_image
+
+    sources = []
+    source_formats = list(source_formats)
+    for width, height in sizes:
+        for content in contents:
+            for mode in modes:
+                img = synthetic_image(width, height, mode, content, seed)
+                for fmt in source_formats:
+                    path = os.path.join(out_dir, f"{content}-{mode.replace(';', '_')}-{width}x{height}.{fmt.lower()}")
+                    try:
+                        # RGBX is RGB with a padding byte per pixel, which TIFF
+                        # stores as is and reads back as RGB; others get RGB
+                        if mode == "RGBX" and fmt == "TIFF":
+                            img.save(path, format="TIFF")
+                        else:
+                            save_image(img, path, fmt)
+                    except Exception as ex:
+                        print(f"Skipping {fmt} source {os.path.basename(path)}: {ex}", file=sys.stderr)
+                        continue
+                    sources.append((path, fmt, content, mode, (width, height)))
+    return sources
+
+
+def run_case(path: str, target_format: str, out_path: str, repeat: int, warmup: int = 1, preset: Optional[str] = None) -> Tuple[List[float], Dict[str, float], Optional[int], int, Optional[str]]:
+    """
+    Converts one source file repeatedly through the regular pipeline.
+
+    Args:
+        path (str): Source file.
+        target_format (str): Target format.
+        out_path (str): Output file, overwritten by every run.
+        repeat (int): Number of measured runs.
+        warmup (int): Number of unmeasured runs first.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+
+    Returns:
+        Tuple[List[float], Dict[str, float], Optional[int], int, Optional[str]]:
+            Latencies, median wall time per stage, peak memory, output size and
+            error message.
+    """
+    from .utils import convert_targets
+
+    latencies: List[float] = []
+    stage_walls: Dict[str, List[float]] = {}
+    peak: Optional[int] = None
+    for run in range(warmup + repeat):
+        result = convert_targets(path, [(target_format, out_path)], collect_metrics=True, preset=preset)[0]
+        if result.error:
+            return [], {}, None, 0, result.error
+        if run < warmup:
+            continue
+        latencies.append(result.metrics.wall)
+        for stage in result.metrics.stages:
+            stage_walls.setdefault(stage.stage, []).append(stage.wall)
+            if stage.peak_memory is not None:
+                peak = max(peak or 0, stage.peak_memory)
+    stages = {stage: percentile(walls, 50) for stage, walls in stage_walls.items()}
+    return latencies, stages, peak, os.path.getsize(out_path), None
+
+
+def run_benchmark(
+    sizes: Sequence[Tuple[int, int]],
+    modes: Sequence[str],
+    contents: Sequence[str],
+    source_formats: Sequence[str],
+    target_formats: Sequence[str],
+    repeat: int = 3,
+    warmup: int = 1,
+    seed: int = 0,
+    on_case: Optional[Callable[[BenchmarkCase], None]] = None,
+    presets: Sequence[Optional[str]] = (None,),
+) -> List[BenchmarkCase]:
+    """
+    Runs every source format to target format pair for every generated image.
+
+    Args:
+        sizes (Sequence[Tuple[int, int]]): Image sizes.
+        modes (Sequence[str]): Image modes.
+        contents (Sequence[str]): Content kinds.
+        source_formats (Sequence[str]): Source formats.
+        target_formats (Sequence[str]): Target formats.
+        repeat (int): Measured runs per case.
+        warmup (int): Unmeasured runs per case.
+        seed (int): Random seed for the generated images.
+        on_case (Optional[Callable[[BenchmarkCase], None]]): Called after each case.
+        presets (Sequence[Optional[str]]): Encoder presets, None for the encoder defaults.
+
+    Returns:
+        List[BenchmarkCase]: One case per source file, target format and preset.
+    """
+    cases = []
+    with tempfile.TemporaryDirectory(prefix="image-converter-bench-") as tmp:
+        source_dir = os.path.join(tmp, "sources")
+        os.makedirs(source_dir)
+        for path, source_format, content, mode, (width, height) in write_sources(
+            source_dir, sizes, modes, contents, source_formats, seed
+        ):
+            for target_format in target_formats:
+                out_path = os.path.join(tmp, f"out.{target_format.lower()}")
+                for preset in presets:
+                    latencies, stages, peak, output_bytes, error = run_case(
+                        path, target_format, out_path, repeat, warmup, preset,
+                    )
+                    case = BenchmarkCase(
+                        source_format, target_format, content, mode, width, height,
+                        os.path.getsize(path), output_bytes, latencies, stages, peak, error, preset,
+                    )
+                    cases.append(case)
+                    if on_case:
+                        on_case(case)
+    return cases
+
+
+def environment() -> Dict[str, Any]:
+    """
+    Describes the machine and library versions a run was measured on.
+    """
+    import PIL
+
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(baseline: Dict[str, Any], cases: Iterable[Dict[str, Any]], threshold: float = 0.15, min_delta: float = 0.002) -> List[Regression]:
+    """
+    Flags cases that are slower, larger or failing compared to a baseline run.
+
+    Args:
+        baseline (Dict[str, Any]): A previously saved JSON result.
+        cases (Iterable[Dict[str, Any]]): Cases of this run, as from BenchmarkCase.to_dict().
+        threshold (float): Relative increase that counts as a regression.
+        min_delta (float): Median latency increases below this many seconds are
+                           ignored as noise.
+
+    Returns:
+        List[Regression]: The regressions found; cases missing from either run are skipped.
+    """
+    # Results saved before presets existed have no preset field
+    previous = {tuple(case.get(field) for field in _CASE_KEY): case for case in baseline.get("cases", [])}
+    regressions = []
+    for case in cases:
+        key = tuple(case.get(field) for field in _CASE_KEY)
+        before = previous.get(key)
+        if before is None:
+            continue
+        fields = dict(zip(_CASE_KEY, key))
+        if case["error"]:
+            if not before["error"]:
+                regressions.append(Regression(fields, "error", None, case["error"]))
+            continue
+        if before["error"]:
+            continue
+        old, new = before["latency"]["p50"], case["latency"]["p50"]
+        if new > old * (1 + threshold) and new - old > min_delta:
+            regressions.append(Regression(fields, "p50", old, new))
+        if case["output_bytes"] > before["output_bytes"] * (1 + threshold):
+            regressions.append(Regression(fields, "output_bytes", before["output_bytes"], case["output_bytes"]))
+    return regressions
+
+
+def _parse_list(value: str, choices: Sequence[str]) -> List[str]:
+    items = []
+    for item in value.split(","):
+        item = item.strip()
+        match = next((choice for choice in choices if choice.upper() == item.upper()), None)
+        if match is None:
+            raise argparse.ArgumentTypeError(f"unknown value {item!r}, choose from: {', '.join(choices)}")
+        if match not in items:
+            items.append(match)
+    return items
+
+
+def _parse_sizes(value: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for item in value.split(","):
+        try:
+            width, _, height = item.strip().lower().partition("x")
+            sizes.append((int(width), int(height or width)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid size {item!r}, expected e.g. 512 or 640x480")
+    return sizes
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the benchmark argument parser.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    readable = [fmt for fmt in TO_FORMATS if fmt not in WRITE_ONLY_FORMATS]
+    parser = argparse.ArgumentParser(
+        prog="python -m src.benchmark",
+        description="Benchmark conversions between all supported formats on synthetic images.",
+    )
+    parser.add_argument(
+        "--sizes", type=_parse_sizes, default=[(256, 256), (1024, 768)], metavar="WxH[,WxH...]",
+        help="Image sizes; a single number means a square (default: 256,1024x768).",
+    )
+    parser.add_argument(
+        "--modes", type=lambda value: _parse_list(value, MODES), default=["RGB", "RGBA"],
+        metavar="MODE[,MODE...]", help=f"Image modes (default: RGB,RGBA). One of: {', '.join(MODES)}.",
+    )
+    parser.add_argument(
+        "--content", type=lambda value: _parse_list(value, CONTENTS), default=list(CONTENTS),
+        metavar="KIND[,KIND...]", help="Image content: photo, flat (default: both).",
+    )
+    parser.add_argument(
+        "--from", dest="source_formats", type=lambda value: _parse_list(value, readable), default=readable,
+        metavar="FORMAT[,FORMAT...]", help="Source formats (default: all readable formats).",
+    )
+    parser.add_argument(
+        "--to", dest="target_formats", type=lambda value: _parse_list(value, TO_FORMATS), default=list(TO_FORMATS),
+        metavar="FORMAT[,FORMAT...]", help="Target formats (default: all formats).",
+    )
+    parser.add_argument(
+        "--presets", type=lambda value: _parse_list(value, PRESET_CHOICES), default=["default"],
+        metavar="PRESET[,PRESET...]",
+        help=f"Encoder presets to compare (default: default). One of: {', '.join(PRESET_CHOICES)}.",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Measured runs per case (default: 3).")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs per case (default: 1).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated images (default: 0).")
+    parser.add_argument("-o", "--output", metavar="FILE", help="Write the results as JSON to FILE.")
+    parser.add_argument(
+        "--compare", metavar="FILE",
+        help="Compare with a previous JSON result; exits with 1 on regressions.",
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.15,
+        help="Relative slowdown or size growth flagged as a regression (default: 0.15).",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print the summary.")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the benchmark from the command line.
+
+    Args:
+        argv (Optional[List[str]]): Arguments, defaults to sys.argv[1:].
+
+    Returns:
+        int: Process exit code; 1 if regressions were found.
+    """
+    args = build_parser().parse_args(argv)
+
+    def on_case(case: BenchmarkCase) -> None:
+        if args.quiet:
+            return
+        label = f"{case.source_format:>5} -> {case.target_format:<5} {case.content:<5} {case.mode:<5} {case.width}x{case.height}"
+        if len(args.presets) > 1:
+            label += f" {case.preset or 'default':<8}"
+        if case.error:
+            print(f"{label}  FAILED {case.error}")
+            return
+        peak = f"{case.peak_memory / 2**20:6.0f} MB" if case.peak_memory else "     - MB"
+        print(
+            f"{label}  p50 {percentile(case.latencies, 50) * 1000:8.1f} ms  "
+            f"p90 {percentile(case.latencies, 90) * 1000:8.1f} ms  "
+            f"{case.megapixels_per_second:7.1f} MP/s  {case.output_bytes:>10} B  {peak}"
+        )
+
+    start = time.perf_counter()
+    cases = run_benchmark(
+        args.sizes, args.modes, args.content, args.source_formats, args.target_formats,
+        repeat=args.repeat, warmup=args.warmup, seed=args.seed, on_case=on_case,
+        presets=[None if preset == "default" else preset for preset in args.presets],
+    )
+    results = {
+        "environment": environment(),
+        "settings": {
+            "sizes": [f"{width}x{height}" for width, height in args.sizes],
+            "modes": args.modes, "content": args.content,
+            "presets": args.presets, "repeat": args.repeat, "warmup": args.warmup, "seed": args.seed,
+        },
+        "cases": [case.to_dict() for case in cases],
+    }
+    failed = sum(1 for case in cases if case.error)
+    print(f"Ran {len(cases)} cases in {time.perf_counter() - start:.1f}s, {failed} failed")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, indent=1)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            baseline = json.load(fp)
+        regressions = compare(baseline, results["cases"], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        print(f"{len(regressions)} regressions against {args.compare}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+# (absolute path, file size, modification time in ns, decode size limit).
+# Editing or replacing the file changes size or mtime, so stale entries are
+# never returned. Each path is cached once per decode size limit.
+CacheKey = Tuple[str, int, int, Optional[int]]
+
+
+class CacheStats(NamedTuple):
+    """
+    Snapshot of an ImageCache's counters.
+
+    Attributes:
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that required decoding.
+        evictions (int): Entries dropped to stay within the byte budget.
+        entries (int): Images currently cached.
+        bytes (int): Pixel memory currently held, in bytes.
+        max_bytes (int): The byte budget.
+    """
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+    max_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Fraction of lookups that were hits, 0.0 before the first lookup.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def bytes_per_pixel(mode: str) -> int:
+    """
+    Returns how many bytes Pillow stores per pixel of a mode.
+
+    Pillow stores 1, L and P images with one byte per pixel, 16 bit
+    images with two, and every other mode (including RGB) with four.
+    """
+    if mode in ("1", "L", "P"):
+        return 1
+    if mode.startswith("I;16"):
+        return 2
+    return 4
+
+
+def image_bytes(img: Image.Image) -> int:
+    """
+    Estimates the pixel memory of a loaded image.
+
+    Args:
+        img (Image.Image): The image.
+
+    Returns:
+        int: Approximate size of the pixel buffer in bytes.
+    """
+    return img.width * img.height * bytes_per_pixel(img.mode)
+
+
+def cache_key(path: str, max_size: Optional[int] = None) -> CacheKey:
+    """
+    Builds the cache key of a file from its current size and modification time.
+
+    Args:
+        path (str): File path.
+        max_size (Optional[int]): Size limit the file is decoded at, None for full size.
+
+    Returns:
+        CacheKey: The key.
+
+    Raises:
+        OSError: If the file cannot be accessed.
+    """
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns, max_size
+
+
+class ImageCache:
+    """
+    Bounded LRU cache of decoded images, so converting the same source
+    again (e.g. to another format) skips reading and decoding the file.
+
+    The budget applies to the total pixel memory of the cached images,
+    not to the number of entries; the least recently used images are
+    evicted first. Images larger than the whole budget are not cached.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_bytes (int): Maximum total pixel memory of the cached images.
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Optional[int]], Tuple[CacheKey, Image.Image, int]]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: CacheKey) -> Optional[Image.Image]:
+        """
+        Looks up a decoded image.
+
+        Args:
+            key (CacheKey): Key from cache_key().
+
+        Returns:
+            Optional[Image.Image]: A new Image object sharing the cached pixels,
+                which the caller may close; None on a miss.
+        """
+        with self._lock:
+            slot = key[0], key[3]
+            entry = self._entries.get(slot)
+            if entry is None or entry[0] != key:
+                if entry is not None:
+                    # The file changed since it was cached
+                    self._drop(slot)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(slot)
+            self._hits += 1
+            img = entry[1]
+        return img._new(img.im)
+
+    def put(self, key: CacheKey, img: Image.Image) -> None:
+        """
+        Caches a loaded image, evicting least recently used entries as needed.
+
+        Only the current frame's pixels and metadata are kept; the file the
+        image was read from is not referenced.
+
+        Args:
+            key (CacheKey): Key from cache_key(), taken before the file was read.
+            img (Image.Image): The decoded image.
+        """
+        size = image_bytes(img)
+        if size > self.max_bytes:
+            return
+        img.load()
+        detached = img._new(img.im)
+        slot = key[0], key[3]
+        with self._lock:
+            if slot in self._entries:
+                self._drop(slot)
+            self._entries[slot] = (key, detached, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drops all cached images. The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> CacheStats:
+        """
+        Returns the current counters.
+        """
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries), self._bytes, self.max_bytes)
+
+    def _drop(self, slot: Tuple[str, Optional[int]]) -> None:
+        _, _, size = self._entries.pop(slot)
+        self._bytes -= size
@@ -0,0 +1,378 @@
+import argparse
+import os
+import sys
+import time
+from typing import Iterable, List, Optional
+
+from .formats import TO_FORMATS
+from .presets import PRESETS
+
+# Headless entry point. Must never import Flet; Pillow is only imported
+# once arguments are parsed, so "--help" and argument errors stay instant.
+
+
+def parse_formats(value: str) -> List[str]:
+    """
+    Parses a comma separated list of target formats, e.g. "png,webp".
+
+    Args:
+        value (str): The raw argument.
+
+    Returns:
+        List[str]: Upper case target formats, without duplicates.
+
+    Raises:
+        argparse.ArgumentTypeError: If a format is not supported.
+    """
+    formats = []
+    for fmt in value.upper().split(","):
+        fmt = fmt.strip()
+        if fmt not in TO_FORMATS:
+            raise argparse.ArgumentTypeError(
+                f"unsupported format {fmt!r}, choose from: {', '.join(TO_FORMATS)}"
+            )
+        if fmt not in formats:
+            formats.append(fmt)
+    return formats
+
+def positive_int(value: str) -> int:
+    """
+    Parses a strictly positive integer argument.
+
+    Args:
+        value (str): The raw argument.
+
+    Returns:
+        int: The parsed value.
+
+    Raises:
+        argparse.ArgumentTypeError: If the value is not a positive integer.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value!r}")
+    return number
+
+def non_negative_int(value: str) -> int:
+    """
+    Parses an integer argument that may be zero but not negative.
+
+    Args:
+        value (str): The raw argument.
+
+    Returns:
+        int: The parsed value.
+
+    Raises:
+        argparse.ArgumentTypeError: If the value is not a non-negative integer.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"expected a non-negative integer, got {value!r}")
+    return number
+
+def parse_sizes(value: str) -> List[int]:
+    """
+    Parses a comma separated list of icon sizes, e.g. "16,32,256".
+
+    Args:
+        value (str): The raw argument.
+
+    Returns:
+        List[int]: The sizes in pixels.
+
+    Raises:
+        argparse.ArgumentTypeError: If a size is not a positive integer.
+    """
+    return [positive_int(size.strip()) for size in value.split(",")]
+
+def memory_budget(args: argparse.Namespace) -> Optional[int]:
+    """
+    Returns the --memory-budget option in bytes, None if it was not given.
+    """
+    return None if args.memory_budget is None else args.memory_budget * 1024 * 1024
+
+def target_size(args: argparse.Namespace) -> Optional[int]:
+    """
+    Returns the --target-size option in bytes, None if it was not given.
+    """
+    return None if args.target_size is None else args.target_size * 1024
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the command line argument parser.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m src",
+        description="Convert images between formats without starting the GUI.",
+    )
+    parser.add_argument("inputs", nargs="+", help="Input files, folders or ZIP/TAR archives.")
+    parser.add_argument(
+        "output",
+        help="Output folder, created if missing, or a .zip/.tar/.tar.gz/.tar.bz2/.tar.xz archive to create.",
+    )
+    parser.add_argument(
+        "--to", dest="target_formats", required=True, type=parse_formats,
+        metavar="FORMAT[,FORMAT...]",
+        help=f"Target format(s), comma separated; each source is decoded once. "
+             f"One of: {', '.join(TO_FORMATS)}.",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=positive_int, default=None,
+        help="Number of worker processes (default: number of CPUs).",
+    )
+    parser.add_argument(
+        "--max-memory", type=positive_int, default=None, metavar="MB",
+        help="Per-worker memory budget for pixel data. Larger images are "
+             "converted in strips where the formats allow it.",
+    )
+    parser.add_argument(
+        "--memory-budget", type=positive_int, default=None, metavar="MB",
+        help="Estimated pixel memory of the files converted at once; files start only while "
+             "they fit and larger files are rejected (default: half of the RAM).",
+    )
+    parser.add_argument(
+        "--max-size", type=positive_int, default=None, metavar="PX",
+        help="Downscale images so that width and height are at most PX pixels. "
+             "JPEG sources are decoded directly at reduced size.",
+    )
+    parser.add_argument(
+        "--icon-sizes", type=parse_sizes, default=None, metavar="PX[,PX...]",
+        help="Sizes stored in ICO and ICNS outputs, all built from one decode "
+             "(default: 16-256 for ICO, 16-1024 for ICNS).",
+    )
+    parser.add_argument(
+        "--target-size", type=positive_int, default=None, metavar="KB",
+        help="Write JPEG and WEBP outputs at the highest quality that keeps them under KB "
+             "kilobytes; qualities are tried in memory and only the chosen one is written.",
+    )
+    parser.add_argument(
+        "--preset", choices=PRESETS, default=None,
+        help="Encoder effort: fastest, balanced or smallest output. Changes compression "
+             "settings only, never the pixels or the quality (default: the encoder defaults).",
+    )
+    parser.add_argument(
+        "--metrics-log", metavar="FILE", default=None,
+        help="Append per-stage timing and memory metrics as JSON lines to FILE.",
+    )
+    parser.add_argument(
+        "--dedupe", choices=("link", "copy", "off"), default="link",
+        help="Convert byte-identical inputs once and hardlink (default) or copy the "
+             "result for the others, or 'off' to convert every input.",
+    )
+    parser.add_argument(
+        "--combine", metavar="FILE", default=None,
+        help="With --to pdf, write all inputs as pages of one PDF named FILE in the output "
+             "folder, in the order given (folder contents sorted by name).",
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Keep watching the input folders and convert files as they arrive or change. "
+             "Stop with Ctrl+C.",
+    )
+    parser.add_argument(
+        "--settle", type=float, default=1.0, metavar="SECONDS",
+        help="With --watch, how long a file must stay unchanged before it is converted (default: 1).",
+    )
+    parser.add_argument(
+        "--manifest", metavar="FILE", default=None,
+        help="With --watch, where converted files are recorded so restarts skip them "
+             "(default: a hidden file in the output folder).",
+    )
+    parser.add_argument(
+        "-r", "--recursive", action="store_true",
+        help="Also convert images in subfolders of input folders.",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print errors.")
+    return parser
+
+def collect_inputs(inputs: Iterable[str], recursive: bool = False) -> List[str]:
+    """
+    Expands input folders into the image files they contain.
+
+    Args:
+        inputs (Iterable[str]): Files or folders given on the command line.
+        recursive (bool): Descend into subfolders.
+
+    Returns:
+        List[str]: Input file paths, folder contents sorted by name.
+    """
+    from .utils import readable_extensions
+
+    readable = readable_extensions()
+    paths = []
+    for item in inputs:
+        if not os.path.isdir(item):
+            paths.append(item)
+            continue
+        for root, dirs, files in os.walk(item):
+            dirs.sort()
+            if not recursive:
+                dirs.clear()
+            paths.extend(
+                os.path.join(root, file) for file in sorted(files)
+                if os.path.splitext(file)[1].lower() in readable
+            )
+    return paths
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the command line interface.
+
+    Args:
+        argv (Optional[List[str]]): Arguments, defaults to sys.argv[1:].
+
+    Returns:
+        int: Process exit code; 1 if any file failed to convert.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.combine and (args.target_formats != ["PDF"] or args.watch):
+        parser.error("--combine needs --to pdf and cannot be used with --watch")
+    if args.combine and (args.target_size or args.preset):
+        # Pages are embedded as they are or with fixed PDF settings
+        parser.error("--combine cannot be used with --target-size or --preset")
+
+    from .metrics import JsonLinesLog, add_hook
+    from .targetsize import TARGET_SIZE_FORMATS
+    from .utils import BatchResult, convert_batch, dedupe_report
+
+    if args.target_size and not any(fmt in TARGET_SIZE_FORMATS for fmt in args.target_formats):
+        parser.error("--target-size needs a JPEG or WEBP target format")
+
+    if args.metrics_log:
+        add_hook(JsonLinesLog(args.metrics_log))
+
+    if args.watch:
+        return watch(args)
+
+    paths = collect_inputs(args.inputs, args.recursive)
+    if not paths:
+        print("No input images found.", file=sys.stderr)
+        return 1
+
+    if args.combine:
+        return combine(args, paths)
+
+    from .archives import convert_archive, is_archive
+
+    uses_archives = is_archive(args.output) or any(is_archive(path) for path in paths)
+
+    def on_result(result: BatchResult) -> None:
+        if result.error:
+            print(f"FAILED {result.source}: {result.error}", file=sys.stderr)
+        elif not args.quiet:
+            print(f"{result.source} -> {result.output}")
+
+    start = time.perf_counter()
+    if uses_archives:
+        # Archive members are converted in memory; see src/archives.py
+        results = convert_archive(
+            paths, args.target_formats, args.output, workers=args.jobs, on_result=on_result,
+            max_size=args.max_size, icon_sizes=args.icon_sizes, target_size=target_size(args),
+            preset=args.preset,
+        )
+    else:
+        results = convert_batch(
+            paths, args.target_formats, args.output, workers=args.jobs, on_result=on_result,
+            buffer_size=args.max_memory * 1024 * 1024 if args.max_memory else None,
+            max_size=args.max_size, dedupe=None if args.dedupe == "off" else args.dedupe,
+            icon_sizes=args.icon_sizes, memory_budget=memory_budget(args), target_size=target_size(args),
+            preset=args.preset,
+        )
+    elapsed = time.perf_counter() - start
+
+    failed = sum(1 for result in results if result.error)
+    if not args.quiet:
+        print(f"Wrote {len(results) - failed}/{len(results)} files in {elapsed:.2f}s")
+        report = dedupe_report(results)
+        if report.duplicates:
+            print(
+                f"{report.duplicates}/{report.sources} inputs were duplicates ({report.ratio:.0%}), "
+                f"saving about {report.seconds_saved:.2f}s of conversion time"
+            )
+    return 1 if failed else 0
+
+def combine(args: argparse.Namespace, paths: List[str]) -> int:
+    """
+    Writes all inputs as pages of one PDF.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments.
+        paths (List[str]): Input files in page order.
+
+    Returns:
+        int: Process exit code; 1 if any input was skipped.
+    """
+    from .pdf import combine_pdf
+
+    os.makedirs(args.output, exist_ok=True)
+    out_path = os.path.join(args.output, args.combine)
+    try:
+        result = combine_pdf(paths, out_path, max_size=args.max_size)
+    except ValueError as ex:
+        print(f"FAILED {out_path}: {ex}", file=sys.stderr)
+        return 1
+    for source, error in result.errors:
+        print(f"FAILED {source}: {error}", file=sys.stderr)
+    if not args.quiet:
+        print(
+            f"Wrote {result.pages} pages to {out_path} in {result.seconds:.2f}s "
+            f"({result.pages_per_second:.1f} pages/s, {result.embedded} pages embedded without re-encoding)"
+        )
+    return 1 if result.errors else 0
+
+def watch(args: argparse.Namespace) -> int:
+    """
+    Runs the hot folder mode until interrupted.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments.
+
+    Returns:
+        int: Process exit code; 1 if an input is not a folder.
+    """
+    from .utils import BatchResult
+    from .watch import FolderWatcher
+
+    not_folders = [item for item in args.inputs if not os.path.isdir(item)]
+    if not_folders:
+        print(f"--watch needs folders, not: {', '.join(not_folders)}", file=sys.stderr)
+        return 1
+
+    def on_result(result: BatchResult) -> None:
+        if result.error:
+            print(f"FAILED {result.source}: {result.error}", file=sys.stderr)
+        elif not args.quiet:
+            print(f"{result.source} -> {result.output}", flush=True)
+
+    watcher = FolderWatcher(
+        args.inputs, args.target_formats, args.output, recursive=args.recursive,
+        settle=args.settle, workers=args.jobs, manifest_path=args.manifest,
+        max_size=args.max_size, icon_sizes=args.icon_sizes, target_size=target_size(args),
+        preset=args.preset, memory_budget=memory_budget(args), on_result=on_result,
+    )
+    if not args.quiet:
+        print(f"Watching {', '.join(args.inputs)} (Ctrl+C to stop)", flush=True)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.manifest.save()
+
+    stats = watcher.stats()
+    if not args.quiet and stats.latencies:
+        latencies = sorted(stats.latencies)
+        print(
+            f"Converted {stats.converted} files, {stats.failed} failed. Latency from last write "
+            f"to output: median {latencies[len(latencies) // 2]:.2f}s, max {latencies[-1]:.2f}s"
+        )
+    return 0
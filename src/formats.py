@@ -0,0 +1,159 @@
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+# Everything here is plain data and pure functions on mode names.
+# Kept free of Pillow and Flet imports so it is cheap to load.
+
+
+class FormatCapabilities(NamedTuple):
+    """
+    What an encoder accepts without further conversion.
+
+    Attributes:
+        pillow_format (str): Format name passed to Image.save().
+        modes (FrozenSet[str]): Image modes written as is.
+        alpha (bool): Whether transparency survives a save/open round trip.
+        max_colors (Optional[int]): Palette size limit, or None for true color formats.
+        multi_frame (bool): Whether several frames can be written with save_all.
+    """
+    pillow_format: str
+    modes: FrozenSet[str]
+    alpha: bool
+    max_colors: Optional[int]
+    multi_frame: bool
+
+
+def _caps(pillow_format: str, modes: str, alpha: bool, max_colors: Optional[int] = None, multi_frame: bool = False) -> FormatCapabilities:
+    return FormatCapabilities(pillow_format, frozenset(modes.split()), alpha, max_colors, multi_frame)
+
+
+_JPEG = _caps("JPEG", "L RGB CMYK", alpha=False)
+
+# One entry per supported output format, in UI order. Verified against the
+# Pillow encoders: modes outside these sets either fail to save or come back
+# altered (e.g. BMP drops alpha, the PNM family writes the header by mode).
+FORMAT_CAPABILITIES: Dict[str, FormatCapabilities] = {
+    "PNG": _caps("PNG", "1 L LA P RGB RGBA I I;16", alpha=True, multi_frame=True),
+    "JPEG": _JPEG,
+    "JPG": _JPEG,
+    "BMP": _caps("BMP", "1 L P RGB", alpha=False, max_colors=256),
+    "GIF": _caps("GIF", "1 L P", alpha=True, max_colors=256, multi_frame=True),
+    "TIFF": _caps("TIFF", "1 L LA P PA RGB RGBA CMYK I I;16 F LAB", alpha=True, multi_frame=True),
+    "ICO": _caps("ICO", "1 L LA P RGB RGBA", alpha=True),
+    "ICNS": _caps("ICNS", "1 L LA P RGB RGBA", alpha=True),
+    "WEBP": _caps("WEBP", "RGB RGBA", alpha=True, multi_frame=True),
+    "PPM": _caps("PPM", "RGB", alpha=False),
+    "PGM": _caps("PPM", "L I I;16", alpha=False),
+    "PBM": _caps("PPM", "1", alpha=False),
+    "PNM": _caps("PPM", "1 L I I;16 RGB", alpha=False),
+    "TGA": _caps("TGA", "1 L LA P RGB RGBA", alpha=True, max_colors=256),
+    "DDS": _caps("DDS", "L LA RGB RGBA", alpha=True),
+    "PCX": _caps("PCX", "1 L P RGB", alpha=False, max_colors=256),
+    "IM": _caps("IM", "1 L LA P RGB RGBA CMYK YCbCr I I;16 F", alpha=True),
+    "MPO": _caps("MPO", "L RGB CMYK", alpha=False, multi_frame=True),
+    "PFM": _caps("PPM", "F", alpha=False),
+    "SGI": _caps("SGI", "L RGB RGBA", alpha=True),
+    "PDF": _caps("PDF", "1 L P RGB RGBA CMYK", alpha=True, multi_frame=True),
+}
+
+# Supported output formats, shared by the UI and the headless entry points.
+TO_FORMATS: List[str] = list(FORMAT_CAPABILITIES)
+
+ALPHA_MODES: FrozenSet[str] = frozenset({"LA", "PA", "RGBA"})
+HIGH_DEPTH_MODES: FrozenSet[str] = frozenset({"I", "I;16", "I;16L", "I;16B", "I;16N", "F"})
+
+# Candidate target modes per source mode, best fidelity first.
+# Modes not listed fall back to _FALLBACK_MODES.
+_MODE_PREFERENCES: Dict[str, Tuple[str, ...]] = {
+    "1": ("1", "L", "P", "RGB", "RGBA"),
+    "L": ("L", "I;16", "I", "RGB", "P", "LA", "RGBA"),
+    "LA": ("LA", "RGBA", "L", "RGB", "P"),
+    "P": ("P", "RGB", "RGBA", "L"),
+    "PA": ("PA", "RGBA", "LA", "P", "RGB", "L"),
+    "RGB": ("RGB", "RGBA", "P", "L"),
+    "RGBA": ("RGBA", "RGB", "P", "LA", "L"),
+    "RGBX": ("RGB", "RGBA", "P", "L"),
+    "CMYK": ("CMYK", "RGB", "RGBA", "P", "L"),
+    "I": ("I", "I;16", "F", "L", "RGB", "P"),
+    "I;16": ("I;16", "I", "F", "L", "RGB", "P"),
+    "F": ("F", "L", "RGB", "I;16", "I", "P"),
+}
+_FALLBACK_MODES: Tuple[str, ...] = ("RGB", "RGBA", "L", "P", "1", "F", "I;16", "I")
+
+
+class ConversionStep(NamedTuple):
+    """
+    One full-image pass of a conversion plan.
+
+    Attributes:
+        action (str): "flatten" (composite alpha onto a background), "quantize"
+                      (reduce to a palette), "reduce_depth" (scale high bit depth
+                      down to 8 bits) or "convert" (plain mode conversion).
+        mode (str): The mode produced by this step.
+    """
+    action: str
+    mode: str
+
+
+def _steps(source: str, target: str, has_alpha: bool, caps: FormatCapabilities) -> Tuple[ConversionStep, ...]:
+    """
+    Builds the passes needed to go from source mode to an accepted target mode.
+    """
+    steps: List[ConversionStep] = []
+    mode = source
+    keeps_alpha = target in ALPHA_MODES or (target == "P" and caps.alpha)
+    if has_alpha and not keeps_alpha:
+        mode = "L" if target in ("L", "1") and source in ("LA", "La") else "RGB"
+        steps.append(ConversionStep("flatten", mode))
+    elif mode in HIGH_DEPTH_MODES and target not in HIGH_DEPTH_MODES:
+        mode = "L"
+        steps.append(ConversionStep("reduce_depth", mode))
+
+    if mode == target:
+        return tuple(steps)
+    if target == "P" and mode != "1":
+        steps.append(ConversionStep("quantize", "P"))
+    else:
+        steps.append(ConversionStep("convert", target))
+    return tuple(steps)
+
+
+@lru_cache(maxsize=None)
+def plan_conversion(mode: str, target_format: str, has_transparency: bool = False) -> Tuple[ConversionStep, ...]:
+    """
+    Picks the cheapest conversion chain that makes an image saveable in the target format.
+
+    The chosen target mode is the first one, in fidelity order for the
+    source mode, that the encoder accepts. An empty plan means the image
+    can be saved as is, without any copy.
+
+    Args:
+        mode (str): Source image mode.
+        target_format (str): Target format from TO_FORMATS.
+        has_transparency (bool): Whether a non-alpha mode carries transparency
+                                 (e.g. a "P" image with a transparent index).
+
+    Returns:
+        Tuple[ConversionStep, ...]: The passes to apply in order.
+
+    Raises:
+        KeyError: If the target format is not supported.
+        ValueError: If no accepted mode can be reached.
+    """
+    caps = FORMAT_CAPABILITIES[target_format.upper()]
+    has_alpha = mode in ALPHA_MODES or has_transparency
+    if mode in caps.modes and not (has_transparency and not caps.alpha):
+        return ()
+
+    base = "I;16" if mode.startswith("I;16") else mode
+    preferences = _MODE_PREFERENCES.get(base, ()) + _FALLBACK_MODES
+    if has_transparency and caps.alpha:
+        # Keep the transparency, expanding to a real alpha channel if needed
+        preferences = ("RGBA", "LA") + preferences
+    elif has_alpha and not caps.alpha:
+        # Alpha gets flattened anyway; a palette would only add a quantize pass
+        preferences = tuple(sorted(preferences, key=lambda candidate: candidate == "P"))
+    for candidate in preferences:
+        if candidate in caps.modes:
+            return _steps(mode, candidate, has_alpha, caps)
+    raise ValueError(f"{target_format} cannot store {mode} images")
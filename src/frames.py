@@ -0,0 +1,180 @@
+from typing import Any, Callable, Dict, Optional
+
+from PIL import Image
+
+# Multi-frame conversion: animated GIF/WEBP/PNG, multi-page TIFF and MPO.
+# Frames are decoded, converted and handed to the encoder one at a time
+# through ConvertedFrames, which Pillow's save_all writers iterate with
+# seek(); the whole animation is never held in memory by this module.
+
+# Disposal methods, as Pillow reads and writes them per format
+_GIF_NONE, _GIF_KEEP, _GIF_BACKGROUND, _GIF_PREVIOUS = 0, 1, 2, 3
+_APNG_NONE, _APNG_BACKGROUND, _APNG_PREVIOUS = 0, 1, 2
+
+
+def frame_count(img: Image.Image) -> int:
+    """
+    Returns the number of frames or pages of an opened image.
+    """
+    return getattr(img, "n_frames", 1)
+
+
+class ConvertedFrames(Image.Image):
+    """
+    Lazily converted view of a multi-frame image.
+
+    Seeking to a frame seeks the source, decodes that frame and converts
+    it with convert_frame; only the current frame is kept. Save it with
+    save_all=True to write every frame.
+    """
+
+    def __init__(self, source: Image.Image, convert_frame: Callable[[Image.Image], Image.Image]):
+        """
+        Initialize the view on the source's first frame.
+
+        Args:
+            source (Image.Image): An opened multi-frame image.
+            convert_frame (Callable[[Image.Image], Image.Image]): Turns the source,
+                positioned on a frame, into the frame to encode.
+        """
+        super().__init__()
+        self._source = source
+        self._convert_frame = convert_frame
+        self._frame = -1
+        self._disposal: Dict[int, int] = {}
+        self.n_frames = frame_count(source)
+        self.is_animated = self.n_frames > 1
+        self.seek(0)
+
+    def seek(self, frame: int) -> None:
+        if not 0 <= frame < self.n_frames:
+            raise EOFError("no more frames")
+        self._source.seek(frame)
+        self._source.load()
+        converted = self._convert_frame(self._source)
+        if converted is self._source:
+            # The source's pixels change in place on the next seek
+            converted = converted.copy()
+        self.im = converted.im
+        self._mode = converted.mode
+        self._size = converted.size
+        self.palette = converted.palette
+        self.info = dict(converted.info)
+        # Durations live in the source frame; converted frames may have dropped them
+        self.source_info = dict(self._source.info)
+        self._frame = frame
+        self._disposal[frame] = _source_disposal(self._source)
+
+    def tell(self) -> int:
+        return self._frame
+
+    def disposal(self, frame: int) -> int:
+        """
+        Returns the disposal method the source used for an already decoded frame.
+        """
+        return self._disposal[frame]
+
+
+class FrameValues(list):
+    """
+    A per-frame save option (duration, disposal) that is filled in while
+    the frames are being decoded.
+
+    Pillow's GIF, PNG and WEBP writers look up per-frame options by index
+    right after seeking to that frame, so the values need not be known in
+    advance, which would take an extra decoding pass over the animation.
+    """
+
+    def __init__(self, frames: ConvertedFrames, value: Callable[[ConvertedFrames, int], Any]):
+        """
+        Args:
+            frames (ConvertedFrames): The frames being saved.
+            value (Callable[[ConvertedFrames, int], Any]): Reads the option for
+                a frame index, once the frames are positioned on it.
+        """
+        super().__init__()
+        self._frames = frames
+        self._value = value
+
+    def __getitem__(self, index: int) -> Any:
+        return self._value(self._frames, index)
+
+    def __len__(self) -> int:
+        return self._frames.n_frames
+
+
+def _source_disposal(source: Image.Image) -> int:
+    # Returned as a GIF disposal method; APNG sources are mapped to it
+    if source.format == "GIF":
+        return getattr(source, "disposal_method", _GIF_NONE)
+    disposal = source.info.get("disposal")
+    if disposal == _APNG_BACKGROUND:
+        return _GIF_BACKGROUND
+    if disposal == _APNG_PREVIOUS:
+        return _GIF_PREVIOUS
+    return _GIF_NONE
+
+
+def _target_disposal(frames: ConvertedFrames, index: int, target_format: str) -> int:
+    disposal = frames.disposal(index)
+    if disposal == _GIF_PREVIOUS:
+        # Frames are written fully composited, and the GIF and PNG writers
+        # only compute deltas against the last frame or the background
+        transparent = frames.mode in ("RGBA", "LA", "PA") or "transparency" in frames.info
+        disposal = _GIF_BACKGROUND if transparent else _GIF_KEEP
+    if target_format == "PNG":
+        return _APNG_BACKGROUND if disposal == _GIF_BACKGROUND else _APNG_NONE
+    return disposal
+
+
+def save_options(source: Image.Image, frames: ConvertedFrames, target_format: str) -> Dict[str, Any]:
+    """
+    Builds the save() options that carry the animation over to the target.
+
+    Args:
+        source (Image.Image): The opened source image.
+        frames (ConvertedFrames): The frames being saved.
+        target_format (str): Pillow format name of the target.
+
+    Returns:
+        Dict[str, Any]: save_all and, where both formats have them, per-frame
+                        durations, disposal methods and the loop count.
+    """
+    options: Dict[str, Any] = {"save_all": True}
+    if target_format not in ("GIF", "PNG", "WEBP"):
+        return options
+    if "duration" in source.info:
+        options["duration"] = FrameValues(frames, lambda frames, index: frames.source_info.get("duration", 0))
+    if "loop" in source.info:
+        options["loop"] = source.info["loop"]
+    elif source.format == "GIF" and target_format != "GIF":
+        # A GIF without a loop count plays once; WEBP and APNG default to forever
+        options["loop"] = 1
+    if target_format != "WEBP" and source.format in ("GIF", "PNG"):
+        options["disposal"] = FrameValues(frames, lambda frames, index: _target_disposal(frames, index, target_format))
+    return options
+
+
+def save_frames(
+    source: Image.Image,
+    out: Any,
+    target_format: str,
+    convert_frame: Callable[[Image.Image], Image.Image],
+    options: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Writes every frame of a multi-frame source to a save_all capable format.
+
+    Args:
+        source (Image.Image): The opened source image.
+        out (Any): Destination path or binary file.
+        target_format (str): Pillow format name of the target.
+        convert_frame (Callable[[Image.Image], Image.Image]): Converts the source,
+            positioned on a frame, to a mode the target accepts.
+        options (Optional[Dict[str, Any]]): Further encoder parameters, e.g. from a preset.
+    """
+    frames = ConvertedFrames(source, convert_frame)
+    try:
+        frames.save(out, format=target_format, **save_options(source, frames, target_format), **(options or {}))
+    finally:
+        source.seek(0)
@@ -0,0 +1,170 @@
+import io
+import struct
+from typing import IO, Dict, List, Optional, Sequence, Tuple, Union
+
+from PIL import Image
+
+# Icon files hold the same picture at several sizes. All entries are
+# derived from one decoded image through a pyramid of 2x box reductions,
+# so each entry is resampled from a level at most twice its size instead
+# of from the full-size image.
+
+ICON_FORMATS = ("ICO", "ICNS")
+
+# Windows shell sizes; the ICO format stores at most 256x256
+ICO_SIZES: Tuple[int, ...] = (16, 24, 32, 48, 64, 128, 256)
+# Finder sizes, including the Retina variants
+ICNS_SIZES: Tuple[int, ...] = (16, 32, 64, 128, 256, 512, 1024)
+MAX_ICO_SIZE = 256
+
+# ICNS element types holding a PNG, per pixel size. The 2x types repeat
+# the data of the next size up and are written when that size is present.
+_ICNS_TYPES: Dict[int, Tuple[bytes, ...]] = {
+    16: (b"icp4",),
+    32: (b"icp5", b"ic11"),
+    64: (b"icp6", b"ic12"),
+    128: (b"ic07",),
+    256: (b"ic08", b"ic13"),
+    512: (b"ic09", b"ic14"),
+    1024: (b"ic10",),
+}
+
+
+def default_sizes(target_format: str) -> Tuple[int, ...]:
+    """
+    Returns the sizes written when none are requested.
+
+    Args:
+        target_format (str): "ICO" or "ICNS".
+
+    Returns:
+        Tuple[int, ...]: Icon sizes in pixels.
+    """
+    return ICNS_SIZES if target_format.upper() == "ICNS" else ICO_SIZES
+
+
+def supported_sizes(target_format: str, sizes: Sequence[int]) -> List[int]:
+    """
+    Filters sizes down to those the icon format can store.
+
+    Args:
+        target_format (str): "ICO" or "ICNS".
+        sizes (Sequence[int]): Requested sizes in pixels.
+
+    Returns:
+        List[int]: Storable sizes, largest first, without duplicates.
+    """
+    if target_format.upper() == "ICNS":
+        allowed = [size for size in sizes if size in _ICNS_TYPES]
+    else:
+        allowed = [size for size in sizes if 0 < size <= MAX_ICO_SIZE]
+    return sorted(set(allowed), reverse=True)
+
+
+def _pyramid_mode(img: Image.Image) -> str:
+    # Modes Image.reduce() handles; alpha is kept, palettes are expanded
+    has_alpha = img.mode in ("LA", "PA", "RGBA") or "transparency" in img.info
+    if img.mode in ("1", "L", "LA", "I", "I;16", "F"):
+        return "LA" if has_alpha else "L"
+    return "RGBA" if has_alpha else "RGB"
+
+
+def icon_pyramid(img: Image.Image, sizes: Sequence[int]) -> List[Image.Image]:
+    """
+    Builds square icon entries of the given sizes from one image.
+
+    The image is halved with a 2x2 box filter until the next halving would
+    drop below the entry size, and the entry is then resampled from that
+    level with Lanczos. Levels are shared by all entries. Non-square images
+    are centered on a transparent square. Sizes larger than the image are
+    skipped unless no size fits, in which case only the smallest is made.
+
+    Args:
+        img (Image.Image): The decoded source image.
+        sizes (Sequence[int]): Entry sizes in pixels.
+
+    Returns:
+        List[Image.Image]: One image per kept size, largest first.
+    """
+    sizes = sorted(set(sizes), reverse=True)
+    longest = max(img.size)
+    fitting = [size for size in sizes if size <= longest]
+    sizes = fitting or sizes[-1:]
+    mode = _pyramid_mode(img)
+    level = img if img.mode == mode else img.convert(mode)
+    entries = []
+    for size in sizes:
+        # Reduce while the level stays at least twice the entry size
+        while max(level.size) >= 2 * size and min(level.size) >= 2:
+            level = level.reduce(2)
+        scale = size / max(level.size)
+        fitted = (max(1, round(level.width * scale)), max(1, round(level.height * scale)))
+        entry = level if level.size == fitted else level.resize(fitted, Image.Resampling.LANCZOS)
+        if entry.size != (size, size):
+            padded_mode = mode if mode.endswith("A") else mode + "A"
+            canvas = Image.new(padded_mode, (size, size))
+            canvas.paste(entry.convert(padded_mode), ((size - entry.width) // 2, (size - entry.height) // 2))
+            entry = canvas
+        entries.append(entry)
+    return entries
+
+
+def _write_icns(entries: Sequence[Image.Image], fp: IO[bytes]) -> None:
+    # Header, table of contents, then one PNG element per type
+    by_size = {entry.width: entry for entry in entries}
+    elements = []
+    for size, types in sorted(_ICNS_TYPES.items()):
+        if size not in by_size:
+            continue
+        data = io.BytesIO()
+        by_size[size].save(data, format="PNG")
+        elements.append((types[0], data.getvalue()))
+        # Retina types describe the next smaller size at double density
+        if len(types) > 1 and size // 2 in by_size:
+            elements.append((types[1], data.getvalue()))
+    toc = b"".join(struct.pack(">4si", kind, len(data) + 8) for kind, data in elements)
+    length = 8 + 8 + len(toc) + sum(len(data) + 8 for _, data in elements)
+    fp.write(struct.pack(">4si", b"icns", length))
+    fp.write(struct.pack(">4si", b"TOC ", len(toc) + 8))
+    fp.write(toc)
+    for kind, data in elements:
+        fp.write(struct.pack(">4si", kind, len(data) + 8))
+        fp.write(data)
+
+
+def save_icon(
+    img: Image.Image,
+    out: Union[str, IO[bytes]],
+    target_format: str,
+    sizes: Optional[Sequence[int]] = None,
+) -> None:
+    """
+    Writes a multi-resolution ICO or ICNS file from one decoded image.
+
+    Args:
+        img (Image.Image): The decoded source image.
+        out (Union[str, IO[bytes]]): Destination path or binary file.
+        target_format (str): "ICO" or "ICNS".
+        sizes (Optional[Sequence[int]]): Entry sizes in pixels; sizes the format
+            cannot store are ignored. Defaults to default_sizes(target_format).
+
+    Raises:
+        ValueError: If none of the sizes can be stored in the format.
+    """
+    target_format = target_format.upper()
+    kept = supported_sizes(target_format, sizes or default_sizes(target_format))
+    if not kept:
+        raise ValueError(f"no valid {target_format} sizes in {list(sizes or [])}")
+    entries = icon_pyramid(img, kept)
+    if target_format == "ICNS":
+        if isinstance(out, str):
+            with open(out, "wb") as fp:
+                _write_icns(entries, fp)
+        else:
+            _write_icns(entries, out)
+        return
+    # Pillow's ICO writer uses the provided image of each size as is
+    largest = entries[0]
+    largest.save(
+        out, format="ICO", sizes=[entry.size for entry in entries], append_images=entries[1:],
+    )
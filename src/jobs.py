@@ -0,0 +1,429 @@
+import threading
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from queue import Full
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from .cache import ImageCache
+from .metrics import emit, has_hooks
+from .pdf import PdfResult, combine_pdf
+from .utils import BatchResult, convert_batch, convert_fanout, convert_targets
+
+
+class JobStatus(str, Enum):
+    """
+    Lifecycle states of a background job.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job function when the job has been cancelled.
+    """
+
+
+class Job:
+    """
+    A unit of work submitted to a JobQueue.
+
+    Job functions receive their Job as the first argument and use
+    report() to publish progress and check_cancelled() to stop early.
+    """
+
+    def __init__(self, job_id: int, description: str, queue: "JobQueue"):
+        """
+        Initialize a queued job.
+
+        Args:
+            job_id (int): Unique id within the owning queue.
+            description (str): Human readable label shown in the UI.
+            queue (JobQueue): The queue that runs this job.
+        """
+        self.id = job_id
+        self.description = description
+        self.status: JobStatus = JobStatus.QUEUED
+        self.progress: float = 0.0
+        self.message: str = ""
+        # Items of a counted job, see count(); total stays 0 otherwise
+        self.done: int = 0
+        self.total: int = 0
+        self.failed: int = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self._queue = queue
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        Whether cancellation has been requested.
+        """
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self) -> bool:
+        """
+        Whether the job reached a final state.
+        """
+        return self.status in (JobStatus.DONE, JobStatus.FAILED, JobStatus.CANCELLED)
+
+    @property
+    def seconds(self) -> float:
+        """
+        Time the job has been running, or ran until it finished.
+        """
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def cancel(self) -> None:
+        """
+        Requests cancellation. Queued jobs never start; running jobs stop
+        at their next check_cancelled() call.
+        """
+        self._cancel_event.set()
+        self._queue._finish(self, JobStatus.CANCELLED, only_from=JobStatus.QUEUED)
+
+    def check_cancelled(self) -> None:
+        """
+        Raises JobCancelled if cancellation was requested.
+        """
+        if self.cancelled:
+            raise JobCancelled()
+
+    def report(self, progress: float, message: str = "") -> None:
+        """
+        Publishes progress to the queue subscribers.
+
+        Args:
+            progress (float): Fraction done, between 0 and 1.
+            message (str): Optional short status message.
+        """
+        self.progress = max(0.0, min(1.0, progress))
+        self.message = message
+        self._queue._notify(self)
+
+    def count(self, done: int, total: int, failed: int = 0) -> None:
+        """
+        Publishes progress of a job made of many items, e.g. the files of a
+        batch. The UI derives throughput and time left from the counts.
+
+        Args:
+            done (int): Items finished, failed ones included.
+            total (int): Items in the job.
+            failed (int): Items that failed.
+        """
+        self.done, self.total, self.failed = done, total, failed
+        self.report(done / total if total else 0.0, f"{done}/{total}")
+
+
+class JobQueue:
+    """
+    Runs conversions on background threads so UI callbacks return immediately.
+
+    Pillow releases the GIL while decoding and encoding, so worker threads
+    do not stall the Flet event loop. The number of queued and running jobs
+    is bounded; submit() raises queue.Full when the limit is reached.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 16):
+        """
+        Initialize the queue.
+
+        Args:
+            workers (int): Number of jobs that run at the same time.
+            max_pending (int): Maximum number of queued and running jobs.
+        """
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs: Dict[int, Job] = {}
+        self._pending = 0
+        self._busy_seconds = 0.0
+        self._subscribers: List[Callable[[Job], None]] = []
+
+    @property
+    def jobs(self) -> List[Job]:
+        """
+        All jobs in submission order.
+        """
+        with self._lock:
+            return list(self._jobs.values())
+
+    @property
+    def results(self) -> List[Job]:
+        """
+        Finished jobs in submission order.
+        """
+        return [job for job in self.jobs if job.finished]
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of queued and running jobs.
+        """
+        return self._pending
+
+    @property
+    def busy_seconds(self) -> float:
+        """
+        Running time of all finished jobs, summed over the workers.
+        """
+        return self._busy_seconds
+
+    def subscribe(self, callback: Callable[[Job], None]) -> None:
+        """
+        Registers a callback invoked on every job state or progress change.
+        Callbacks run on worker threads.
+
+        Args:
+            callback (Callable[[Job], None]): Receives the changed job.
+        """
+        self._subscribers.append(callback)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, description: str = "", **kwargs: Any) -> Job:
+        """
+        Queues fn(job, *args, **kwargs) for execution.
+
+        Args:
+            fn (Callable[..., Any]): Job function; its return value becomes job.result.
+            description (str): Human readable label.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            queue.Full: If max_pending jobs are already queued or running.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise Full(f"Job queue is full ({self.max_pending} pending)")
+            job = Job(next(self._ids), description, self)
+            self._jobs[job.id] = job
+            self._pending += 1
+        self._notify(job)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def cancel_all(self) -> None:
+        """
+        Requests cancellation of every unfinished job.
+        """
+        for job in self.jobs:
+            if not job.finished:
+                job.cancel()
+
+    def clear_finished(self) -> None:
+        """
+        Drops finished jobs from the results list.
+        """
+        with self._lock:
+            self._jobs = {job_id: job for job_id, job in self._jobs.items() if not job.finished}
+
+    def shutdown(self, cancel: bool = True) -> None:
+        """
+        Stops the worker threads.
+
+        Args:
+            cancel (bool): Cancel unfinished jobs instead of waiting for them.
+        """
+        if cancel:
+            self.cancel_all()
+        self._executor.shutdown(wait=not cancel, cancel_futures=cancel)
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        with self._lock:
+            if job.finished:
+                return
+            job.status = JobStatus.RUNNING
+            job.started_at = time.perf_counter()
+        self._notify(job)
+        try:
+            job.check_cancelled()
+            job.result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            self._finish(job, JobStatus.CANCELLED)
+        except Exception as ex:
+            job.error = f"{type(ex).__name__}: {ex}"
+            self._finish(job, JobStatus.FAILED)
+        else:
+            job.progress = 1.0
+            self._finish(job, JobStatus.DONE)
+
+    def _finish(self, job: Job, status: JobStatus, only_from: Optional[JobStatus] = None) -> None:
+        with self._lock:
+            if job.finished or (only_from and job.status != only_from):
+                return
+            job.status = status
+            self._pending -= 1
+            if job.started_at is not None:
+                job.finished_at = time.perf_counter()
+                self._busy_seconds += job.finished_at - job.started_at
+        self._notify(job)
+
+    def _notify(self, job: Job) -> None:
+        for callback in list(self._subscribers):
+            try:
+                callback(job)
+            except Exception:
+                # A broken subscriber must not kill the worker thread
+                pass
+
+
+# Progress reported when each stage of a single conversion starts
+_STAGE_PROGRESS = {"open": (0.05, "Opening"), "load": (0.1, "Decoding"), "convert": (0.4, "Converting"), "encode": (0.5, "Encoding")}
+
+
+def convert_job(
+    job: Job,
+    path: str,
+    target_format: str,
+    out_path: str,
+    cache: Optional[ImageCache] = None,
+    max_size: Optional[int] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> str:
+    """
+    Job function converting one file, reporting progress per stage.
+
+    Args:
+        job (Job): The running job.
+        path (str): Input file path.
+        target_format (str): Target format from the supported formats list.
+        out_path (str): Destination path.
+        cache (Optional[ImageCache]): Decoded image cache shared between jobs.
+        max_size (Optional[int]): Maximum width and height of the output.
+        target_size (Optional[int]): File size budget in bytes of a JPEG or WEBP output.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+
+    Returns:
+        str: The written path.
+
+    Raises:
+        ValueError: If the conversion failed.
+    """
+    def on_stage(stage: str) -> None:
+        job.check_cancelled()
+        job.report(*_STAGE_PROGRESS[stage])
+
+    result = convert_targets(
+        path, [(target_format, out_path)], collect_metrics=has_hooks(), on_stage=on_stage,
+        cache=cache, max_size=max_size, target_size=target_size, preset=preset,
+    )[0]
+    emit(result.metrics)
+    job.check_cancelled()
+    if result.error:
+        raise ValueError(result.error)
+    return out_path
+
+
+def fanout_job(
+    job: Job,
+    path: str,
+    target_formats: Sequence[str],
+    out_dir: str,
+    cache: Optional[ImageCache] = None,
+    max_size: Optional[int] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> List[BatchResult]:
+    """
+    Job function converting one file to several formats with a single decode.
+
+    Args:
+        job (Job): The running job.
+        path (str): Input file path.
+        target_formats (Sequence[str]): Target formats from the supported formats list.
+        out_dir (str): Output directory.
+        cache (Optional[ImageCache]): Decoded image cache shared between jobs.
+        max_size (Optional[int]): Maximum width and height of the outputs.
+        target_size (Optional[int]): File size budget in bytes of JPEG and WEBP outputs.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+
+    Returns:
+        List[BatchResult]: One result per target format.
+    """
+    job.report(0.05, f"Converting to {len(target_formats)} formats")
+    return convert_fanout(
+        path, target_formats, out_dir, cache=cache, max_size=max_size, target_size=target_size, preset=preset,
+    )
+
+
+def batch_job(
+    job: Job,
+    paths: List[str],
+    target_format: Union[str, Sequence[str]],
+    out_dir: str,
+    workers: Optional[int] = None,
+    max_size: Optional[int] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> List[BatchResult]:
+    """
+    Job function converting many files with convert_batch().
+
+    Args:
+        job (Job): The running job.
+        paths (List[str]): Input file paths.
+        target_format (Union[str, Sequence[str]]): Target format, or several.
+        out_dir (str): Output directory.
+        workers (Optional[int]): Number of worker processes.
+        max_size (Optional[int]): Maximum width and height of the outputs.
+        target_size (Optional[int]): File size budget in bytes of JPEG and WEBP outputs.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+
+    Returns:
+        List[BatchResult]: One result per input and target format.
+    """
+    total = len(paths) * (1 if isinstance(target_format, str) else len(target_format))
+    done = 0
+    failed = 0
+
+    def on_result(result: BatchResult) -> None:
+        nonlocal done, failed
+        done += 1
+        failed += bool(result.error)
+        job.count(done, total, failed)
+
+    results = convert_batch(
+        paths, target_format, out_dir, workers=workers, max_size=max_size, target_size=target_size,
+        preset=preset, on_result=on_result, is_cancelled=lambda: job.cancelled,
+    )
+    job.check_cancelled()
+    return results
+
+
+def pdf_job(
+    job: Job,
+    paths: List[str],
+    out_path: str,
+    max_size: Optional[int] = None,
+) -> PdfResult:
+    """
+    Job function combining many files into one PDF with combine_pdf().
+
+    Args:
+        job (Job): The running job.
+        paths (List[str]): Input file paths in page order.
+        out_path (str): Destination PDF path.
+        max_size (Optional[int]): Maximum width and height of page images.
+
+    Returns:
+        PdfResult: Pages written and throughput.
+    """
+    def on_page(done: int, path: str) -> None:
+        job.check_cancelled()
+        job.count(done, len(paths))
+
+    return combine_pdf(paths, out_path, max_size=max_size, on_page=on_page)
@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import sys
+import time
+from collections import Counter
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from .stats import percentile
+
+# Load test of the HTTP conversion service (src/server.py).
+# Run with "python -m src.loadtest IMAGE --to webp"; see --help.
+# Each client keeps one connection open and sends requests back to back,
+# so the offered load is set by --concurrency. Only servers on this
+# machine can be targeted.
+
+
+class Sample(NamedTuple):
+    """
+    Outcome of one request.
+
+    Attributes:
+        status (int): HTTP status, 0 if the connection failed.
+        seconds (float): Time from sending the request to the end of the response.
+        response_bytes (int): Size of the response body.
+    """
+    status: int
+    seconds: float
+    response_bytes: int
+
+
+def is_local(host: str) -> bool:
+    """
+    Checks whether a host name resolves to a loopback address.
+    """
+    try:
+        return all(
+            ipaddress.ip_address(info[4][0]).is_loopback
+            for info in socket.getaddrinfo(host, None)
+        )
+    except (OSError, ValueError):
+        return False
+
+
+async def _request(
+    connection: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]],
+    host: str,
+    port: int,
+    target: str,
+    body: bytes,
+) -> Tuple[int, int, Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]]:
+    # Returns the status, the body size and the connection if it can be reused
+    if connection is None:
+        connection = await asyncio.open_connection(host, port)
+    reader, writer = connection
+    writer.write(
+        f"POST {target} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    status = int(head[0].split(" ")[1])
+    headers = {
+        name.strip().lower(): value.strip()
+        for name, _, value in (line.partition(":") for line in head[1:] if line)
+    }
+    length = int(headers.get("content-length", 0))
+    await reader.readexactly(length)
+    if headers.get("connection", "").lower() == "close":
+        writer.close()
+        return status, length, None
+    return status, length, connection
+
+
+async def _client(host: str, port: int, target: str, body: bytes, deadline: float, budget: List[int], samples: List[Sample]) -> None:
+    connection = None
+    while budget[0] > 0 and time.perf_counter() < deadline:
+        budget[0] -= 1
+        start = time.perf_counter()
+        try:
+            status, size, connection = await _request(connection, host, port, target, body)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            status, size = 0, 0
+            if connection:
+                connection[1].close()
+            connection = None
+        samples.append(Sample(status, time.perf_counter() - start, size))
+        if status == 429:
+            # Back off briefly, like a well-behaved client honoring Retry-After
+            await asyncio.sleep(0.05)
+    if connection:
+        connection[1].close()
+
+
+async def _fetch_metrics(host: str, port: int) -> Optional[dict]:
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f"GET /metrics HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return json.loads(response.split(b"\r\n\r\n", 1)[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+async def run_load(
+    url: str,
+    body: bytes,
+    params: dict,
+    concurrency: int,
+    requests: int,
+    duration: Optional[float] = None,
+) -> Tuple[List[Sample], float]:
+    """
+    Sends conversion requests from concurrent clients.
+
+    Args:
+        url (str): Server base URL, e.g. "http://127.0.0.1:8080".
+        body (bytes): Image file to upload with each request.
+        params (dict): Query parameters of /convert.
+        concurrency (int): Number of clients, each with one connection.
+        requests (int): Total requests to send.
+        duration (Optional[float]): Stop after this many seconds even if
+            requests remain.
+
+    Returns:
+        Tuple[List[Sample], float]: The samples and the elapsed seconds.
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname or "127.0.0.1", parts.port or 80
+    target = f"/convert?{urlencode(params)}"
+    deadline = time.perf_counter() + (duration or float("inf"))
+    budget = [requests]
+    samples: List[Sample] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, target, body, deadline, budget, samples) for _ in range(concurrency)
+    ))
+    return samples, time.perf_counter() - start
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the command line argument parser of the load test.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m src.loadtest",
+        description="Measure throughput and latency of a local conversion server (python -m src.server).",
+    )
+    parser.add_argument("image", help="Image file uploaded with every request.")
+    parser.add_argument("--to", required=True, help="Target format.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="Server URL (default: http://127.0.0.1:8080).")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Concurrent clients (default: 8).")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="Total requests (default: 200).")
+    parser.add_argument("--duration", type=float, default=None, metavar="SECONDS", help="Stop after this long.")
+    parser.add_argument("--max-size", type=int, default=None, metavar="PX", help="Passed to the server as max_size.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the load test and prints requests/s and latency percentiles.
+
+    Args:
+        argv (Optional[List[str]]): Arguments, defaults to sys.argv[1:].
+
+    Returns:
+        int: Process exit code; 1 if the server is not local or no request succeeded.
+    """
+    args = build_parser().parse_args(argv)
+    host = urlsplit(args.url).hostname or ""
+    if not is_local(host):
+        print(f"Refusing to load test {host!r}: only servers on this machine can be targeted.", file=sys.stderr)
+        return 1
+    with open(args.image, "rb") as fp:
+        body = fp.read()
+    params = {"to": args.to, "filename": os.path.basename(args.image)}
+    if args.max_size:
+        params["max_size"] = args.max_size
+
+    async def run() -> Tuple[List[Sample], float, Optional[dict]]:
+        samples, elapsed = await run_load(args.url, body, params, args.concurrency, args.requests, args.duration)
+        parts = urlsplit(args.url)
+        return samples, elapsed, await _fetch_metrics(parts.hostname, parts.port or 80)
+
+    samples, elapsed, server = asyncio.run(run())
+    ok = [sample.seconds for sample in samples if sample.status == 200]
+    report = {
+        "requests": len(samples),
+        "statuses": {str(status): count for status, count in sorted(Counter(s.status for s in samples).items())},
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_p50": round(percentile(ok, 50), 4),
+        "latency_p90": round(percentile(ok, 90), 4),
+        "latency_p99": round(percentile(ok, 99), 4),
+        "server": server,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['requests']} requests in {report['seconds']}s, statuses: {report['statuses']}")
+        print(f"{report['requests_per_second']} conversions/s, latency p50 {report['latency_p50'] * 1000:.1f} ms, "
+              f"p90 {report['latency_p90'] * 1000:.1f} ms, p99 {report['latency_p99'] * 1000:.1f} ms")
+        if server:
+            print(f"server: peak in flight {server['peak_in_flight']}/{server['capacity']}, "
+                  f"{server['workers']} workers")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import mmap
+from typing import IO, Optional, Union
+
+from PIL import Image
+
+from .streaming import _BYTES_PER_PIXEL, _PIPELINE_COPIES, _raw_stride, _writer_class, band_tiles, can_stream
+from .utils import apply_plan, conversion_plan
+
+# Memory-mapped conversion of uncompressed sources (PPM/PGM/PBM, BMP, TGA,
+# IM, SGI and TIFF stored as one raw block) to the row-oriented writers of
+# the streaming module.
+#
+# The file is mapped instead of read, so no Python buffers are involved:
+# bands are decoded straight from the mapping, and not copied at all when
+# the file stores the image's own mode in a layout Pillow can use as is
+# (8 bit L and P, RGBA and 16 bit gray). When the source rows are already stored the way the target
+# stores them (e.g. PPM to TIFF, 24 bit BMP to BMP), they are written from
+# the mapping with bulk writes and never decoded.
+
+# Pixel data decoded at a time when no memory budget is given
+MAPPED_BAND_SIZE = 16 * 1024 * 1024
+
+
+def can_map(img: Image.Image, target_format: str) -> bool:
+    """
+    Checks whether an opened image can be converted through a memory map.
+
+    Args:
+        img (Image.Image): An image returned by Image.open(), not loaded yet.
+        target_format (str): Target format from the supported formats list.
+
+    Returns:
+        bool: True if the pixels are one uncompressed block and the target
+              has a row-oriented writer for the converted mode.
+    """
+    return len(img.tile) == 1 and can_stream(img, target_format)
+
+
+class MappedSource:
+    """
+    Read-only memory map of an uncompressed image file, read in bands of rows.
+    """
+
+    def __init__(self, path: str, img: Image.Image):
+        """
+        Maps the file.
+
+        Args:
+            path (str): Image file path.
+            img (Image.Image): The file opened with Image.open(), not loaded;
+                provides the mode, size, palette and pixel layout.
+        """
+        self.img = img
+        self.rawmode = band_tiles(img, 0, img.height)[0][3][0]
+        with open(path, "rb") as fp:
+            self.map: Optional[mmap.mmap] = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+
+    def _region(self, top: int, bottom: int):
+        tile = band_tiles(self.img, top, bottom)[0]
+        offset, (rawmode, stride, orientation) = tile[2], tile[3]
+        end = offset + (bottom - top) * stride
+        if end > len(self.map):
+            raise ValueError("image file is truncated")
+        return memoryview(self.map)[offset:end], rawmode, stride, orientation
+
+    def band(self, top: int, bottom: int) -> Image.Image:
+        """
+        Decodes rows top to bottom from the mapping.
+
+        Args:
+            top (int): First row of the band.
+            bottom (int): Row after the last row of the band.
+
+        Returns:
+            Image.Image: The band, with the source's palette and info. It may
+                reference the mapping, so it must be released before close().
+        """
+        data, rawmode, stride, orientation = self._region(top, bottom)
+        size = (self.img.width, bottom - top)
+        if rawmode == self.img.mode:
+            decoded = Image.frombuffer(self.img.mode, size, data, "raw", rawmode, stride, orientation)
+        else:
+            # frombuffer() maps other layouts as they are stored, e.g. an RGB
+            # TIFF with a padding sample as RGBX, so decode into the mode
+            decoded = Image.frombytes(self.img.mode, size, data, "raw", rawmode, stride, orientation)
+        return self.img._new(decoded.im)
+
+    def packed(self, top: int, bottom: int) -> Union[bytes, memoryview]:
+        """
+        Returns rows top to bottom as stored, in rawmode, without row padding.
+
+        Args:
+            top (int): First row of the band.
+            bottom (int): Row after the last row of the band.
+
+        Returns:
+            Union[bytes, memoryview]: The rows in top-down order; a view of the
+                mapping when the file stores them that way already.
+        """
+        data, rawmode, stride, orientation = self._region(top, bottom)
+        row = _raw_stride(self.img.mode, rawmode, self.img.width)
+        if row == stride and orientation > 0:
+            return data
+        rows = [data[i:i + row] for i in range(0, len(data), stride)]
+        if orientation < 0:
+            rows.reverse()
+        return b"".join(rows)
+
+    def release(self, top: int, bottom: int) -> None:
+        """
+        Drops the mapped pages of rows top to bottom from the process.
+
+        Mapped pages that were read count as resident memory until released;
+        the file stays in the OS page cache, so reading them again is cheap.
+        """
+        if not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        tile = band_tiles(self.img, top, bottom)[0]
+        start = tile[2] // mmap.PAGESIZE * mmap.PAGESIZE
+        end = min(len(self.map), tile[2] + (bottom - top) * tile[3][1])
+        self.map.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def close(self) -> None:
+        """
+        Unmaps the file.
+        """
+        if self.map is None:
+            return
+        try:
+            self.map.close()
+        except BufferError:
+            # A band still references the mapping; it is unmapped once released
+            pass
+        self.map = None
+
+    def __enter__(self) -> "MappedSource":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def write_mapped(
+    source: MappedSource,
+    out: Union[str, IO[bytes]],
+    target_format: str,
+    band_size: int = MAPPED_BAND_SIZE,
+) -> bool:
+    """
+    Converts a mapped source band by band and writes it to a row-oriented format.
+
+    Args:
+        source (MappedSource): The mapped source; check can_map() first.
+        out (Union[str, IO[bytes]]): Destination path or seekable binary file.
+        target_format (str): Target format from the supported formats list.
+        band_size (int): Approximate memory budget for pixel data in bytes.
+
+    Returns:
+        bool: True if the rows were copied from the mapping without decoding.
+    """
+    target_format = target_format.upper()
+    img = source.img
+    width, height = img.size
+    plan = conversion_plan(img, target_format)
+    rows = max(1, band_size // (_PIPELINE_COPIES * _BYTES_PER_PIXEL * max(width, 1)))
+    fp = open(out, "wb") if isinstance(out, str) else out
+    try:
+        writer = _writer_class(target_format)(fp, width, height)
+        copy = not plan and writer.packed_rawmode(img.mode) == source.rawmode
+        # Gives the writer the mode and palette of the source without decoding it
+        header = img._new(Image.new(img.mode, (width, 1)).im)
+        for top in range(0, height, rows):
+            bottom = min(height, top + rows)
+            if copy:
+                writer.write_packed(header, source.packed(top, bottom), bottom - top)
+            else:
+                band = source.band(top, bottom)
+                writer.write(apply_plan(band, plan))
+                del band
+            source.release(top, bottom)
+        writer.close()
+    finally:
+        if fp is not out:
+            fp.close()
+    return copy
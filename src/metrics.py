@@ -0,0 +1,496 @@
+import io
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Per-stage instrumentation of conversions. Kept free of Pillow and Flet
+# imports; the conversion pipeline in utils records into StageRecorder.
+
+STAGES: Tuple[str, ...] = ("open", "load", "convert", "encode", "write")
+
+# Seconds between RSS samples while any stage is being measured
+_RSS_SAMPLE_INTERVAL = 0.005
+
+
+class StageMetrics(NamedTuple):
+    """
+    Measurements of one stage of a conversion.
+
+    Attributes:
+        stage (str): One of STAGES.
+        wall (float): Wall time in seconds.
+        cpu (float): CPU time of the converting thread in seconds.
+        bytes_read (int): Bytes read from the source file.
+        bytes_written (int): Bytes written to the output file.
+        peak_memory (Optional[int]): Peak process RSS during the stage in bytes, if known.
+    """
+    stage: str
+    wall: float
+    cpu: float
+    bytes_read: int
+    bytes_written: int
+    peak_memory: Optional[int]
+
+
+class ConversionMetrics(NamedTuple):
+    """
+    Measurements of converting one source to one target format.
+
+    Attributes:
+        source (str): Input file path.
+        target_format (str): Target format.
+        width (int): Image width in pixels (0 if the header could not be read).
+        height (int): Image height in pixels.
+        mode (str): Source image mode.
+        stages (Tuple[StageMetrics, ...]): Stage measurements in pipeline order.
+        error (Optional[str]): Error message if the conversion failed.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+    """
+    source: str
+    target_format: str
+    width: int
+    height: int
+    mode: str
+    stages: Tuple[StageMetrics, ...]
+    error: Optional[str] = None
+    preset: Optional[str] = None
+
+    @property
+    def wall(self) -> float:
+        """
+        Total wall time over all stages.
+        """
+        return sum(stage.wall for stage in self.stages)
+
+    @property
+    def output_bytes(self) -> int:
+        """
+        Size of the written output; 0 unless it was written through a CountingWriter.
+        """
+        return sum(stage.bytes_written for stage in self.stages)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns a JSON serializable representation.
+        """
+        data = self._asdict()
+        data["stages"] = [stage._asdict() for stage in self.stages]
+        data["wall"] = self.wall
+        data["output_bytes"] = self.output_bytes
+        return data
+
+
+def current_rss() -> Optional[int]:
+    """
+    Returns the current resident memory of the process in bytes, if known.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss() -> Optional[int]:
+    """
+    Returns the peak resident memory of the current process.
+
+    Returns:
+        Optional[int]: Peak RSS in bytes, or None if the platform does not report it.
+    """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    return None
+
+
+def _current_rss() -> Optional[int]:
+    # Linux only: resident pages of the process right now
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _RssSampler:
+    """
+    Samples the resident memory of the process while stages are measured.
+
+    Each stage gets the highest RSS seen between its start and end. The
+    process-wide high-water mark is never reset, because other threads'
+    stages and peak_rss() callers depend on it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Token of each running stage -> highest RSS sampled during it
+        self._peaks: Dict[int, int] = {}
+        self._next_token = 0
+        self._wake = threading.Event()
+        self._pid: Optional[int] = None
+
+    def start(self) -> Optional[int]:
+        """
+        Starts sampling for a stage; returns its token, or None if the
+        platform does not report the current RSS.
+        """
+        rss = _current_rss()
+        if rss is None:
+            return None
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._peaks[token] = rss
+            # Threads do not survive fork(), so each worker process starts its own
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="rss-sampler", daemon=True).start()
+        self._wake.set()
+        return token
+
+    def stop(self, token: int) -> int:
+        """
+        Ends sampling for a stage and returns its peak RSS in bytes.
+        """
+        rss = _current_rss() or 0
+        with self._lock:
+            return max(self._peaks.pop(token), rss)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            rss = _current_rss() or 0
+            with self._lock:
+                if not self._peaks:
+                    # Idle until the next stage starts
+                    self._wake.clear()
+                    continue
+                for token, peak in self._peaks.items():
+                    if rss > peak:
+                        self._peaks[token] = rss
+            time.sleep(_RSS_SAMPLE_INTERVAL)
+
+
+_rss_sampler = _RssSampler()
+
+
+class CountingReader:
+    """
+    File wrapper counting the bytes read through it.
+    """
+
+    def __init__(self, fp: IO[bytes]):
+        self.fp = fp
+        self.bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fp.read(size)
+        self.bytes += len(data)
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        data = self.fp.readline(size)
+        self.bytes += len(data)
+        return data
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.fp, name)
+
+    def __repr__(self) -> str:
+        # Shows up in Pillow's error messages in place of the file name
+        return repr(getattr(self.fp, "name", self.fp))
+
+
+class CountingWriter:
+    """
+    File wrapper counting the bytes written and the time spent writing,
+    so that encoding and file writes can be reported as separate stages.
+    """
+
+    def __init__(self, fp: IO[bytes]):
+        self.fp = fp
+        self.bytes = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def write(self, data: bytes) -> int:
+        wall, cpu = time.perf_counter(), time.thread_time()
+        written = self.fp.write(data)
+        self.wall += time.perf_counter() - wall
+        self.cpu += time.thread_time() - cpu
+        self.bytes += len(data)
+        return written
+
+    def fileno(self) -> int:
+        # Without a file descriptor Pillow's encoders go through write()
+        raise io.UnsupportedOperation("fileno")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.fp, name)
+
+
+class StageRecorder:
+    """
+    Records StageMetrics for the stages of one conversion.
+
+    When disabled, stage() only forwards stage names to on_stage, so the
+    pipeline can use the same code path with no measuring overhead.
+    Peak memory is the highest process RSS sampled during each stage, so
+    with concurrent conversions it includes their memory too. Where the
+    current RSS is not available it is the peak of the process so far.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        on_stage: Optional[Callable[[str], None]] = None,
+        reader: Optional[CountingReader] = None,
+    ):
+        """
+        Initialize the recorder.
+
+        Args:
+            enabled (bool): Whether to measure.
+            on_stage (Optional[Callable[[str], None]]): Called with the stage name when a stage starts.
+            reader (Optional[CountingReader]): Source file wrapper used to count bytes read.
+        """
+        self.enabled = enabled
+        self.on_stage = on_stage
+        self.reader = reader
+        self.stages: List[StageMetrics] = []
+
+    def fork(self) -> "StageRecorder":
+        """
+        Returns a recorder continuing from the stages recorded so far,
+        for pipelines that branch into several targets.
+        """
+        recorder = StageRecorder(self.enabled, self.on_stage, self.reader)
+        recorder.stages = list(self.stages)
+        return recorder
+
+    @contextmanager
+    def stage(self, name: str, writer: Optional[CountingWriter] = None) -> Iterator[None]:
+        """
+        Measures the enclosed block as one stage.
+
+        Args:
+            name (str): Stage name.
+            writer (Optional[CountingWriter]): Output wrapper; time spent in its
+                writes is split off into a separate "write" stage.
+        """
+        if self.on_stage:
+            self.on_stage(name)
+        if not self.enabled:
+            yield
+            return
+
+        read_before = self.reader.bytes if self.reader else 0
+        sample = _rss_sampler.start()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            peak = _rss_sampler.stop(sample) if sample is not None else peak_rss()
+            bytes_read = (self.reader.bytes if self.reader else 0) - read_before
+            if writer:
+                self.stages.append(StageMetrics(name, wall - writer.wall, cpu - writer.cpu, bytes_read, 0, peak))
+                self.stages.append(StageMetrics("write", writer.wall, writer.cpu, 0, writer.bytes, peak))
+            else:
+                self.stages.append(StageMetrics(name, wall, cpu, bytes_read, 0, peak))
+
+    def result(
+        self,
+        source: str,
+        target_format: str,
+        size: Tuple[int, int] = (0, 0),
+        mode: str = "",
+        error: Optional[str] = None,
+        preset: Optional[str] = None,
+    ) -> Optional[ConversionMetrics]:
+        """
+        Builds the ConversionMetrics, or None if the recorder is disabled.
+        """
+        if not self.enabled:
+            return None
+        return ConversionMetrics(source, target_format, size[0], size[1], mode, tuple(self.stages), error, preset)
+
+
+MetricsHook = Callable[[ConversionMetrics], None]
+
+_hooks: List[MetricsHook] = []
+
+
+def add_hook(hook: MetricsHook) -> None:
+    """
+    Registers a callback receiving ConversionMetrics for every conversion.
+    Conversions only collect metrics while at least one hook is registered.
+
+    Args:
+        hook (MetricsHook): The callback; may be called from worker threads.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: MetricsHook) -> None:
+    """
+    Unregisters a callback added with add_hook().
+    """
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def has_hooks() -> bool:
+    """
+    Whether any metrics hook is registered.
+    """
+    return bool(_hooks)
+
+
+def emit(metrics: Optional[ConversionMetrics]) -> None:
+    """
+    Passes metrics to every registered hook. A failing hook does not
+    affect the conversion or the other hooks.
+    """
+    if metrics is None:
+        return
+    for hook in list(_hooks):
+        try:
+            hook(metrics)
+        except Exception as ex:
+            print(f"Metrics hook {hook!r} failed: {ex}", file=sys.stderr)
+
+
+class JsonLinesLog:
+    """
+    Metrics hook appending one JSON object per conversion to a file.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the log.
+
+        Args:
+            path (str): File to append to.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, metrics: ConversionMetrics) -> None:
+        line = json.dumps(metrics.to_dict())
+        with self._lock, open(self.path, "a", encoding="utf-8") as log:
+            log.write(line + "\n")
+
+
+class SummaryRow(NamedTuple):
+    """
+    Aggregated metrics of one source format to target format pair and encoder preset.
+
+    Attributes:
+        source_format (str): Source file extension, upper case.
+        target_format (str): Target format.
+        count (int): Number of conversions.
+        stage_wall (Dict[str, float]): Average wall time per stage in seconds.
+        megapixels_per_second (float): Throughput over all conversions.
+        peak_memory (Optional[int]): Highest stage peak memory seen, in bytes.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+        output_bytes (Optional[float]): Average output size in bytes, None if
+                                        no conversion counted its output.
+    """
+    source_format: str
+    target_format: str
+    count: int
+    stage_wall: Dict[str, float]
+    megapixels_per_second: float
+    peak_memory: Optional[int]
+    preset: Optional[str] = None
+    output_bytes: Optional[float] = None
+
+
+class MetricsSummary:
+    """
+    Metrics hook aggregating conversions per source and target format and
+    encoder preset, to show which formats and sizes are the bottlenecks and
+    what each preset costs and saves.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str, Optional[str]], Dict[str, Any]] = {}
+
+    def __call__(self, metrics: ConversionMetrics) -> None:
+        if metrics.error:
+            return
+        source_format = os.path.splitext(metrics.source)[1].lstrip(".").upper() or "NAN"
+        with self._lock:
+            totals = self._totals.setdefault(
+                (source_format, metrics.target_format, metrics.preset),
+                {"count": 0, "pixels": 0, "wall": 0.0, "stages": {}, "peak": None, "outputs": 0, "bytes": 0},
+            )
+            totals["count"] += 1
+            output_bytes = metrics.output_bytes
+            if output_bytes:
+                totals["outputs"] += 1
+                totals["bytes"] += output_bytes
+            totals["pixels"] += metrics.width * metrics.height
+            totals["wall"] += metrics.wall
+            for stage in metrics.stages:
+                totals["stages"][stage.stage] = totals["stages"].get(stage.stage, 0.0) + stage.wall
+                if stage.peak_memory is not None:
+                    totals["peak"] = max(totals["peak"] or 0, stage.peak_memory)
+
+    def rows(self) -> List[SummaryRow]:
+        """
+        Returns one row per format pair and preset, slowest average conversion first.
+        """
+        with self._lock:
+            rows = [
+                SummaryRow(
+                    source_format,
+                    target_format,
+                    totals["count"],
+                    {stage: wall / totals["count"] for stage, wall in totals["stages"].items()},
+                    totals["pixels"] / 1e6 / totals["wall"] if totals["wall"] else 0.0,
+                    totals["peak"],
+                    preset,
+                    totals["bytes"] / totals["outputs"] if totals["outputs"] else None,
+                )
+                for (source_format, target_format, preset), totals in self._totals.items()
+            ]
+        return sorted(rows, key=lambda row: -sum(row.stage_wall.values()))
+
+    def clear(self) -> None:
+        """
+        Drops all aggregated metrics.
+        """
+        with self._lock:
+            self._totals.clear()
@@ -0,0 +1,385 @@
+import os
+import shutil
+import struct
+import time
+import zlib
+from typing import IO, Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image, ImageFile
+
+from .frames import frame_count
+from .metrics import CountingWriter
+from .utils import apply_plan, conversion_plan, fit_size, load_reduced
+
+# Multi-page PDF assembly from many images.
+#
+# Pages are written as soon as they are decoded: the image, content stream
+# and page object of each page go straight to the file and only their byte
+# offsets are kept, so memory does not grow with the page count. The page
+# tree, cross-reference table and trailer follow the last page. JPEG
+# sources are embedded as stored, since PDF readers decode JPEG natively,
+# and so is the compressed data of 8 bit gray, RGB and palette PNG files:
+# PDF's Flate filter with PNG predictors reads it as is.
+# Other gray, RGB and CMYK pages are JPEG encoded like Pillow's PDF writer
+# does; palette and bilevel pages and alpha masks are Flate compressed.
+
+# Page size in points is pixels * 72 / dpi; Pillow's default without dpi info
+DEFAULT_RESOLUTION = 72.0
+# Lower values are placeholders, e.g. the 1 dpi of TIFFs saved without a resolution
+_MIN_RESOLUTION = 10.0
+# Copy buffer for embedded JPEG files
+_COPY_BUFFER = 1024 * 1024
+_COLOR_SPACES = {"1": "/DeviceGray", "L": "/DeviceGray", "RGB": "/DeviceRGB", "CMYK": "/DeviceCMYK"}
+# Pillow reads and writes CMYK JPEG inverted, following Adobe's convention
+_CMYK_DECODE = " /Decode [1 0 1 0 1 0 1 0]"
+
+
+class PdfResult(NamedTuple):
+    """
+    Outcome of combining images into one PDF.
+
+    Attributes:
+        output (str): Path of the written PDF.
+        pages (int): Pages written.
+        embedded (int): JPEG and PNG pages embedded without decoding or re-encoding.
+        errors (List[Tuple[str, str]]): Source path and error of every input that was skipped.
+        seconds (float): Wall time of the whole assembly.
+        bytes_written (int): Size of the PDF.
+        pages_per_second (float): Throughput.
+    """
+    output: str
+    pages: int
+    embedded: int
+    errors: List[Tuple[str, str]]
+    seconds: float
+    bytes_written: int
+    pages_per_second: float
+
+
+def _png_palette(img: Image.Image) -> Optional[bytes]:
+    # The PLTE chunk as read by Image.open(), without decoding the pixels
+    palette = img.palette
+    if palette is None or getattr(palette, "rawmode", None) != "RGB":
+        return None
+    return bytes(palette.palette)
+
+
+def can_embed(img: Image.Image, max_size: Optional[int] = None) -> bool:
+    """
+    Checks whether an opened image can be stored in a PDF without re-encoding.
+
+    Args:
+        img (Image.Image): An image returned by Image.open(), not loaded yet.
+        max_size (Optional[int]): Maximum width and height of the page image.
+
+    Returns:
+        bool: True for single-frame files that need no resizing and are either
+              gray, RGB or CMYK JPEG, or non-interlaced 8 bit gray, RGB or
+              palette PNG without transparency.
+    """
+    if frame_count(img) != 1 or (max_size and fit_size(img.size, max_size) != img.size):
+        return False
+    if img.format == "JPEG":
+        return img.mode in _COLOR_SPACES
+    if img.format == "PNG":
+        return (
+            img.mode in ("L", "RGB", "P")
+            and len(img.tile) == 1
+            and img.tile[0][3] == img.mode
+            and not img.info.get("interlace")
+            and "transparency" not in img.info
+            and (img.mode != "P" or _png_palette(img) is not None)
+        )
+    return False
+
+
+def _copy_idat(fp: IO[bytes], out: IO[bytes]) -> None:
+    # Copies the payload of all IDAT chunks, which together form one zlib stream
+    fp.seek(8)
+    while True:
+        head = fp.read(8)
+        if len(head) < 8:
+            raise ValueError("PNG file is truncated")
+        length, kind = struct.unpack(">I4s", head)
+        if kind == b"IEND":
+            return
+        if kind != b"IDAT":
+            fp.seek(length + 4, os.SEEK_CUR)
+            continue
+        while length:
+            data = fp.read(min(length, _COPY_BUFFER))
+            if not data:
+                raise ValueError("PNG file is truncated")
+            out.write(data)
+            length -= len(data)
+        # Chunk CRC
+        fp.seek(4, os.SEEK_CUR)
+
+
+def _indexed(palette: bytes) -> str:
+    return f"[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{palette.hex()}>]"
+
+
+class PdfWriter:
+    """
+    Writes a PDF page by page to a binary file.
+
+    Each add_page() call writes the page completely; close() finishes the
+    file and must be called for it to be readable.
+    """
+
+    def __init__(self, fp: IO[bytes], max_size: Optional[int] = None):
+        """
+        Writes the file header.
+
+        Args:
+            fp (IO[bytes]): Destination, opened for writing; it does not need to be seekable.
+            max_size (Optional[int]): Maximum width and height of page images.
+        """
+        self.max_size = max_size
+        self.pages = 0
+        self.embedded = 0
+        self._out = CountingWriter(fp)
+        # Byte offset per object number - 1; the catalog (1) and the page
+        # tree (2) are written last, since only then are all pages known
+        self._offsets: List[int] = [0, 0]
+        self._kids: List[int] = []
+        self._write("%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def bytes_written(self) -> int:
+        """
+        Bytes written so far.
+        """
+        return self._out.bytes
+
+    def _write(self, text: str) -> None:
+        self._out.write(text.encode("latin-1"))
+
+    def _reserve(self) -> int:
+        self._offsets.append(0)
+        return len(self._offsets)
+
+    def _object(self, number: int, body: str) -> None:
+        self._offsets[number - 1] = self._out.bytes
+        self._write(f"{number} 0 obj\n{body}\nendobj\n")
+
+    def _stream(self, dictionary: str, write_data: Callable[[CountingWriter], None]) -> int:
+        # The length follows as its own object, so data is never buffered
+        number, length = self._reserve(), self._reserve()
+        self._offsets[number - 1] = self._out.bytes
+        self._write(f"{number} 0 obj\n<< {dictionary} /Length {length} 0 R >>\nstream\n")
+        start = self._out.bytes
+        write_data(self._out)
+        size = self._out.bytes - start
+        self._write("\nendstream\nendobj\n")
+        self._object(length, str(size))
+        return number
+
+    def _flate_image(
+        self,
+        img: Image.Image,
+        color_space: str,
+        colors: int,
+        extra: str = "",
+        write_data: Optional[Callable[[CountingWriter], None]] = None,
+    ) -> int:
+        # Pillow's PNG "zip" encoder prefixes each row with its filter type,
+        # which predictor 15 tells the PDF reader to undo
+        if write_data is None:
+            def write_data(out: CountingWriter) -> None:
+                ImageFile._save(img, out, [("zip", (0, 0) + img.size, 0, img.mode)])
+
+        parms = f"/DecodeParms << /Predictor 15 /Colors {colors} /BitsPerComponent 8 /Columns {img.width} >>"
+        return self._stream(
+            f"/Type /XObject /Subtype /Image /Width {img.width} /Height {img.height} "
+            f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter /FlateDecode {parms}{extra}",
+            write_data,
+        )
+
+    def _jpeg_image(self, img: Image.Image, write_data: Callable[[CountingWriter], None], extra: str = "") -> int:
+        decode = _CMYK_DECODE if img.mode == "CMYK" else ""
+        return self._stream(
+            f"/Type /XObject /Subtype /Image /Width {img.width} /Height {img.height} "
+            f"/ColorSpace {_COLOR_SPACES[img.mode]} /BitsPerComponent 8 /Filter /DCTDecode{decode}{extra}",
+            write_data,
+        )
+
+    def _encode(self, page: Image.Image) -> int:
+        # Writes the page image and returns its object number
+        mask = ""
+        if page.mode == "RGBA" or (page.mode == "P" and "transparency" in page.info):
+            alpha = page.getchannel("A") if page.mode == "RGBA" else page.convert("RGBA").getchannel("A")
+            mask = f" /SMask {self._flate_image(alpha, '/DeviceGray', 1)} 0 R"
+            if page.mode == "RGBA":
+                page = page.convert("RGB")
+        if page.mode == "1":
+            # Without row predictors: several readers mishandle them below 8 bits
+            return self._stream(
+                f"/Type /XObject /Subtype /Image /Width {page.width} /Height {page.height} "
+                f"/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /FlateDecode",
+                lambda out: out.write(zlib.compress(page.tobytes())),
+            )
+        if page.mode == "P":
+            return self._flate_image(page, _indexed(bytes(page.getpalette("RGB") or [])), 1, mask)
+        if page.mode in _COLOR_SPACES:
+            return self._jpeg_image(page, lambda out: page.save(out, format="JPEG"), mask)
+        raise ValueError(f"cannot write mode {page.mode} to PDF")
+
+    def _embed(self, img: Image.Image) -> int:
+        if img.format == "PNG":
+            def copy_idat(out: CountingWriter) -> None:
+                _copy_idat(img.fp, out)
+
+            if img.mode == "P":
+                return self._flate_image(img, _indexed(_png_palette(img)), 1, write_data=copy_idat)
+            return self._flate_image(img, _COLOR_SPACES[img.mode], len(img.mode), write_data=copy_idat)
+
+        def copy(out: CountingWriter) -> None:
+            img.fp.seek(0)
+            shutil.copyfileobj(img.fp, out, _COPY_BUFFER)
+
+        return self._jpeg_image(img, copy)
+
+    def add_page(self, img: Image.Image) -> bool:
+        """
+        Writes one page showing the current frame of an image.
+
+        Args:
+            img (Image.Image): An opened image. Files that can_embed() should
+                not be loaded yet; their data is copied from the file.
+
+        Returns:
+            bool: True if the page was embedded without re-encoding.
+        """
+        embed = can_embed(img, self.max_size)
+        if embed:
+            image = self._embed(img)
+        else:
+            loaded = load_reduced(img, self.max_size) if self.max_size else img
+            loaded.load()
+            image = self._encode(apply_plan(loaded, conversion_plan(loaded, "PDF")))
+        # The page keeps the physical size of the source when it is downscaled
+        dpi = [float(value) for value in img.info.get("dpi", ())[:2]]
+        if len(dpi) != 2 or min(dpi) < _MIN_RESOLUTION:
+            dpi = [DEFAULT_RESOLUTION, DEFAULT_RESOLUTION]
+        width, height = img.width * 72.0 / dpi[0], img.height * 72.0 / dpi[1]
+        content = f"q {width:.4f} 0 0 {height:.4f} 0 0 cm /Im0 Do Q".encode("latin-1")
+        contents = self._stream("", lambda out: out.write(content))
+        page = self._reserve()
+        self._object(
+            page,
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.4f} {height:.4f}] "
+            f"/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {contents} 0 R >>",
+        )
+        self._kids.append(page)
+        self.pages += 1
+        self.embedded += embed
+        return embed
+
+    def close(self) -> None:
+        """
+        Writes the page tree, the cross-reference table and the trailer.
+        """
+        kids = " ".join(f"{kid} 0 R" for kid in self._kids)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._kids)} >>")
+        self._object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self._out.bytes
+        self._write(f"xref\n0 {len(self._offsets) + 1}\n0000000000 65535 f \n")
+        # Objects of a page that failed half way were never written
+        self._write("".join(
+            f"{offset:010d} 00000 n \n" if offset else "0000000000 65535 f \n" for offset in self._offsets
+        ))
+        self._write(f"trailer\n<< /Size {len(self._offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+        self._out.flush()
+
+
+def iter_pages(paths: Iterable[str]) -> Iterator[Tuple[int, str, Union[Image.Image, Exception]]]:
+    """
+    Opens the pages of the given files one at a time.
+
+    Every page of a multi-page TIFF is yielded; other multi-frame files
+    (animations) contribute their first frame. Each file is closed once
+    the consumer asks for the next page.
+
+    Args:
+        paths (Iterable[str]): Input files in page order; may be a generator.
+
+    Yields:
+        Tuple[int, str, Union[Image.Image, Exception]]: The index of the input,
+            its path and the opened image positioned on the page, or the error
+            that prevented opening the file.
+    """
+    for number, path in enumerate(paths):
+        try:
+            img = Image.open(path)
+        except Exception as ex:
+            yield number, path, ex
+            continue
+        try:
+            pages = frame_count(img) if img.format == "TIFF" else 1
+            for index in range(pages):
+                if index:
+                    img.seek(index)
+                yield number, path, img
+        finally:
+            img.close()
+
+
+def combine_pdf(
+    paths: Iterable[str],
+    out_path: str,
+    max_size: Optional[int] = None,
+    on_page: Optional[Callable[[int, str], None]] = None,
+) -> PdfResult:
+    """
+    Combines images, in the given order, into one multi-page PDF.
+
+    Files that cannot be read are skipped and reported in the result. On
+    an exception (e.g. cancellation raised from on_page) the partial file
+    is removed.
+
+    Args:
+        paths (Iterable[str]): Input files in page order; may be a generator.
+        out_path (str): Destination PDF path.
+        max_size (Optional[int]): Maximum width and height of page images.
+        on_page (Optional[Callable[[int, str], None]]): Called after each page
+            with the number of inputs reached so far and the input path.
+
+    Returns:
+        PdfResult: Pages written, throughput and skipped inputs.
+
+    Raises:
+        ValueError: If none of the inputs could be read.
+    """
+    start = time.perf_counter()
+    errors: List[Tuple[str, str]] = []
+    try:
+        with open(out_path, "wb") as fp:
+            writer = PdfWriter(fp, max_size)
+            for number, path, page in iter_pages(paths):
+                if isinstance(page, Exception):
+                    errors.append((path, str(page)))
+                else:
+                    try:
+                        writer.add_page(page)
+                    except Exception as ex:
+                        # Nothing of a page is referenced until it is complete,
+                        # so a failed page only leaves unused bytes behind
+                        errors.append((path, str(ex)))
+                if on_page:
+                    on_page(number + 1, path)
+            if not writer.pages:
+                raise ValueError("none of the inputs could be read")
+            writer.close()
+    except BaseException:
+        try:
+            os.remove(out_path)
+        except OSError:
+            pass
+        raise
+    seconds = time.perf_counter() - start
+    return PdfResult(
+        out_path, writer.pages, writer.embedded, errors, seconds, writer.bytes_written,
+        writer.pages / seconds if seconds else 0.0,
+    )
@@ -0,0 +1,182 @@
+import math
+import os
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import flet as ft
+
+from .thumbnails import ThumbnailCache
+from .updates import UpdateCoalescer
+
+
+class PreviewGrid:
+    """
+    Scrollable thumbnail grid of the selected files.
+
+    Tiles are added a page at a time as the user scrolls, and thumbnails are
+    only requested for the tiles in and right around the viewport; requests
+    that scroll out of view are cancelled if they have not started. The
+    scroll handler does no image work, so it never blocks the UI.
+    """
+
+    # Tiles added to the grid at a time
+    PAGE_SIZE = 60
+
+    def __init__(
+        self,
+        thumbnails: ThumbnailCache,
+        updates: Optional[UpdateCoalescer] = None,
+        width: int = 560,
+        height: int = 250,
+        tile_size: int = 104,
+        spacing: int = 6,
+    ):
+        """
+        Initialize an empty, hidden grid.
+
+        Args:
+            thumbnails (ThumbnailCache): Source of the thumbnails.
+            updates (Optional[UpdateCoalescer]): Batches the tile updates of
+                thumbnails arriving together; without it each is sent at once.
+            width (int): Grid width in pixels.
+            height (int): Grid height in pixels.
+            tile_size (int): Maximum tile width and height in pixels.
+            spacing (int): Gap between tiles in pixels.
+        """
+        self.thumbnails = thumbnails
+        self.updates = updates
+        self.paths: List[str] = []
+        self.columns = max(1, math.ceil((width + spacing) / (tile_size + spacing)))
+        # Tiles are square and stretched to fill the row
+        self.row_height = (width - spacing * (self.columns - 1)) / self.columns + spacing
+        self.height = height
+        self.border_color = "#5DADE2"
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._requests: Dict[int, Optional[Future]] = {}
+        self.grid = ft.GridView(
+            width=width,
+            height=height,
+            max_extent=tile_size,
+            child_aspect_ratio=1.0,
+            spacing=spacing,
+            run_spacing=spacing,
+            on_scroll=self.on_scroll,
+            on_scroll_interval=50,
+            visible=False,
+        )
+
+    def show(self, paths: List[str]) -> None:
+        """
+        Replaces the grid content with the given files and shows it.
+
+        Args:
+            paths (List[str]): Image paths.
+        """
+        self.clear()
+        self.paths = list(paths)
+        self.grid.visible = True
+        self._add_page()
+        self._update(self.grid)
+        self._request_range(0, self._visible_rows() * self.columns)
+
+    def clear(self) -> None:
+        """
+        Empties and hides the grid, cancelling outstanding thumbnail requests.
+        """
+        with self._lock:
+            self._generation += 1
+            requests, self._requests = self._requests, {}
+        for future in requests.values():
+            if future:
+                future.cancel()
+        self.paths = []
+        self.grid.controls.clear()
+        self.grid.visible = False
+
+    def on_scroll(self, e: ft.OnScrollEvent) -> None:
+        """
+        Requests thumbnails around the viewport and adds tiles near the end.
+        """
+        first_row = int(e.pixels // self.row_height)
+        # Prefetch one screen in both directions
+        start = max(0, (first_row - self._visible_rows()) * self.columns)
+        end = (first_row + 2 * self._visible_rows()) * self.columns
+        if end >= len(self.grid.controls) and len(self.grid.controls) < len(self.paths):
+            self._add_page()
+            self._update(self.grid)
+        self._cancel_outside(start, end)
+        self._request_range(start, end)
+
+    def set_border_color(self, color: str) -> None:
+        """
+        Applies the theme color to the tile borders.
+        """
+        self.border_color = color
+        for tile in self.grid.controls:
+            tile.border = ft.border.all(1, color)
+
+    def _update(self, control: ft.Control) -> None:
+        if self.updates:
+            self.updates.mark(control)
+            return
+        try:
+            control.update()
+        except Exception:
+            # A tile may have been removed by a new selection meanwhile
+            pass
+
+    def _visible_rows(self) -> int:
+        return math.ceil(self.height / self.row_height) + 1
+
+    def _add_page(self) -> None:
+        start = len(self.grid.controls)
+        for path in self.paths[start:start + self.PAGE_SIZE]:
+            self.grid.controls.append(
+                ft.Container(
+                    content=ft.Icon(ft.Icons.IMAGE, color=self.border_color),
+                    alignment=ft.alignment.center,
+                    border=ft.border.all(1, self.border_color),
+                    border_radius=8,
+                    tooltip=os.path.basename(path),
+                )
+            )
+
+    def _request_range(self, start: int, end: int) -> None:
+        end = min(end, len(self.grid.controls))
+        with self._lock:
+            generation = self._generation
+            indexes = [index for index in range(start, end) if index not in self._requests]
+            for index in indexes:
+                self._requests[index] = None
+        for index in indexes:
+            future = self.thumbnails.request(
+                self.paths[index],
+                lambda path, thumbnail, index=index: self._on_thumbnail(generation, index, thumbnail),
+            )
+            with self._lock:
+                if generation == self._generation and index in self._requests:
+                    self._requests[index] = future
+
+    def _cancel_outside(self, start: int, end: int) -> None:
+        with self._lock:
+            outside = [
+                index for index, future in self._requests.items()
+                if future and not future.done() and not start <= index < end
+            ]
+            for index in outside:
+                if self._requests[index].cancel():
+                    # Requested again when it scrolls back into view
+                    del self._requests[index]
+
+    def _on_thumbnail(self, generation: int, index: int, thumbnail: Optional[str]) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            tile = self.grid.controls[index]
+        if thumbnail:
+            tile.content = ft.Image(src=thumbnail, fit=ft.ImageFit.CONTAIN, border_radius=8)
+        else:
+            tile.content = ft.Icon(ft.Icons.BROKEN_IMAGE, color=ft.Colors.RED_300)
+        self._update(tile)
@@ -0,0 +1,255 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, List, NamedTuple, Optional, Sequence
+
+from PIL import Image
+
+from .cache import bytes_per_pixel
+from .presets import encoder_options
+from .targetsize import PROBE_BUFFERS, TARGET_SIZE_FORMATS
+from .utils import fit_size
+
+# Memory-budgeted admission of conversion jobs.
+#
+# Image.open() only reads the header, so a job's size and mode are known
+# before anything is decoded. Peak memory is estimated from them and jobs
+# are started only while the estimates of the running jobs fit a budget.
+# Images too large for the budget are rejected up front with an error
+# instead of running a worker out of memory.
+
+# Decoded image, one converted copy per target and the encoder's buffers.
+# Targets sharing a conversion plan share their copy, so this is an upper bound.
+_BASE_COPIES = 2
+# How often the oldest waiting job may be passed over by smaller ones
+# before no more jobs are started ahead of it
+_MAX_SKIPS = 8
+
+
+class MemoryEstimate(NamedTuple):
+    """
+    Header-based estimate of a job's peak pixel memory.
+
+    Attributes:
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+        mode (str): Image mode.
+        frames (int): Number of frames or pages.
+        bytes (int): Estimated peak memory in bytes.
+    """
+    width: int
+    height: int
+    mode: str
+    frames: int
+    bytes: int
+
+
+def default_memory_budget() -> Optional[int]:
+    """
+    Returns the memory budget used when none is configured: half of the
+    physical memory, or None where it cannot be determined (e.g. Windows).
+    """
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def estimate_memory(
+    path: str,
+    target_formats: Sequence[str],
+    max_size: Optional[int] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> MemoryEstimate:
+    """
+    Estimates the peak memory of converting a file from its header alone.
+
+    Args:
+        path (str): Input file path.
+        target_formats (Sequence[str]): Target formats of the job.
+        max_size (Optional[int]): Size limit of the outputs.
+        target_size (Optional[int]): File size budget of JPEG and WEBP outputs.
+        preset (Optional[str]): Encoder preset of the outputs.
+
+    Returns:
+        MemoryEstimate: The estimate.
+
+    Raises:
+        Exception: If the header cannot be read, including Pillow's
+            DecompressionBombError for absurdly large dimensions.
+    """
+    from .mapped import MAPPED_BAND_SIZE, can_map
+
+    with Image.open(path) as img:
+        width, height, mode = img.width, img.height, img.mode
+        frames = getattr(img, "n_frames", 1)
+        mappable = all(can_map(img, fmt) and not encoder_options(fmt, preset) for fmt in target_formats)
+        if not max_size and frames == 1 and mappable:
+            # Converted from a memory map band by band, as convert_targets() does
+            return MemoryEstimate(width, height, mode, frames, MAPPED_BAND_SIZE)
+        # Later frames of animations are decoded to RGB or RGBA
+        pixel_size = 4 if frames > 1 else bytes_per_pixel(mode)
+        decoded = width * height * pixel_size
+        converted = decoded
+        if max_size:
+            fitted = fit_size(img.size, max_size)
+            converted = fitted[0] * fitted[1] * pixel_size
+            if img.format == "JPEG":
+                # Decoded at reduced scale, at most twice the output size
+                decoded = min(decoded, converted * 4)
+    estimate = decoded + converted * (_BASE_COPIES - 1 + len(target_formats))
+    if frames > 1:
+        # The GIF and APNG writers keep every converted frame until the end
+        buffered = sum(1 for fmt in target_formats if fmt.upper() in ("GIF", "PNG"))
+        estimate += converted * frames * buffered
+    if target_size:
+        # Quality probes are encoded in memory; an encoding is never
+        # larger than the pixels it was made from
+        sized = sum(1 for fmt in target_formats if fmt.upper() in TARGET_SIZE_FORMATS)
+        estimate += converted * PROBE_BUFFERS * sized
+    return MemoryEstimate(width, height, mode, frames, estimate)
+
+
+def estimate_jobs(
+    paths: Sequence[str],
+    target_formats: Sequence[str],
+    max_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> List[int]:
+    """
+    Estimates the peak memory of many conversions, reading headers on threads.
+
+    Args:
+        paths (Sequence[str]): Input file paths.
+        target_formats (Sequence[str]): Target formats of every job.
+        max_size (Optional[int]): Size limit of the outputs.
+        workers (Optional[int]): Number of reading threads.
+        target_size (Optional[int]): File size budget of JPEG and WEBP outputs.
+        preset (Optional[str]): Encoder preset of the outputs.
+
+    Returns:
+        List[int]: Estimated bytes per path; 0 where the header cannot be
+                   read, as the conversion then fails early and cheaply.
+    """
+    def estimate(path: str) -> int:
+        try:
+            return estimate_memory(path, target_formats, max_size, target_size, preset).bytes
+        except Exception:
+            return 0
+
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        return list(pool.map(estimate, paths))
+
+
+class MemoryScheduler:
+    """
+    Decides which jobs may start so that the estimated memory of the
+    running jobs stays within a budget.
+
+    Jobs are started in the order they were added, except that smaller jobs
+    are packed in beside running ones when the next job does not fit yet.
+    A job passed over too often blocks later jobs until memory frees up,
+    so large jobs are delayed but never starved. Not thread safe.
+    """
+
+    def __init__(self, budget: Optional[int], max_running: int):
+        """
+        Initialize an empty scheduler.
+
+        Args:
+            budget (Optional[int]): Memory budget in bytes, None for no limit.
+            max_running (int): Jobs running at once, e.g. the number of workers.
+        """
+        self.budget = budget
+        self.max_running = max_running
+        self.in_use = 0
+        self.peak_in_use = 0
+        self._pending: Dict[Hashable, int] = {}
+        self._running: Dict[Hashable, int] = {}
+        self._skips: Dict[Hashable, int] = {}
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of jobs waiting to start.
+        """
+        return len(self._pending)
+
+    @property
+    def running(self) -> int:
+        """
+        Number of started jobs that are not done yet.
+        """
+        return len(self._running)
+
+    def fits(self, estimate: int) -> bool:
+        """
+        Whether a job of this size can ever run within the budget.
+        """
+        return self.budget is None or estimate <= self.budget
+
+    def add(self, job: Hashable, estimate: int) -> bool:
+        """
+        Queues a job.
+
+        Args:
+            job (Hashable): Job identifier.
+            estimate (int): Estimated peak memory in bytes.
+
+        Returns:
+            bool: False if the job is larger than the whole budget; it is not queued.
+        """
+        if not self.fits(estimate):
+            return False
+        self._pending[job] = estimate
+        return True
+
+    def ready(self) -> List[Hashable]:
+        """
+        Returns the jobs to start now and counts them as running.
+        """
+        started = []
+        # The oldest job that does not fit yet
+        blocked = None
+        passed = False
+        for job, estimate in list(self._pending.items()):
+            if len(self._running) >= self.max_running:
+                break
+            if self.budget is None or self.in_use + estimate <= self.budget:
+                del self._pending[job]
+                self._skips.pop(job, None)
+                self._running[job] = estimate
+                self.in_use += estimate
+                self.peak_in_use = max(self.peak_in_use, self.in_use)
+                started.append(job)
+                passed = blocked is not None
+            elif blocked is None:
+                blocked = job
+                if self._skips.get(job, 0) >= _MAX_SKIPS:
+                    break
+        if passed:
+            self._skips[blocked] = self._skips.get(blocked, 0) + 1
+        return started
+
+    def done(self, job: Hashable) -> None:
+        """
+        Releases the memory of a finished job.
+        """
+        self.in_use -= self._running.pop(job)
+
+    def cancel(self) -> None:
+        """
+        Drops all jobs that have not started.
+        """
+        self._pending.clear()
+        self._skips.clear()
+
+
+def rejection_message(estimate: int, budget: int) -> str:
+    """
+    Returns the error reported for a job larger than the memory budget.
+    """
+    mb = 1024 * 1024
+    return f"Rejected: needs about {estimate // mb} MB, more than the {budget // mb} MB memory budget"
@@ -0,0 +1,497 @@
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Deque, Dict, List, NamedTuple, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from .cli import non_negative_int, positive_int
+from .formats import TO_FORMATS
+from .presets import PRESETS
+from .stats import percentile
+
+# Local HTTP conversion service, so other tools can convert images without
+# the GUI. Run with "python -m src.server"; it only needs the standard
+# library and listens on 127.0.0.1 unless told otherwise.
+#
+#   POST /convert?to=webp[&max_size=800][&icon_sizes=16,32][&target_size=200][&preset=fastest][&filename=a.png]
+#        Body: the image file, with a Content-Length. Response: the converted file.
+#        target_size is in KB, for JPEG and WEBP outputs.
+#   GET  /metrics  JSON counters, see ServerStats.
+#   GET  /health   "ok".
+#
+# Uploads are spooled to a temporary file as they arrive and converted by
+# convert_targets() on a process pool; the output is streamed back in
+# chunks, so a request never holds a whole image in the server process.
+# At most `capacity` conversions are admitted at once (one per worker plus
+# a bounded queue); further requests get 429 before their body is read.
+
+DEFAULT_MAX_UPLOAD = 64 * 1024 * 1024
+_CHUNK_SIZE = 256 * 1024
+_MAX_HEADER_SIZE = 16 * 1024
+# Seconds a client may take to send the request line and headers
+_HEADER_TIMEOUT = 10.0
+# Latencies kept for the percentiles in /metrics
+_LATENCY_SAMPLES = 10000
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+    429: "Too Many Requests", 431: "Request Header Fields Too Large",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    """
+    A request that is answered with an error status.
+    """
+
+    def __init__(self, status: int, message: str, close: bool = False, retry_after: Optional[int] = None):
+        """
+        Args:
+            status (int): HTTP status code.
+            message (str): Plain text response body.
+            close (bool): Close the connection afterwards, e.g. because the
+                request body was not read.
+            retry_after (Optional[int]): Seconds for the Retry-After header.
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.close = close
+        self.retry_after = retry_after
+
+
+class Request(NamedTuple):
+    """
+    A parsed request head.
+
+    Attributes:
+        method (str): Upper case method.
+        path (str): Path without the query.
+        query (Dict[str, List[str]]): Query parameters.
+        version (str): Protocol version, e.g. "HTTP/1.1".
+        headers (Dict[str, str]): Headers by lower case name.
+    """
+    method: str
+    path: str
+    query: Dict[str, List[str]]
+    version: str
+    headers: Dict[str, str]
+
+    @property
+    def keep_alive(self) -> bool:
+        """
+        Whether the client wants the connection kept open after the response.
+        """
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+class ServerStats(NamedTuple):
+    """
+    Snapshot of a ConversionServer's counters.
+
+    Attributes:
+        in_flight (int): Admitted conversions: uploading, queued or running.
+        peak_in_flight (int): Highest in_flight seen.
+        capacity (int): Conversions admitted at once before answering 429.
+        workers (int): Worker processes.
+        connections (int): Open client connections.
+        responses (Dict[int, int]): Responses sent per status code.
+        latency_p50 (float): Median seconds of successful conversions.
+        latency_p99 (float): 99th percentile seconds of successful conversions.
+    """
+    in_flight: int
+    peak_in_flight: int
+    capacity: int
+    workers: int
+    connections: int
+    responses: Dict[int, int]
+    latency_p50: float
+    latency_p99: float
+
+    def to_dict(self) -> Dict:
+        """
+        Returns the stats as a JSON-serializable dict.
+        """
+        stats = self._asdict()
+        stats["responses"] = {str(status): count for status, count in sorted(self.responses.items())}
+        return stats
+
+
+class ConversionServer:
+    """
+    asyncio HTTP server converting uploaded images on a process pool.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        max_upload: int = DEFAULT_MAX_UPLOAD,
+        spool_dir: Optional[str] = None,
+    ):
+        """
+        Initialize the server; call start() to listen.
+
+        Args:
+            host (str): Address to listen on.
+            port (int): Port to listen on, 0 for any free port.
+            workers (Optional[int]): Worker processes. Defaults to the CPU count.
+            queue_size (Optional[int]): Conversions waiting for a worker before
+                requests are rejected with 429. Defaults to twice the workers.
+            max_upload (int): Largest accepted upload in bytes; larger ones get 413.
+            spool_dir (Optional[str]): Folder for temporary files, the system default if None.
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.capacity = self.workers + (self.workers * 2 if queue_size is None else queue_size)
+        self.max_upload = max_upload
+        self.spool_dir = spool_dir
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._closing = False
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._connections = 0
+        self._responses: Counter = Counter()
+        self._latencies: Deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+
+    async def start(self) -> None:
+        """
+        Starts the worker pool and begins listening. self.port is set to
+        the actual port, which matters when 0 was requested.
+        """
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=_MAX_HEADER_SIZE,
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        """
+        Serves until cancelled.
+        """
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """
+        Stops accepting connections and shuts the worker pool down.
+        Requests arriving meanwhile get 503.
+        """
+        self._closing = True
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> ServerStats:
+        """
+        Returns the current counters.
+        """
+        latencies = list(self._latencies)
+        return ServerStats(
+            self._in_flight, self._peak_in_flight, self.capacity, self.workers, self._connections,
+            dict(self._responses), percentile(latencies, 50), percentile(latencies, 99),
+        )
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections += 1
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), _HEADER_TIMEOUT)
+                except HttpError as ex:
+                    await self._send_error(writer, ex, head_only=False)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                keep_alive = await self._respond(request, reader, writer)
+        except ConnectionError:
+            pass
+        finally:
+            self._connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Request:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HttpError(431, "request head too large", close=True)
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise HttpError(400, "malformed request line", close=True)
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, parse_qs(url.query), version, headers)
+
+    async def _respond(self, request: Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        keep_alive = request.keep_alive
+        try:
+            if request.path == "/convert":
+                if request.method != "POST":
+                    raise HttpError(405, "use POST", close=True)
+                await self._convert(request, reader, writer, keep_alive)
+            elif request.path in ("/metrics", "/health"):
+                if request.method != "GET":
+                    raise HttpError(405, "use GET", close=True)
+                body = json.dumps(self.stats().to_dict()) if request.path == "/metrics" else "ok"
+                content_type = "application/json" if request.path == "/metrics" else "text/plain"
+                await self._send(writer, 200, body.encode(), content_type, keep_alive)
+            else:
+                raise HttpError(404, f"no such endpoint: {request.path}", close=True)
+        except HttpError as ex:
+            await self._send_error(writer, ex, keep_alive=keep_alive, head_only=request.method == "HEAD")
+            return keep_alive and not ex.close
+        except (ConnectionError, asyncio.IncompleteReadError):
+            raise
+        except Exception as ex:
+            # E.g. the pool refusing work while shutting down; the client
+            # still gets an answer and the connection is dropped after it
+            error = HttpError(500, f"internal error: {type(ex).__name__}: {ex}", close=True)
+            await self._send_error(writer, error, head_only=request.method == "HEAD")
+            return False
+        return keep_alive
+
+    async def _convert(self, request: Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        from .metrics import emit, has_hooks
+        from .utils import convert_targets
+
+        target_format = _option(request, "to", "").upper()
+        if target_format not in TO_FORMATS:
+            raise HttpError(400, f"'to' must be one of: {', '.join(TO_FORMATS)}", close=True)
+        max_size = _int_option(request, "max_size")
+        icon_sizes = [_parse_int("icon_sizes", size) for size in _option(request, "icon_sizes", "").split(",") if size]
+        target_kb = _int_option(request, "target_size")
+        preset = _option(request, "preset", "").lower() or None
+        if preset and preset not in PRESETS:
+            raise HttpError(400, f"'preset' must be one of: {', '.join(PRESETS)}", close=True)
+        # Only the extension is kept; the upload is stored under a fixed name
+        ext = os.path.splitext(os.path.basename(_option(request, "filename", "")))[1]
+        if "chunked" in request.headers.get("transfer-encoding", "").lower():
+            raise HttpError(411, "chunked uploads are not supported, send a Content-Length", close=True)
+        length = _parse_int("Content-Length", request.headers.get("content-length", ""), status=411)
+        if length > self.max_upload:
+            raise HttpError(413, f"upload exceeds {self.max_upload} bytes", close=True)
+        if self._closing:
+            raise HttpError(503, "server is shutting down", close=True)
+        if self._in_flight >= self.capacity:
+            # Rejected before the body is read, so the client can back off cheaply
+            raise HttpError(429, "conversion queue is full", close=True, retry_after=1)
+
+        start = time.perf_counter()
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        work_dir = tempfile.mkdtemp(prefix="convert-", dir=self.spool_dir)
+        try:
+            in_path = os.path.join(work_dir, f"upload{ext}")
+            out_path = os.path.join(work_dir, f"output.{target_format.lower()}")
+            try:
+                await self._spool(reader, in_path, length)
+                job = partial(
+                    convert_targets, in_path, [(target_format, out_path)], collect_metrics=has_hooks(),
+                    max_size=max_size, icon_sizes=icon_sizes or None,
+                    target_size=target_kb * 1024 if target_kb else None, preset=preset,
+                )
+                pool = self._pool
+                result = (await asyncio.get_running_loop().run_in_executor(pool, job))[0]
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); later requests get a fresh pool.
+                # Other requests failing on the same pool must not replace it again.
+                if self._pool is pool:
+                    pool.shutdown(wait=False)
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                raise HttpError(503, "conversion worker crashed", retry_after=1)
+            finally:
+                self._in_flight -= 1
+            emit(result.metrics)
+            if result.error:
+                # Temporary paths mean nothing to the client
+                raise HttpError(422, result.error.replace(in_path, "upload"))
+            seconds = time.perf_counter() - start
+            await self._send_file(writer, out_path, target_format, keep_alive, {"X-Conversion-Seconds": f"{seconds:.4f}"})
+            self._latencies.append(seconds)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    async def _spool(self, reader: asyncio.StreamReader, path: str, length: int) -> None:
+        # File I/O runs on threads so a slow disk does not stall other connections
+        remaining = length
+        fp = await asyncio.to_thread(open, path, "wb")
+        try:
+            while remaining:
+                chunk = await reader.read(min(_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise HttpError(400, "upload ended early", close=True)
+                await asyncio.to_thread(fp.write, chunk)
+                remaining -= len(chunk)
+        finally:
+            await asyncio.to_thread(fp.close)
+
+    def _head(self, status: int, length: int, content_type: str, keep_alive: bool, extra: Optional[Dict[str, str]] = None) -> bytes:
+        self._responses[status] += 1
+        headers = {
+            "Content-Type": content_type,
+            "Content-Length": str(length),
+            "Connection": "keep-alive" if keep_alive else "close",
+            **(extra or {}),
+        }
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}"] + [f"{name}: {value}" for name, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str, keep_alive: bool) -> None:
+        writer.write(self._head(status, len(body), content_type, keep_alive) + body)
+        await writer.drain()
+
+    async def _send_error(self, writer: asyncio.StreamWriter, error: HttpError, keep_alive: bool = False, head_only: bool = False) -> None:
+        body = b"" if head_only else (error.message + "\n").encode()
+        extra = {"Retry-After": str(error.retry_after)} if error.retry_after else None
+        writer.write(self._head(error.status, len(body), "text/plain; charset=utf-8", keep_alive and not error.close, extra) + body)
+        await writer.drain()
+
+    async def _send_file(
+        self,
+        writer: asyncio.StreamWriter,
+        path: str,
+        target_format: str,
+        keep_alive: bool,
+        extra: Dict[str, str],
+    ) -> None:
+        content_type = mimetypes.guess_type(f"output.{target_format.lower()}")[0] or "application/octet-stream"
+        # Opened before the head is sent, so a failure can still be answered with an error
+        fp = await asyncio.to_thread(open, path, "rb")
+        try:
+            size = await asyncio.to_thread(os.fstat, fp.fileno())
+            writer.write(self._head(200, size.st_size, content_type, keep_alive, extra))
+            while True:
+                chunk = await asyncio.to_thread(fp.read, _CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                # Waits while the client is slower than the disk
+                await writer.drain()
+        finally:
+            await asyncio.to_thread(fp.close)
+
+
+def _option(request: Request, name: str, default: str) -> str:
+    return request.query.get(name, [default])[0]
+
+
+def _parse_int(name: str, value: str, status: int = 400) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise HttpError(status, f"{name} must be a non-negative integer", close=True)
+    return number
+
+
+def _int_option(request: Request, name: str) -> Optional[int]:
+    value = _option(request, name, "")
+    if not value:
+        return None
+    # 0 means no limit
+    return _parse_int(name, value) or None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the command line argument parser of the server.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m src.server",
+        description="Serve image conversions over HTTP on this machine.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080).")
+    parser.add_argument(
+        "-j", "--jobs", type=positive_int, default=None, help="Worker processes (default: number of CPUs).",
+    )
+    parser.add_argument(
+        "--queue", type=non_negative_int, default=None, metavar="N",
+        help="Conversions that may wait for a worker before requests get 429 (default: 2 per worker).",
+    )
+    parser.add_argument(
+        "--max-upload", type=positive_int, default=DEFAULT_MAX_UPLOAD // (1024 * 1024), metavar="MB",
+        help="Largest accepted upload; larger ones get 413 (default: 64).",
+    )
+    parser.add_argument(
+        "--metrics-log", metavar="FILE", default=None,
+        help="Append per-stage timing and memory metrics as JSON lines to FILE.",
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the server until interrupted.
+
+    Args:
+        argv (Optional[List[str]]): Arguments, defaults to sys.argv[1:].
+
+    Returns:
+        int: Process exit code.
+    """
+    args = build_parser().parse_args(argv)
+    if args.metrics_log:
+        from .metrics import JsonLinesLog, add_hook
+
+        add_hook(JsonLinesLog(args.metrics_log))
+    server = ConversionServer(
+        args.host, args.port, workers=args.jobs, queue_size=args.queue,
+        max_upload=args.max_upload * 1024 * 1024,
+    )
+
+    async def run() -> None:
+        await server.start()
+        print(f"Serving on http://{server.host}:{server.port} ({server.workers} workers, "
+              f"{server.capacity} requests admitted at once)", flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
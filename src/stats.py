@@ -0,0 +1,25 @@
+from typing import Sequence
+
+# Small statistics helpers shared by the server, the benchmark and the
+# load test. Standard library only, so the server does not depend on the
+# benchmark tool.
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Returns the q-th percentile of values, interpolating between closest ranks.
+
+    Args:
+        values (Sequence[float]): Samples.
+        q (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The percentile, or 0.0 for no samples.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
@@ -0,0 +1,497 @@
+import io
+import os
+import struct
+import zlib
+from typing import BinaryIO, List, NamedTuple, Optional, Sequence, Tuple
+
+from PIL import Image, ImageFile
+
+from .formats import FORMAT_CAPABILITIES
+from .presets import encoder_options
+from .utils import apply_plan, conversion_plan, convert_file, peak_rss
+
+# Streaming conversion for rasters too large to hold in memory.
+#
+# Sources whose tiles are all uncompressed ("raw" codec: uncompressed TIFF
+# strips and tiles, PPM/PGM/PBM, BMP, TGA, SGI, IM) are read in bands of
+# rows by rewriting Pillow's tile list before load(). Bands are written by
+# the row-oriented writers below. Anything else uses the full-load path.
+#
+# The writers produce what Image.save() would: the same pixels, mode and
+# palette, the source's ICC profile where the format stores one, its
+# resolution (or Pillow's default), and for PNG the same row filters.
+
+DEFAULT_BUFFER_SIZE = 64 * 1024 * 1024
+
+# Each band exists as decoded pixels, converted pixels, packed bytes and
+# encoder input at the same time, so the band itself gets a fraction of
+# the buffer. Pillow stores multi-band pixels in 4 bytes.
+_PIPELINE_COPIES = 4
+_BYTES_PER_PIXEL = 4
+# Compressed PNG data is written in IDAT chunks of this size, as Pillow does
+_IDAT_SIZE = 64 * 1024
+
+
+class StreamResult(NamedTuple):
+    """
+    Outcome of a streaming conversion.
+
+    Attributes:
+        output (str): Path of the written file.
+        streamed (bool): False if the full-load fallback was used.
+        bands (int): Number of row bands processed (1 for the fallback).
+        peak_rss (Optional[int]): Peak resident memory of the process in bytes, if known.
+    """
+    output: str
+    streamed: bool
+    bands: int
+    peak_rss: Optional[int]
+
+
+def _raw_stride(mode: str, rawmode: str, width: int) -> Optional[int]:
+    """
+    Bytes per row of a raw tile, or None if Pillow has no packer to measure it.
+    """
+    try:
+        return len(Image.new(mode, (width, 1)).tobytes("raw", rawmode))
+    except (ValueError, OSError):
+        return None
+
+
+def band_tiles(img: Image.Image, top: int, bottom: int) -> Optional[list]:
+    """
+    Rewrites the tile list of an opened, unloaded image so that load()
+    only decodes rows top to bottom.
+
+    Args:
+        img (Image.Image): An image returned by Image.open(), not loaded yet.
+        top (int): First row of the band.
+        bottom (int): Row after the last row of the band.
+
+    Returns:
+        Optional[list]: The band's tiles with extents relative to the band,
+                        or None if the tiles cannot be split by rows.
+    """
+    tiles = []
+    for tile in img.tile:
+        codec, extents, offset, args = tile
+        if codec != "raw":
+            return None
+        x0, y0, x1, y1 = extents
+        first, last = max(top, y0), min(bottom, y1)
+        if first >= last:
+            continue
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        stride = stride or _raw_stride(img.mode, rawmode, x1 - x0)
+        if not stride:
+            return None
+        if orientation < 0:
+            # Bottom-up rows: the band's lowest row comes first in the file
+            offset += (y1 - last) * stride
+        else:
+            offset += (first - y0) * stride
+        extents, args = (x0, first - top, x1, last - top), (rawmode, stride, orientation)
+        if hasattr(tile, "_replace"):
+            tiles.append(tile._replace(extents=extents, offset=offset, args=args))
+        else:
+            tiles.append((codec, extents, offset, args))
+    return tiles
+
+
+def load_band(path: str, top: int, bottom: int) -> Image.Image:
+    """
+    Decodes rows top to bottom of an image file without loading the rest.
+
+    Args:
+        path (str): Image file path.
+        top (int): First row of the band.
+        bottom (int): Row after the last row of the band.
+
+    Returns:
+        Image.Image: The band as a loaded image.
+
+    Raises:
+        ValueError: If the file cannot be read in bands.
+    """
+    img = Image.open(path)
+    tiles = band_tiles(img, top, bottom)
+    if tiles is None:
+        img.close()
+        raise ValueError(f"{path} cannot be read in bands")
+    img._size = (img.width, bottom - top)
+    if hasattr(img, "_tile_size"):
+        # The TIFF plugin allocates the decode target from this instead of size
+        img._tile_size = img._size
+    img.tile = tiles
+    img.load()
+    # Detach the pixels from the plugin, which may re-read its header
+    # (and the full size) on later operations
+    band = img._new(img.im)
+    img.close()
+    return band
+
+
+class _StripWriter:
+    """
+    Base class of the row-oriented writers. The header is written from the
+    first band, once its mode and palette are known.
+    """
+    MODES: Tuple[str, ...] = ()
+
+    def __init__(self, fp: BinaryIO, width: int, height: int):
+        self.fp = fp
+        self.width = width
+        self.height = height
+        self.rows = 0
+        # Bytes per stored row including padding, 0 for unpadded rows
+        self.stride = 0
+
+    def write(self, band: Image.Image) -> None:
+        if self.rows == 0:
+            self.start(band)
+        self.write_rows(band)
+        self.rows += band.height
+
+    def write_packed(self, header: Image.Image, data: bytes, rows: int) -> None:
+        """
+        Writes rows that are already packed in packed_rawmode(), without decoding them.
+
+        Args:
+            header (Image.Image): Any image with the mode and palette of the rows,
+                used to write the header.
+            data (bytes): The packed rows, without row padding.
+            rows (int): Number of rows in data.
+        """
+        if self.rows == 0:
+            self.start(header)
+        self.write_data(data, rows)
+        self.rows += rows
+
+    def packed_rawmode(self, mode: str) -> Optional[str]:
+        """
+        Returns the raw mode the pixel data of a mode is stored in, or None
+        if the writer re-encodes the pixels.
+        """
+        return None
+
+    def start(self, band: Image.Image) -> None:
+        raise NotImplementedError
+
+    def write_rows(self, band: Image.Image) -> None:
+        # Encoded straight into the file, without a bytes copy of the band
+        ImageFile._save(band, self.fp, [("raw", (0, 0) + band.size, 0, (self.rawmode, self.stride, 1))])
+
+    def write_data(self, data: bytes, rows: int) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class _PnmWriter(_StripWriter):
+    MODES = ("1", "L", "I;16", "RGB")
+    _HEADERS = {"1": (b"P4", None, "1;I"), "L": (b"P5", 255, "L"), "I;16": (b"P5", 65535, "I;16B"), "RGB": (b"P6", 255, "RGB")}
+
+    def start(self, band: Image.Image) -> None:
+        magic, maxval, self.rawmode = self._HEADERS[band.mode]
+        header = magic + f"\n{self.width} {self.height}\n".encode()
+        if maxval:
+            header += f"{maxval}\n".encode()
+        self.fp.write(header)
+
+    def packed_rawmode(self, mode: str) -> Optional[str]:
+        return self._HEADERS[mode][2] if mode in self._HEADERS else None
+
+    def write_data(self, data: bytes, rows: int) -> None:
+        self.fp.write(data)
+
+
+class _PngWriter(_StripWriter):
+    MODES = ("1", "L", "LA", "P", "RGB", "RGBA", "I;16")
+    # mode: (bit depth, color type, rawmode)
+    _LAYOUTS = {
+        "1": (1, 0, "1"), "L": (8, 0, "L"), "LA": (8, 4, "LA"), "P": (8, 3, "P"),
+        "RGB": (8, 2, "RGB"), "RGBA": (8, 6, "RGBA"), "I;16": (16, 0, "I;16B"),
+    }
+
+    def __init__(self, fp: BinaryIO, width: int, height: int, compress_level: int = 6):
+        super().__init__(fp, width, height)
+        self.compress_level = compress_level
+        # Last row of the previous band, which the filters of the next band refer to
+        self.previous: Optional[Image.Image] = None
+        self.pending = bytearray()
+
+    def chunk(self, kind: bytes, data: bytes) -> None:
+        self.fp.write(struct.pack(">I", len(data)) + kind + data)
+        self.fp.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def start(self, band: Image.Image) -> None:
+        bits, color_type, self.rawmode = self._LAYOUTS[band.mode]
+        # The zlib settings of Pillow's PNG encoder, which leaves palette rows unfiltered
+        strategy = zlib.Z_DEFAULT_STRATEGY if band.mode == "P" else zlib.Z_FILTERED
+        self.compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, 15, 9, strategy)
+        self.fp.write(b"\x89PNG\r\n\x1a\n")
+        self.chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, bits, color_type, 0, 0, 0))
+        icc_profile = band.info.get("icc_profile")
+        if icc_profile:
+            self.chunk(b"iCCP", b"ICC Profile\0\0" + zlib.compress(icc_profile))
+        dpi = band.info.get("dpi")
+        if dpi:
+            # Pixels per meter, unit 1 (meter)
+            self.chunk(b"pHYs", struct.pack(">IIB", *(int(value / 0.0254 + 0.5) for value in dpi[:2]), 1))
+        if band.mode == "P":
+            self.chunk(b"PLTE", bytes(band.getpalette("RGB")))
+            transparency = band.info.get("transparency")
+            if isinstance(transparency, int):
+                self.chunk(b"tRNS", b"\xff" * transparency + b"\0")
+
+    def write_rows(self, band: Image.Image) -> None:
+        self.pending += self.compressor.compress(self._filtered(band))
+        while len(self.pending) >= _IDAT_SIZE:
+            self.chunk(b"IDAT", bytes(self.pending[:_IDAT_SIZE]))
+            del self.pending[:_IDAT_SIZE]
+
+    def _filtered(self, band: Image.Image) -> bytes:
+        # Pillow's encoder chooses a filter per row, as Image.save() does. At
+        # level 0 it emits stored blocks, so the filtered rows come back from a
+        # cheap decompress and go into the single zlib stream of all IDATs.
+        # The previous band's last row is encoded first and dropped again, so
+        # the first row is filtered against the row the decoder will have.
+        img = band
+        if self.previous is not None:
+            img = Image.new(band.mode, (band.width, band.height + 1))
+            img.paste(self.previous, (0, 0))
+            img.paste(band, (0, 1))
+        img.encoderconfig = (False, 0, -1, b"")
+        buffer = io.BytesIO()
+        ImageFile._save(img, buffer, [("zip", (0, 0) + img.size, 0, self.rawmode)])
+        rows = zlib.decompress(buffer.getvalue())
+        self.previous = band.crop((0, band.height - 1, band.width, band.height))
+        if img is not band:
+            rows = rows[len(rows) // img.height:]
+        return rows
+
+    def close(self) -> None:
+        self.pending += self.compressor.flush()
+        for offset in range(0, len(self.pending), _IDAT_SIZE):
+            self.chunk(b"IDAT", bytes(self.pending[offset:offset + _IDAT_SIZE]))
+        self.chunk(b"IEND", b"")
+
+
+class _BmpWriter(_StripWriter):
+    MODES = ("1", "L", "P", "RGB")
+    # mode: (bits per pixel, rawmode)
+    _LAYOUTS = {"1": (1, "1"), "L": (8, "L"), "P": (8, "P"), "RGB": (24, "BGR")}
+
+    def start(self, band: Image.Image) -> None:
+        bits, self.rawmode = self._LAYOUTS[band.mode]
+        self.stride = (self.width * bits + 31) // 32 * 4
+        # Pixels per meter; 96 dpi is Pillow's default
+        ppm = tuple(int(value * 39.3701 + 0.5) for value in band.info.get("dpi", (96, 96))[:2])
+        if band.mode == "1":
+            palette = b"\0\0\0\0\xff\xff\xff\0"
+        elif band.mode == "L":
+            palette = b"".join(bytes((i, i, i, 0)) for i in range(256))
+        elif band.mode == "P":
+            rgb = band.getpalette("RGB")
+            palette = b"".join(bytes((rgb[i + 2], rgb[i + 1], rgb[i], 0)) for i in range(0, len(rgb), 3))
+        else:
+            palette = b""
+        data_offset = 14 + 40 + len(palette)
+        self.fp.write(b"BM" + struct.pack("<IHHI", data_offset + self.stride * self.height, 0, 0, data_offset))
+        # Negative height: rows are stored top-down, so bands are written in order
+        self.fp.write(struct.pack(
+            "<IiiHHIIiiII", 40, self.width, -self.height, 1, bits, 0,
+            self.stride * self.height, *ppm, len(palette) // 4, 0,
+        ))
+        self.fp.write(palette)
+
+    def packed_rawmode(self, mode: str) -> Optional[str]:
+        return self._LAYOUTS[mode][1] if mode in self._LAYOUTS else None
+
+    def write_data(self, data: bytes, rows: int) -> None:
+        row = len(data) // rows
+        if row == self.stride:
+            self.fp.write(data)
+            return
+        padding = b"\0" * (self.stride - row)
+        self.fp.write(b"".join(part for i in range(0, len(data), row) for part in (data[i:i + row], padding)))
+
+
+class _TiffWriter(_StripWriter):
+    MODES = ("1", "L", "LA", "RGB", "RGBA", "CMYK", "I;16")
+    # mode: (bits per sample, photometric, extra samples)
+    _LAYOUTS = {
+        "1": ((1,), 1, None), "L": ((8,), 1, None), "LA": ((8, 8), 1, 2),
+        "RGB": ((8, 8, 8), 2, None), "RGBA": ((8, 8, 8, 8), 2, 2),
+        "CMYK": ((8, 8, 8, 8), 5, None), "I;16": ((16,), 1, None),
+    }
+
+    def start(self, band: Image.Image) -> None:
+        self.mode = self.rawmode = band.mode
+        self.icc_profile = band.info.get("icc_profile")
+        self.dpi = band.info.get("dpi")
+        self.rows_per_strip = 0
+        self.strips: List[Tuple[int, int]] = []
+        # Header; the IFD offset is patched in close()
+        self.fp.write(b"II*\0\0\0\0\0")
+
+    def packed_rawmode(self, mode: str) -> Optional[str]:
+        return mode if mode in self._LAYOUTS else None
+
+    def write_rows(self, band: Image.Image) -> None:
+        offset = self.fp.tell()
+        super().write_rows(band)
+        self._add_strip(offset, band.height)
+
+    def write_data(self, data: bytes, rows: int) -> None:
+        offset = self.fp.tell()
+        self.fp.write(data)
+        self._add_strip(offset, rows)
+
+    def _add_strip(self, offset: int, rows: int) -> None:
+        # One strip per band; all bands but the last have the same height
+        self.rows_per_strip = self.rows_per_strip or rows
+        self.strips.append((offset, self.fp.tell() - offset))
+
+    def close(self) -> None:
+        bits, photometric, extra = self._LAYOUTS[self.mode]
+        # (tag, type, values); types: 3 SHORT, 4 LONG, 5 RATIONAL as
+        # numerator, denominator pairs, 7 UNDEFINED as bytes
+        entries = [
+            (256, 4, (self.width,)),
+            (257, 4, (self.height,)),
+            (258, 3, bits),
+            (259, 3, (1,)),
+            (262, 3, (photometric,)),
+            (273, 4, tuple(offset for offset, _ in self.strips)),
+            (277, 3, (len(bits),)),
+            (278, 4, (self.rows_per_strip,)),
+            (279, 4, tuple(length for _, length in self.strips)),
+            (284, 3, (1,)),
+        ]
+        if extra:
+            entries.append((338, 3, (extra,)))
+        if self.dpi:
+            # Dots per inch, to a hundredth
+            entries += [(282 + axis, 5, (int(self.dpi[axis] * 100 + 0.5), 100)) for axis in (0, 1)]
+            entries.append((296, 3, (2,)))
+        if self.icc_profile:
+            entries.append((34675, 7, self.icc_profile))
+        entries.sort()
+
+        if self.fp.tell() % 2:
+            self.fp.write(b"\0")
+        ifd_offset = self.fp.tell()
+        overflow_offset = ifd_offset + 2 + 12 * len(entries) + 4
+        ifd = struct.pack("<H", len(entries))
+        overflow = b""
+        for tag, kind, values in entries:
+            if kind == 7:
+                packed, count = bytes(values), len(values)
+            else:
+                packed = struct.pack(f"<{len(values)}{'H' if kind == 3 else 'I'}", *values)
+                count = len(values) // 2 if kind == 5 else len(values)
+            if len(packed) <= 4:
+                ifd += struct.pack("<HHI", tag, kind, count) + packed.ljust(4, b"\0")
+            else:
+                ifd += struct.pack("<HHII", tag, kind, count, overflow_offset + len(overflow))
+                overflow += packed
+                # Values start on a word boundary
+                overflow += b"\0" * (len(overflow) % 2)
+        self.fp.write(ifd + b"\0\0\0\0" + overflow)
+        self.fp.seek(4)
+        self.fp.write(struct.pack("<I", ifd_offset))
+
+
+_WRITERS = {"PNG": _PngWriter, "BMP": _BmpWriter, "TIFF": _TiffWriter}
+_PNM_FORMATS = ("PPM", "PGM", "PBM", "PNM")
+
+
+def _writer_class(target_format: str) -> Optional[type]:
+    if target_format in _PNM_FORMATS:
+        return _PnmWriter
+    return _WRITERS.get(target_format)
+
+
+def can_stream(img: Image.Image, target_format: str) -> bool:
+    """
+    Checks whether an opened image can be converted in bands.
+
+    Args:
+        img (Image.Image): An image returned by Image.open(), not loaded yet.
+        target_format (str): Target format from the supported formats list.
+
+    Returns:
+        bool: True if both the source tiles and the target encoder support bands.
+    """
+    target_format = target_format.upper()
+    writer = _writer_class(target_format)
+    if writer is None or target_format not in FORMAT_CAPABILITIES:
+        return False
+    if getattr(img, "n_frames", 1) > 1 or band_tiles(img, 0, 1) is None:
+        return False
+    plan = conversion_plan(img, target_format)
+    if any(step.action in ("quantize", "reduce_depth") or step.mode == "1" for step in plan):
+        # These need the whole image: palette and depth statistics, and
+        # dithering errors that carry across band boundaries
+        return False
+    return (plan[-1].mode if plan else img.mode) in writer.MODES
+
+
+def stream_convert(
+    path: str,
+    target_format: str,
+    out_path: str,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    icon_sizes: Optional[Sequence[int]] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> StreamResult:
+    """
+    Converts an image in bands of rows so memory is bounded by buffer_size
+    instead of the image size. Falls back to the full-load path when the
+    source or target format cannot be processed in bands.
+
+    Args:
+        path (str): Input file path.
+        target_format (str): Target format from the supported formats list.
+        out_path (str): Destination path.
+        buffer_size (int): Approximate memory budget for pixel data in bytes.
+        icon_sizes (Optional[Sequence[int]]): Entry sizes of an ICO or ICNS output.
+        target_size (Optional[int]): File size budget in bytes of a JPEG or WEBP output.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+
+    Returns:
+        StreamResult: The outcome, including the peak RSS reached.
+
+    Raises:
+        Exception: Any decode or encode error.
+    """
+    target_format = target_format.upper()
+    with Image.open(path) as img:
+        # The band writers have no tunable settings
+        streamable = can_stream(img, target_format) and not encoder_options(target_format, preset)
+        width, height = img.size
+        plan = conversion_plan(img, target_format)
+
+    if not streamable:
+        result = convert_file(
+            path, target_format, out_path, icon_sizes=icon_sizes, target_size=target_size, preset=preset,
+        )
+        if result.error:
+            raise ValueError(result.error)
+        return StreamResult(out_path, False, 1, peak_rss())
+
+    rows = max(1, buffer_size // (_PIPELINE_COPIES * _BYTES_PER_PIXEL * max(width, 1)))
+    bands = 0
+    with open(out_path, "wb") as fp:
+        writer = _writer_class(target_format)(fp, width, height)
+        for top in range(0, height, rows):
+            with load_band(path, top, min(height, top + rows)) as band:
+                writer.write(apply_plan(band, plan))
+            bands += 1
+        writer.close()
+    return StreamResult(out_path, True, bands, peak_rss())
@@ -0,0 +1,211 @@
+import io
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image
+
+# Encoding to a file size budget.
+#
+# The output size of lossy encoders grows roughly exponentially with the
+# quality setting, so the quality that just fits a budget is found by
+# interpolating log(size) between the closest probes above and below it.
+# Each pass encodes a few candidate qualities at once on threads, all from
+# the same decoded pixels, and nothing is written until the search is done.
+
+TARGET_SIZE_FORMATS = ("JPEG", "JPG", "WEBP")
+
+# Searched quality range per format; Pillow advises against JPEG above 95
+_QUALITY_RANGE: Dict[str, Tuple[int, int]] = {"JPEG": (1, 95), "WEBP": (0, 100)}
+# Candidate qualities encoded at once per pass
+_PROBES = 3
+# Encodings held at once during a search: a pass of probes plus the best
+# and the smallest found so far
+PROBE_BUFFERS = _PROBES + 2
+# A fitting encoding at least this close to the budget ends the search early
+_CLOSE_ENOUGH = 0.97
+# A guard only; searches settle in three or four passes
+_MAX_PASSES = 8
+# Encoder parameters when no preset is given
+_DEFAULT_OPTIONS: Dict[str, Dict[str, Any]] = {"JPEG": {"optimize": True}, "WEBP": {"method": 4}}
+# WEBP's slowest, smallest effort, tried when even the lowest quality
+# does not fit at the method used first
+_WEBP_SMALLEST_METHOD = 6
+
+
+class SizedEncoding(NamedTuple):
+    """
+    Outcome of a quality search.
+
+    Attributes:
+        data (bytes): The chosen encoding: the highest quality within the budget,
+                      or the smallest one found if nothing fits.
+        quality (int): Quality setting of the chosen encoding.
+        fits (bool): Whether the chosen encoding is within the budget.
+        passes (int): Rounds of parallel encodes the search took.
+        encodes (int): Total number of encodes.
+    """
+    data: bytes
+    quality: int
+    fits: bool
+    passes: int
+    encodes: int
+
+
+def _encode(img: Image.Image, pillow_format: str, quality: int, options: Dict[str, Any]) -> bytes:
+    # A view per call: Image.save() keeps the options on the image object
+    view = img._new(img.im)
+    buffer = io.BytesIO()
+    view.save(buffer, format=pillow_format, quality=quality, **options)
+    return buffer.getvalue()
+
+
+def _candidates(lo: int, hi: int, sizes: Dict[int, int], max_bytes: int) -> List[int]:
+    """
+    Picks the qualities to probe strictly between lo and hi.
+
+    Args:
+        lo (int): Highest quality known to fit, or one below the range.
+        hi (int): Lowest quality known not to fit, or one above the range.
+        sizes (Dict[int, int]): Encoded sizes of the probed qualities.
+        max_bytes (int): The size budget.
+
+    Returns:
+        List[int]: Up to _PROBES distinct qualities, ascending.
+    """
+    open_range = list(range(lo + 1, hi))
+    if len(open_range) <= _PROBES:
+        return open_range
+    if len(sizes) >= 2:
+        # Secant through the two probes closest to the budget in log(size),
+        # which follows the local slope better than the bracket ends do,
+        # then the guess and its neighbours an eighth of the range apart
+        target = math.log(max_bytes)
+        first, second = sorted(sizes, key=lambda quality: abs(math.log(sizes[quality]) - target))[:2]
+        first_log, second_log = math.log(sizes[first]), math.log(sizes[second])
+        if first_log == second_log:
+            guess = (lo + hi) // 2
+        else:
+            guess = round(first + (second - first) * (target - first_log) / (second_log - first_log))
+        step = max(1, (hi - lo) // 8)
+        wanted = [guess - step, guess, guess + step]
+    else:
+        # First pass: both ends of the range, so budgets that every quality
+        # meets or none does are settled at once, and evenly in between
+        guess = (lo + hi) // 2
+        wanted = [lo + 1 + (hi - lo - 2) * index // (_PROBES - 1) for index in range(_PROBES)]
+    chosen = {min(max(quality, lo + 1), hi - 1) for quality in wanted}
+    # Clamping may merge candidates; fill up with those nearest the guess
+    for quality in sorted(open_range, key=lambda quality: abs(quality - guess)):
+        if len(chosen) >= _PROBES:
+            break
+        chosen.add(quality)
+    return sorted(chosen)
+
+
+def _search(
+    img: Image.Image,
+    pillow_format: str,
+    max_bytes: int,
+    options: Dict[str, Any],
+    pool: ThreadPoolExecutor,
+) -> SizedEncoding:
+    lowest, highest = _QUALITY_RANGE[pillow_format]
+    lo, hi = lowest - 1, highest + 1
+    sizes: Dict[int, int] = {}
+    best: Optional[Tuple[int, bytes]] = None
+    smallest: Optional[Tuple[int, bytes]] = None
+    passes = 0
+    while hi - lo > 1 and passes < _MAX_PASSES:
+        candidates = _candidates(lo, hi, sizes, max_bytes)
+        passes += 1
+        encoded = pool.map(lambda quality: _encode(img, pillow_format, quality, options), candidates)
+        for quality, data in zip(candidates, encoded):
+            sizes[quality] = len(data)
+            if len(data) <= max_bytes:
+                if quality > lo:
+                    lo, best = quality, (quality, data)
+            elif quality < hi:
+                hi = quality
+            if smallest is None or len(data) < len(smallest[1]):
+                smallest = (quality, data)
+        if best and len(best[1]) >= max_bytes * _CLOSE_ENOUGH:
+            break
+    quality, data = best or smallest
+    return SizedEncoding(data, quality, best is not None, passes, len(sizes))
+
+
+def encode_to_size(
+    img: Image.Image,
+    target_format: str,
+    max_bytes: int,
+    options: Optional[Dict[str, Any]] = None,
+    workers: Optional[int] = None,
+) -> SizedEncoding:
+    """
+    Encodes an image in memory at the highest quality that fits a size budget.
+
+    Args:
+        img (Image.Image): The decoded image, already in a mode the format can store.
+        target_format (str): "JPEG", "JPG" or "WEBP".
+        max_bytes (int): Size budget of the encoded file in bytes.
+        options (Optional[Dict[str, Any]]): Encoder parameters, e.g. from a preset;
+            a quality among them is ignored. None uses optimized JPEG and WEBP
+            method 4; a preset's parameters replace these entirely.
+        workers (Optional[int]): Encoder threads, by default one per probe
+            up to the number of CPUs.
+
+    Returns:
+        SizedEncoding: The chosen encoding and how the search went.
+    """
+    pillow_format = "WEBP" if target_format.upper() == "WEBP" else "JPEG"
+    options = dict(_DEFAULT_OPTIONS[pillow_format] if options is None else options)
+    options.pop("quality", None)
+    workers = workers or min(_PROBES, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        result = _search(img, pillow_format, max_bytes, options, pool)
+        if not result.fits and pillow_format == "WEBP" and options.get("method", 4) < _WEBP_SMALLEST_METHOD:
+            smallest = {**options, "method": _WEBP_SMALLEST_METHOD}
+            retry = _search(img, pillow_format, max_bytes, smallest, pool)
+            if retry.fits or len(retry.data) < len(result.data):
+                result = retry._replace(passes=result.passes + retry.passes, encodes=result.encodes + retry.encodes)
+    return result
+
+
+def save_to_size(
+    img: Image.Image,
+    out: Union[str, IO[bytes]],
+    target_format: str,
+    max_bytes: int,
+    options: Optional[Dict[str, Any]] = None,
+) -> SizedEncoding:
+    """
+    Writes the highest-quality JPEG or WEBP encoding of an image that fits a size budget.
+
+    Args:
+        img (Image.Image): The decoded image, already in a mode the format can store.
+        out (Union[str, IO[bytes]]): Destination path or binary file.
+        target_format (str): "JPEG", "JPG" or "WEBP".
+        max_bytes (int): Size budget of the file in bytes.
+        options (Optional[Dict[str, Any]]): Encoder parameters, e.g. from a preset;
+            None for the defaults of encode_to_size().
+
+    Returns:
+        SizedEncoding: The written encoding.
+
+    Raises:
+        ValueError: If even the lowest quality is over the budget; nothing is written.
+    """
+    result = encode_to_size(img, target_format, max_bytes, options)
+    if not result.fits:
+        raise ValueError(
+            f"cannot fit {target_format.upper()} in {max_bytes // 1024} KB, "
+            f"the smallest encoding is {-(-len(result.data) // 1024)} KB"
+        )
+    if isinstance(out, str):
+        with open(out, "wb") as fp:
+            fp.write(result.data)
+    else:
+        out.write(result.data)
+    return result
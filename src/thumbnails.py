@@ -0,0 +1,184 @@
+import json
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from PIL import Image
+
+from .utils import file_digest, load_reduced, save_image
+
+THUMBNAIL_SIZE = 128
+
+# Thumbnails are stored by a hash of the file content, so copies and renamed
+# files share one thumbnail. index.json maps paths to content hashes by size
+# and mtime, so unchanged files are found again without reading them.
+_INDEX_NAME = "index.json"
+# New index entries written before the index is saved again
+_INDEX_SAVE_EVERY = 100
+
+
+def default_cache_dir() -> str:
+    """
+    Returns the per-user folder thumbnails are stored in.
+
+    Returns:
+        str: %LOCALAPPDATA%\\ImageConverter\\thumbnails on Windows,
+             ~/Library/Caches/ImageConverter/thumbnails on macOS and
+             $XDG_CACHE_HOME/image-converter/thumbnails elsewhere.
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "ImageConverter", "thumbnails")
+    if sys.platform == "darwin":
+        return os.path.join(os.path.expanduser("~/Library/Caches"), "ImageConverter", "thumbnails")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "image-converter", "thumbnails")
+
+
+class ThumbnailCache:
+    """
+    Generates image thumbnails on a background thread pool and keeps them
+    on disk, keyed by file content, across application runs.
+
+    lookup() answers from the index without touching the image, so
+    previously seen files show up immediately. request() generates missing
+    thumbnails with reduced-resolution decoding.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, size: int = THUMBNAIL_SIZE, workers: Optional[int] = None):
+        """
+        Initialize the cache, loading the index of a previous run.
+
+        Args:
+            cache_dir (Optional[str]): Folder for the thumbnails, default_cache_dir() if None.
+            size (int): Maximum width and height of the thumbnails.
+            workers (Optional[int]): Number of generator threads. Defaults to the CPU count, at most 4.
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.size = size
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or min(4, os.cpu_count() or 1), thread_name_prefix="thumbnail"
+        )
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        self._index: Dict[str, Tuple[int, int, str]] = {}
+        self._unsaved = 0
+        try:
+            with open(os.path.join(self.cache_dir, _INDEX_NAME), encoding="utf-8") as fp:
+                self._index = {path: tuple(entry) for path, entry in json.load(fp).items()}
+        except (OSError, ValueError):
+            pass
+
+    def thumbnail_path(self, digest: str) -> str:
+        """
+        Returns where the thumbnail of content with the given digest is stored.
+        """
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-{self.size}.png")
+
+    def lookup(self, path: str) -> Optional[str]:
+        """
+        Finds an existing thumbnail without reading the image.
+
+        Args:
+            path (str): Image path.
+
+        Returns:
+            Optional[str]: Thumbnail path, or None if it has to be generated.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._index.get(os.path.abspath(path))
+        if not entry or entry[:2] != (stat.st_size, stat.st_mtime_ns):
+            return None
+        thumbnail = self.thumbnail_path(entry[2])
+        return thumbnail if os.path.exists(thumbnail) else None
+
+    def request(self, path: str, callback: Callable[[str, Optional[str]], None]) -> Optional[Future]:
+        """
+        Gets a thumbnail, generating it in the background if needed.
+
+        Args:
+            path (str): Image path.
+            callback (Callable[[str, Optional[str]], None]): Called with the image
+                path and the thumbnail path, or None if the image cannot be read.
+                Runs on a worker thread unless the thumbnail already existed.
+
+        Returns:
+            Optional[Future]: The pending generation, which can be cancelled
+                while it has not started; None if callback was already called.
+        """
+        thumbnail = self.lookup(path)
+        if thumbnail:
+            callback(path, thumbnail)
+            return None
+        with self._lock:
+            future = self._pending.get(path)
+            if future is None or future.cancelled():
+                future = self._executor.submit(self._generate, path)
+                self._pending[path] = future
+
+        def done(future: Future) -> None:
+            with self._lock:
+                if self._pending.get(path) is future:
+                    del self._pending[path]
+            if not future.cancelled():
+                callback(path, future.result())
+
+        future.add_done_callback(done)
+        return future
+
+    def save_index(self) -> None:
+        """
+        Writes the path index to disk.
+        """
+        with self._lock:
+            index = dict(self._index)
+            self._unsaved = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index_path = os.path.join(self.cache_dir, _INDEX_NAME)
+        temp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as fp:
+            json.dump(index, fp)
+        os.replace(temp_path, index_path)
+
+    def shutdown(self) -> None:
+        """
+        Drops queued work, waits for running generators and saves the index.
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        try:
+            self.save_index()
+        except OSError:
+            pass
+
+    def _generate(self, path: str) -> Optional[str]:
+        try:
+            stat = os.stat(path)
+            digest = file_digest(path)
+            thumbnail = self.thumbnail_path(digest)
+            if not os.path.exists(thumbnail):
+                with Image.open(path) as img:
+                    small = load_reduced(img, self.size)
+                    os.makedirs(os.path.dirname(thumbnail), exist_ok=True)
+                    # Written under a temporary name so readers never see a partial file;
+                    # small and only read locally, so encode speed matters more than size
+                    temp_path = f"{thumbnail}.{threading.get_ident()}.tmp"
+                    save_image(small, temp_path, "PNG", "fastest")
+                os.replace(temp_path, thumbnail)
+        except Exception:
+            return None
+        with self._lock:
+            self._index[os.path.abspath(path)] = (stat.st_size, stat.st_mtime_ns, digest)
+            self._unsaved += 1
+            save = self._unsaved >= _INDEX_SAVE_EVERY
+        if save:
+            try:
+                self.save_index()
+            except OSError:
+                pass
+        return thumbnail
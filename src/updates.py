@@ -0,0 +1,287 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+# Coalesced UI updates.
+#
+# Every control.update() or page.update() is a round trip to the Flet
+# client. Handlers and worker threads therefore only mark controls as
+# changed, or schedule a render function, and a background thread sends
+# everything marked since the last frame in one page.update() call, at
+# most max_fps times per second. An idle coalescer sends a mark at once,
+# so single clicks are not delayed; bursts are batched. Render functions
+# run once per frame however often they were scheduled, so progress
+# events from thousands of files cost a dict insert each, and the text
+# and bar are formatted only as often as they can be seen.
+#
+# The module does not import Flet: controls are anything the send
+# function accepts.
+
+DEFAULT_MAX_FPS = 20.0
+# Seconds of history the throughput is averaged over
+_RATE_WINDOW = 5.0
+# Throughput is not reported until it has been measured this long
+_MIN_RATE_SPAN = 0.5
+
+
+class UpdateStats(NamedTuple):
+    """
+    Work done by an UpdateCoalescer.
+
+    Attributes:
+        events (int): mark() and schedule() calls.
+        frames (int): Batches sent to the client.
+        controls (int): Controls sent, summed over all frames.
+        seconds (float): Wall time spent rendering and sending frames,
+                         including waits for the client and the GIL.
+        cpu_seconds (float): CPU time spent rendering and sending frames,
+                             the load the UI adds to conversions.
+        errors (int): Render functions or controls that failed.
+    """
+    events: int
+    frames: int
+    controls: int
+    seconds: float
+    cpu_seconds: float
+    errors: int
+
+    @property
+    def events_per_frame(self) -> float:
+        """
+        Average number of events coalesced into one frame.
+        """
+        return self.events / self.frames if self.frames else 0.0
+
+
+class UpdateCoalescer:
+    """
+    Batches UI updates from any thread and sends them at a capped frame rate.
+    """
+
+    def __init__(self, send: Callable[[Sequence[Any]], None], max_fps: float = DEFAULT_MAX_FPS):
+        """
+        Initialize the coalescer and start its frame thread.
+
+        Args:
+            send (Callable[[Sequence[Any]], None]): Sends changed controls to the
+                client in one round trip, e.g. lambda controls: page.update(*controls).
+            max_fps (float): Maximum frames sent per second.
+        """
+        self.send = send
+        self.interval = 1.0 / max_fps
+        self._lock = threading.Lock()
+        # Frames are rendered by the frame thread or flush(), never both at once
+        self._frame_lock = threading.Lock()
+        # id(control) -> control, in the order they were first marked
+        self._dirty: Dict[int, Any] = {}
+        self._renders: Dict[Callable[[], Iterable[Any]], None] = {}
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._last_frame = 0.0
+        self._events = 0
+        self._frames = 0
+        self._controls = 0
+        self._seconds = 0.0
+        self._cpu_seconds = 0.0
+        self._errors = 0
+        self._thread = threading.Thread(target=self._run, name="ui-updates", daemon=True)
+        self._thread.start()
+
+    def mark(self, *controls: Any) -> None:
+        """
+        Queues controls whose properties changed for the next frame.
+        """
+        with self._lock:
+            for control in controls:
+                self._dirty.setdefault(id(control), control)
+            self._events += 1
+        self._wake.set()
+
+    def schedule(self, render: Callable[[], Iterable[Any]]) -> None:
+        """
+        Runs a render function once before the next frame, however often it
+        is scheduled until then.
+
+        Args:
+            render (Callable[[], Iterable[Any]]): Sets control properties from the
+                current state and returns the controls it changed. Runs on the
+                frame thread.
+        """
+        with self._lock:
+            self._renders[render] = None
+            self._events += 1
+        self._wake.set()
+
+    def flush(self) -> None:
+        """
+        Renders and sends everything pending now, on the calling thread.
+        """
+        self._frame()
+
+    def stats(self) -> UpdateStats:
+        """
+        Returns the counters since the coalescer was created.
+        """
+        with self._lock:
+            return UpdateStats(
+                self._events, self._frames, self._controls, self._seconds, self._cpu_seconds, self._errors,
+            )
+
+    def close(self) -> None:
+        """
+        Stops the frame thread after sending what is pending.
+        """
+        self._closed.set()
+        self._wake.set()
+        self._thread.join()
+        self._frame()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            if self._closed.is_set():
+                return
+            # Leading edge: after an idle spell the frame goes out at once
+            delay = self._last_frame + self.interval - time.monotonic()
+            if delay > 0 and self._closed.wait(delay):
+                return
+            self._frame()
+
+    def _frame(self) -> None:
+        with self._frame_lock:
+            with self._lock:
+                self._wake.clear()
+                renders, self._renders = list(self._renders), {}
+                dirty, self._dirty = self._dirty, {}
+            if not renders and not dirty:
+                return
+            start = time.perf_counter()
+            cpu_start = time.thread_time()
+            errors = 0
+            for render in renders:
+                try:
+                    for control in render() or ():
+                        dirty.setdefault(id(control), control)
+                except Exception:
+                    errors += 1
+            controls = list(dirty.values())
+            if controls:
+                try:
+                    self.send(controls)
+                except Exception:
+                    # Usually a control removed from the page meanwhile;
+                    # send the others one by one so only that one is lost
+                    for control in controls:
+                        try:
+                            self.send([control])
+                        except Exception:
+                            errors += 1
+            self._last_frame = time.monotonic()
+            with self._lock:
+                self._frames += 1
+                self._controls += len(controls)
+                self._seconds += time.perf_counter() - start
+                self._cpu_seconds += time.thread_time() - cpu_start
+                self._errors += errors
+
+
+class ProgressSnapshot(NamedTuple):
+    """
+    Progress of a counted task at one moment.
+
+    Attributes:
+        done (int): Items finished, failed ones included.
+        total (int): Items in the task.
+        failed (int): Items that failed.
+        fraction (float): Fraction done, between 0 and 1.
+        per_second (Optional[float]): Recent throughput in items per second,
+                                      None until it has been measured.
+        eta (Optional[float]): Estimated seconds left, None while unknown.
+    """
+    done: int
+    total: int
+    failed: int
+    fraction: float
+    per_second: Optional[float]
+    eta: Optional[float]
+
+    def describe(self, unit: str = "files") -> str:
+        """
+        Formats the snapshot for a status line, e.g. "120/5000 files, 48.0/s, 1:41 left".
+        """
+        parts = [f"{self.done}/{self.total} {unit}"]
+        if self.failed:
+            parts.append(f"{self.failed} failed")
+        if self.per_second is not None:
+            parts.append(f"{self.per_second:.1f}/s")
+        if self.eta is not None and self.done < self.total:
+            parts.append(f"{format_duration(self.eta)} left")
+        return ", ".join(parts)
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Formats seconds as "m:ss", or "h:mm:ss" from one hour up.
+    """
+    minutes, secs = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+class ProgressModel:
+    """
+    Turns the counts of a running task into throughput and time left.
+
+    Counts are observed whenever the UI renders, not on every event, so
+    the cost does not grow with the event rate. Throughput is averaged
+    over the last few seconds, so the estimate follows changes in speed,
+    e.g. a run of large files, without jumping on every file.
+    """
+
+    def __init__(self, window: float = _RATE_WINDOW):
+        """
+        Initialize an empty model.
+
+        Args:
+            window (float): Seconds of history the throughput is averaged over.
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        # (monotonic time, done) samples, oldest first
+        self._samples: Deque[Tuple[float, int]] = deque()
+
+    def reset(self) -> None:
+        """
+        Forgets the history, e.g. when another task starts.
+        """
+        with self._lock:
+            self._samples.clear()
+
+    def observe(self, done: int, total: int, failed: int = 0, now: Optional[float] = None) -> ProgressSnapshot:
+        """
+        Records the current counts and returns the resulting snapshot.
+
+        Args:
+            done (int): Items finished so far, failed ones included.
+            total (int): Items in the task.
+            failed (int): Items that failed so far.
+            now (Optional[float]): time.monotonic() value of the observation.
+
+        Returns:
+            ProgressSnapshot: Counts, throughput and time left.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            samples = self._samples
+            if not samples or done != samples[-1][1]:
+                samples.append((now, done))
+            # Keep one sample older than the window, so the span covers all of it
+            while len(samples) > 2 and samples[1][0] <= now - self.window:
+                samples.popleft()
+            first_time, first_done = samples[0]
+        span = now - first_time
+        per_second = (done - first_done) / span if span >= _MIN_RATE_SPAN else None
+        eta = (total - done) / per_second if per_second else None
+        fraction = min(1.0, done / total) if total else 0.0
+        return ProgressSnapshot(done, total, failed, fraction, per_second, eta)
@@ -1,7 +1,56 @@
 import sys
 import os
+import time
+import hashlib
+import shutil
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from PIL import Image
-from typing import Tuple, Optional
+from .cache import ImageCache, cache_key
+from .frames import frame_count, save_frames
+from .icons import ICON_FORMATS, save_icon
+from .presets import encoder_options
+from .targetsize import TARGET_SIZE_FORMATS, save_to_size
+from .formats import ALPHA_MODES, FORMAT_CAPABILITIES, ConversionStep, plan_conversion
+from .metrics import ConversionMetrics, CountingReader, CountingWriter, StageRecorder, emit, has_hooks, peak_rss
+from typing import IO, Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+
+class BatchResult(NamedTuple):
+    """
+    Outcome of converting a single file as part of a batch.
+
+    Attributes:
+        source (str): Path of the input file.
+        output (Optional[str]): Path of the written file, or None if the conversion failed.
+        error (Optional[str]): Error message if the conversion failed, otherwise None.
+        seconds (float): Wall time spent on this file.
+        metrics (Optional[ConversionMetrics]): Per-stage measurements, if they were collected.
+        duplicate_of (Optional[str]): Source with identical content whose output was
+                                      linked or copied instead of converting this file.
+    """
+    source: str
+    output: Optional[str]
+    error: Optional[str]
+    seconds: float
+    metrics: Optional[ConversionMetrics] = None
+    duplicate_of: Optional[str] = None
+
+class DedupeReport(NamedTuple):
+    """
+    How much work content deduplication saved in a batch.
+
+    Attributes:
+        sources (int): Number of input files.
+        duplicates (int): Inputs that were byte-identical to an earlier input.
+        ratio (float): Fraction of inputs that were duplicates.
+        seconds_saved (float): Conversion time of the originals, minus the time
+                               spent linking or copying, over all duplicates.
+    """
+    sources: int
+    duplicates: int
+    ratio: float
+    seconds_saved: float
 
 def filename_format_separator(filename: str) -> Tuple[str, Optional[str]]:
     """
@@ -21,23 +70,884 @@ def filename_format_separator(filename: str) -> Tuple[str, Optional[str]]:
         name, ext = filename, None
     return name, ext
 
-def convert(name: str, ext: str, path: str) -> Image.Image:
+def convert(name: str, ext: str, path: Union[str, IO[bytes]]) -> Image.Image:
     """
-    Opens an image file and prepares it for conversion.
+    Opens an image file for conversion.
+
+    The image is returned in its source mode; mode changes depend on the
+    target format and happen in prepare_image() right before saving.
 
     Args:
         name (str): The name of the file.
         ext (str): The extension of the file.
-        path (str): The absolute path to the file.
+        path (Union[str, IO[bytes]]): The absolute path to the file, or an open binary file.
 
     Returns:
         Image.Image: The PIL Image object.
     """
-    img = Image.open(path)
-    if ext and ext.lower() in ["jpg", "jpeg"]:
-        img = img.convert("RGB")
+    return Image.open(path)
+
+def pillow_format(target_format: str) -> str:
+    """
+    Maps a target format from the UI list to the format name Pillow expects.
+
+    Args:
+        target_format (str): Target format, e.g. "JPG" or "PNM".
+
+    Returns:
+        str: Pillow format name, e.g. "JPEG" or "PPM".
+    """
+    caps = FORMAT_CAPABILITIES.get(target_format.upper())
+    if caps:
+        return caps.pillow_format
+    return Image.registered_extensions().get(f".{target_format.lower()}", target_format.upper())
+
+def readable_extensions() -> Set[str]:
+    """
+    Returns the lower case file extensions, with the dot, of formats Pillow can open.
+    Write-only formats such as PDF are registered too and are left out.
+    """
+    return {ext for ext, fmt in Image.registered_extensions().items() if fmt in Image.OPEN}
+
+def has_transparency(img: Image.Image) -> bool:
+    """
+    Checks whether an image without an alpha channel still carries transparency.
+
+    Args:
+        img (Image.Image): The image.
+
+    Returns:
+        bool: True for e.g. "P" images with a transparent palette index.
+    """
+    return img.mode not in ALPHA_MODES and "transparency" in img.info
+
+def conversion_plan(img: Image.Image, target_format: str) -> Tuple[ConversionStep, ...]:
+    """
+    Returns the conversion passes needed before img can be saved in the target format.
+
+    Args:
+        img (Image.Image): The source image.
+        target_format (str): Target format from the supported formats list.
+
+    Returns:
+        Tuple[ConversionStep, ...]: The passes; empty if img can be saved as is.
+    """
+    return plan_conversion(img.mode, target_format.upper(), has_transparency(img))
+
+def _convert_mode(img: Image.Image, mode: str) -> Image.Image:
+    """
+    Image.convert() that also handles LAB sources, which Pillow can only
+    convert through a color management transform.
+    """
+    if img.mode == "LAB" and mode != "LAB":
+        from PIL import ImageCms
+        transform = ImageCms.buildTransform(
+            ImageCms.createProfile("LAB"), ImageCms.createProfile("sRGB"), "LAB", "RGB"
+        )
+        img = ImageCms.applyTransform(img, transform)
+    return img if img.mode == mode else img.convert(mode)
+
+def fit_size(size: Tuple[int, int], max_size: int) -> Tuple[int, int]:
+    """
+    Scales a size down so that its longer side is at most max_size, keeping the aspect ratio.
+
+    Args:
+        size (Tuple[int, int]): Width and height.
+        max_size (int): Maximum width and height.
+
+    Returns:
+        Tuple[int, int]: The scaled size, or size itself if it already fits.
+    """
+    width, height = size
+    scale = max_size / max(width, height, 1)
+    if scale >= 1:
+        return size
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def load_reduced(img: Image.Image, max_size: int, reducing_gap: float = 2.0) -> Image.Image:
+    """
+    Decodes an opened image at reduced size so that it fits in max_size.
+
+    JPEG sources are decoded directly at 1/2, 1/4 or 1/8 scale from the DCT
+    coefficients (draft mode). The decoded pixels are then shrunk with a
+    cheap integer reduce() down to reducing_gap times the final size, and
+    a Lanczos resample produces the final size.
+
+    Args:
+        img (Image.Image): An opened image that has not been loaded yet.
+        max_size (int): Maximum width and height of the result.
+        reducing_gap (float): How much larger than the final size the fast
+                              stages may shrink to; higher is slower but sharper.
+
+    Returns:
+        Image.Image: The loaded image, img itself if it already fits.
+    """
+    size = fit_size(img.size, max_size)
+    if size == img.size:
+        img.load()
+        return img
+    box = None
+    drafted = img.draft(None, (int(size[0] * reducing_gap), int(size[1] * reducing_gap)))
+    if drafted:
+        box = drafted[1]
+    img.load()
+    # Pillow resizes palette and bilevel images with nearest neighbour only
+    if img.mode == "1":
+        img = img.convert("L")
+    elif img.mode in ("P", "PA"):
+        img = _convert_mode(img, "RGBA" if has_transparency(img) else "RGB")
+    return img.resize(size, Image.Resampling.LANCZOS, box=box, reducing_gap=reducing_gap)
+
+def apply_plan(
+    img: Image.Image,
+    plan: Sequence[ConversionStep],
+    max_colors: Optional[int] = None,
+    background: Tuple[int, int, int] = (255, 255, 255),
+) -> Image.Image:
+    """
+    Runs the passes of a conversion plan.
+
+    Args:
+        img (Image.Image): The source image.
+        plan (Sequence[ConversionStep]): Passes from conversion_plan().
+        max_colors (Optional[int]): Palette size for "quantize" passes.
+        background (Tuple[int, int, int]): Color transparent areas are flattened onto.
+
+    Returns:
+        Image.Image: The converted image, or img itself for an empty plan.
+    """
+    for step in plan:
+        if step.action == "flatten":
+            if img.mode not in ("LA", "RGBA"):
+                img = _convert_mode(img, "RGBA")
+            flat = Image.new(step.mode, img.size, background if step.mode == "RGB" else background[0])
+            # RGBA pastes straight onto RGB using its own alpha as the mask
+            flat.paste(img, (0, 0), img)
+            img = flat
+        elif step.action == "quantize":
+            alpha = img.mode in ALPHA_MODES
+            if img.mode not in ("L", "RGB", "RGBA"):
+                img = _convert_mode(img, "RGBA" if alpha else "RGB")
+            img = img.convert("P", palette=Image.Palette.ADAPTIVE, colors=max_colors or 256)
+            if alpha and img.palette and img.palette.mode == "RGBA":
+                for rgba, index in img.palette.colors.items():
+                    if rgba[3] == 0:
+                        img.info["transparency"] = index
+                        break
+        elif step.action == "reduce_depth":
+            # Floats are assumed to be normalized to 0..1, integers to 16 bits
+            low, high = img.getextrema()
+            if img.mode == "F":
+                scale = 255.0 if high <= 1.0 else 255.0 / high
+            else:
+                scale = 1.0 if high <= 255 else 255.0 / max(high, 65535)
+            if scale != 1.0:
+                img = img.point(lambda value: value * scale)
+            img = img.convert(step.mode)
+        else:
+            img = _convert_mode(img, step.mode)
     return img
 
+def prepare_image(
+    img: Image.Image,
+    target_format: str,
+    background: Tuple[int, int, int] = (255, 255, 255),
+) -> Image.Image:
+    """
+    Converts an image to a mode the target encoder accepts, with the fewest passes.
+
+    Args:
+        img (Image.Image): The source image.
+        target_format (str): Target format from the supported formats list.
+        background (Tuple[int, int, int]): Color transparent areas are flattened onto
+                                           when the target has no alpha.
+
+    Returns:
+        Image.Image: img itself if no conversion is needed, otherwise a converted copy.
+    """
+    caps = FORMAT_CAPABILITIES.get(target_format.upper())
+    if not caps:
+        return img
+    return apply_plan(img, conversion_plan(img, target_format), caps.max_colors, background)
+
+def save_image(img: Image.Image, path: str, target_format: str, preset: Optional[str] = None) -> None:
+    """
+    Saves an image to the given path in the target format, converting its
+    mode first if the encoder requires it.
+
+    Args:
+        img (Image.Image): The image to save.
+        path (str): Destination path.
+        target_format (str): Target format from the supported formats list.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+    """
+    prepared = prepare_image(img, target_format)
+    prepared.save(path, format=pillow_format(target_format), **encoder_options(target_format, preset, prepared.mode))
+
+def output_paths(paths: Iterable[str], target_format: str, out_dir: str) -> List[str]:
+    """
+    Builds one output path per input inside out_dir, avoiding name clashes
+    between inputs that only differ by extension (e.g. a.png and a.jpg).
+
+    Args:
+        paths (Iterable[str]): Input file paths.
+        target_format (str): Target format from the supported formats list.
+        out_dir (str): Output directory.
+
+    Returns:
+        List[str]: Output paths in the same order as the inputs.
+    """
+    taken: Set[str] = set()
+    return [os.path.join(out_dir, unique_output_name(os.path.basename(path), target_format, taken)) for path in paths]
+
+def unique_output_name(filename: str, target_format: str, taken: Set[str]) -> str:
+    """
+    Names the output of an input file, unlike any name in taken, and adds it to taken.
+
+    Args:
+        filename (str): Input file name, e.g. "a.png".
+        target_format (str): Target format from the supported formats list.
+        taken (Set[str]): Names already used.
+
+    Returns:
+        str: "a.webp", or "a_png.webp" / "a_1.webp" if that name is taken.
+    """
+    suffix = target_format.lower()
+    name, ext = filename_format_separator(filename)
+    candidate = f"{name}.{suffix}"
+    if candidate in taken and ext:
+        candidate = f"{name}_{ext.lower()}.{suffix}"
+    index = 1
+    while candidate in taken:
+        candidate = f"{name}_{index}.{suffix}"
+        index += 1
+    taken.add(candidate)
+    return candidate
+
+def kept_metadata(img: Image.Image) -> Dict[str, Any]:
+    """
+    Returns save() parameters carrying over source metadata that Pillow's
+    encoders do not take from img.info by themselves. The ICC profile is
+    picked up from img.info already; the resolution is not.
+
+    Args:
+        img (Image.Image): The image to be saved.
+
+    Returns:
+        Dict[str, Any]: Keyword arguments for Image.save().
+    """
+    dpi = img.info.get("dpi")
+    return {"dpi": dpi} if dpi else {}
+
+def shared_view(img: Image.Image) -> Image.Image:
+    """
+    Creates a new Image object backed by the same pixel buffer, without copying.
+
+    Image.save() stores encoder settings on the image object, so encoders
+    running concurrently each need their own object, but can share pixels.
+
+    Args:
+        img (Image.Image): A loaded image.
+
+    Returns:
+        Image.Image: A view sharing img's pixels and metadata.
+    """
+    img.load()
+    return img._new(img.im)
+
+def _stream_targets(
+    path: str,
+    targets: Sequence[Tuple[str, str]],
+    buffer_size: int,
+    icon_sizes: Optional[Sequence[int]] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> List[BatchResult]:
+    """
+    Converts each target with the memory-bounded streaming path, passing the
+    output options on to the targets that fall back to a full load.
+    """
+    from .streaming import stream_convert
+
+    results = []
+    for target_format, out_path in targets:
+        start = time.perf_counter()
+        try:
+            stream_convert(
+                path, target_format, out_path, buffer_size, icon_sizes=icon_sizes, target_size=target_size,
+                preset=preset,
+            )
+        except Exception as ex:
+            results.append(BatchResult(path, None, f"{type(ex).__name__}: {ex}", time.perf_counter() - start))
+        else:
+            results.append(BatchResult(path, out_path, None, time.perf_counter() - start))
+    return results
+
+def _close(img: Optional[Image.Image], source: Any) -> None:
+    """
+    Closes an opened image and the file object it was read from, if any.
+    """
+    if img:
+        img.close()
+    if source is not None and not isinstance(source, str):
+        source.close()
+
+def _source_name(path: Union[str, IO[bytes]]) -> str:
+    """
+    Returns the name a conversion source is reported under.
+    """
+    if isinstance(path, str):
+        return path
+    name = getattr(path, "name", None)
+    return name if isinstance(name, str) else "<stream>"
+
+def convert_targets(
+    path: Union[str, IO[bytes]],
+    targets: Sequence[Tuple[str, Union[str, IO[bytes]]]],
+    workers: int = 1,
+    buffer_size: Optional[int] = None,
+    collect_metrics: bool = False,
+    on_stage: Optional[Callable[[str], None]] = None,
+    cache: Optional[ImageCache] = None,
+    max_size: Optional[int] = None,
+    icon_sizes: Optional[Sequence[int]] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> List[BatchResult]:
+    """
+    Decodes a file once and encodes it to several target formats.
+    Never raises: failures are reported per target through BatchResult.
+
+    Targets with the same conversion plan share one converted pixel buffer.
+    With workers > 1 the encoders run concurrently on threads; Pillow
+    releases the GIL while encoding.
+
+    Args:
+        path (Union[str, IO[bytes]]): Input file path, or a seekable binary file
+            (e.g. an archive member read into memory), which is not closed.
+            Results report files by their name attribute.
+        targets (Sequence[Tuple[str, Union[str, IO[bytes]]]]): (target_format, out)
+            pairs, where out is a path or a seekable binary file to write to.
+        workers (int): Number of encoder threads.
+        buffer_size (Optional[int]): Memory budget for pixel data in bytes. Images
+            larger than this are converted in bands where the formats allow it;
+            only for inputs given by path.
+        collect_metrics (bool): Attach per-stage ConversionMetrics to the results.
+            The caller is responsible for passing them to metrics.emit().
+        on_stage (Optional[Callable[[str], None]]): Called with the stage name
+            ("open", "load", "convert", "encode") as each stage starts.
+        cache (Optional[ImageCache]): Decoded image cache. On a hit the open and
+            load stages are skipped; on a miss the decoded image is added.
+            Only used for inputs given by path.
+        max_size (Optional[int]): Downscale so that width and height are at most
+            this many pixels, decoding at reduced size where the codec allows it.
+        icon_sizes (Optional[Sequence[int]]): Entry sizes of ICO and ICNS targets,
+            by default the usual sizes of each format.
+        target_size (Optional[int]): File size budget in bytes of single-frame
+            JPEG and WEBP targets, which are written at the highest quality
+            that fits it. Targets that cannot fit fail.
+        preset (Optional[str]): Encoder preset from presets.PRESETS, None for the
+            encoder defaults. Images converted in bands under buffer_size keep
+            the band writers' settings.
+
+    Returns:
+        List[BatchResult]: One result per target, in the same order.
+    """
+    start = time.perf_counter()
+    recorder = StageRecorder(enabled=collect_metrics, on_stage=on_stage)
+    by_path = isinstance(path, str)
+    source = path
+    # Only files opened here are closed here
+    owned = None
+    source_name = _source_name(path)
+    if not by_path:
+        cache = None
+    img = None
+    # The opened multi-frame image, when some target keeps all frames
+    frames_source = None
+    # Memory map of an uncompressed source, when every target can use it
+    mapping = None
+    streaming = False
+    try:
+        key = cache_key(path, max_size) if cache else None
+        img = cache.get(key) if cache else None
+        if img is None:
+            if collect_metrics:
+                recorder.reader = source = CountingReader(open(path, "rb") if by_path else path)
+                owned = source if by_path else None
+            name, ext = filename_format_separator(os.path.basename(source_name))
+            with recorder.stage("open"):
+                img = convert(name, ext, source)
+            frames = frame_count(img)
+            animated = frames > 1 and any(FORMAT_CAPABILITIES[fmt.upper()].multi_frame for fmt, _ in targets)
+            if by_path and not max_size and frames == 1:
+                from .mapped import MappedSource, can_map
+
+                # The band writers have no tunable settings
+                if all(can_map(img, fmt) and not encoder_options(fmt, preset) for fmt, _ in targets):
+                    mapping = MappedSource(path, img)
+            streaming = by_path and bool(buffer_size) and not max_size and not animated and not mapping \
+                and img.width * img.height * 4 > buffer_size
+            if not streaming and not mapping:
+                with recorder.stage("load"):
+                    if max_size:
+                        opened, img = img, load_reduced(img, max_size)
+                        if animated:
+                            frames_source = opened
+                        elif img is not opened:
+                            opened.close()
+                    else:
+                        img.load()
+                        frames_source = img if animated else None
+                # Cached images are single frames, so only cache single-frame sources
+                if cache and frames == 1:
+                    cache.put(key, img)
+    except Exception as ex:
+        error = f"{type(ex).__name__}: {ex}"
+        size, mode = (img.size, img.mode) if img else ((0, 0), "")
+        if frames_source is not None and frames_source is not img:
+            frames_source.close()
+        if mapping:
+            mapping.close()
+        _close(img, owned)
+        return [
+            BatchResult(
+                source_name, None, error, time.perf_counter() - start,
+                recorder.result(source_name, fmt, size, mode, error, preset),
+            )
+            for fmt, _ in targets
+        ]
+    if streaming:
+        _close(img, owned)
+        return _stream_targets(path, targets, buffer_size, icon_sizes, target_size, preset)
+
+    prepared: Dict[Tuple[Tuple[ConversionStep, ...], Optional[int]], Image.Image] = {((), None): img}
+    lock = threading.Lock()
+
+    def convert_frame(frame: Image.Image, target_format: str) -> Image.Image:
+        if max_size:
+            frame = load_reduced(frame, max_size)
+        caps = FORMAT_CAPABILITIES[target_format.upper()]
+        return apply_plan(frame, conversion_plan(frame, target_format), caps.max_colors)
+
+    def encode(target_format: str, out_path: Union[str, IO[bytes]]) -> BatchResult:
+        encode_start = time.perf_counter()
+        target_recorder = recorder.fork()
+        try:
+            if frames_source is not None and FORMAT_CAPABILITIES[target_format.upper()].multi_frame:
+                # Each frame is decoded and converted while the encoder writes,
+                # so both are part of the encode stage
+                def save(out: Union[str, IO[bytes]]) -> None:
+                    save_frames(
+                        frames_source, out, pillow_format(target_format),
+                        lambda frame: convert_frame(frame, target_format),
+                        encoder_options(target_format, preset),
+                    )
+            elif mapping:
+                from .mapped import MAPPED_BAND_SIZE, write_mapped
+
+                # Bands are decoded and converted from the map while writing
+                def save(out: Union[str, IO[bytes]]) -> None:
+                    write_mapped(mapping, out, target_format, buffer_size or MAPPED_BAND_SIZE)
+            elif target_format.upper() in ICON_FORMATS:
+                # The icon sizes are resampled while the encoder writes them
+                view = shared_view(img)
+
+                def save(out: Union[str, IO[bytes]]) -> None:
+                    save_icon(view, out, target_format, icon_sizes)
+            else:
+                with target_recorder.stage("convert"):
+                    plan = conversion_plan(img, target_format)
+                    max_colors = FORMAT_CAPABILITIES[target_format.upper()].max_colors if plan else None
+                    with lock:
+                        if (plan, max_colors) not in prepared:
+                            prepared[plan, max_colors] = apply_plan(img, plan, max_colors)
+                view = shared_view(prepared[plan, max_colors])
+
+                if target_size and target_format.upper() in TARGET_SIZE_FORMATS:
+                    # Qualities are probed in memory; only the chosen encoding is written
+                    def save(out: Union[str, IO[bytes]]) -> None:
+                        save_to_size(
+                            view, out, target_format, target_size,
+                            encoder_options(target_format, preset) if preset else None,
+                        )
+                else:
+                    def save(out: Union[str, IO[bytes]]) -> None:
+                        view.save(
+                            out, format=pillow_format(target_format), **kept_metadata(view),
+                            **encoder_options(target_format, preset, view.mode),
+                        )
+            if collect_metrics and not isinstance(out_path, str):
+                writer = CountingWriter(out_path)
+                with target_recorder.stage("encode", writer):
+                    save(writer)
+            elif collect_metrics:
+                # Readable too: Pillow's multi-page TIFF writer reads back its IFDs
+                with open(out_path, "w+b") as fp:
+                    writer = CountingWriter(fp)
+                    with target_recorder.stage("encode", writer):
+                        save(writer)
+            else:
+                with target_recorder.stage("encode"):
+                    save(out_path)
+        except Exception as ex:
+            error = f"{type(ex).__name__}: {ex}"
+            metrics = target_recorder.result(source_name, target_format, img.size, img.mode, error, preset)
+            return BatchResult(source_name, None, error, time.perf_counter() - encode_start, metrics)
+        metrics = target_recorder.result(source_name, target_format, img.size, img.mode, preset=preset)
+        return BatchResult(source_name, _source_name(out_path), None, time.perf_counter() - encode_start, metrics)
+
+    # Multi-frame targets seek the source, which changes the first frame's
+    # pixels in place, so they run one by one after the single-frame targets
+    sequential = {
+        index for index, (target_format, _) in enumerate(targets)
+        if frames_source is not None and FORMAT_CAPABILITIES[target_format.upper()].multi_frame
+    }
+    shared = [index for index in range(len(targets)) if index not in sequential]
+    results: List[Optional[BatchResult]] = [None] * len(targets)
+    try:
+        if workers > 1 and len(shared) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for index, result in zip(shared, pool.map(lambda index: encode(*targets[index]), shared)):
+                    results[index] = result
+        else:
+            for index in shared:
+                results[index] = encode(*targets[index])
+        for index in sorted(sequential):
+            results[index] = encode(*targets[index])
+        return results
+    finally:
+        if frames_source is not None and frames_source is not img:
+            frames_source.close()
+        if mapping:
+            mapping.close()
+        _close(img, owned)
+
+def convert_file(
+    path: str,
+    target_format: str,
+    out_path: str,
+    max_size: Optional[int] = None,
+    icon_sizes: Optional[Sequence[int]] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> BatchResult:
+    """
+    Converts a single file and writes the result. Never raises: failures are
+    reported through the returned BatchResult so batches can keep going.
+
+    Args:
+        path (str): Input file path.
+        target_format (str): Target format from the supported formats list.
+        out_path (str): Destination path.
+        max_size (Optional[int]): Maximum width and height of the output.
+        icon_sizes (Optional[Sequence[int]]): Entry sizes of an ICO or ICNS output.
+        target_size (Optional[int]): File size budget in bytes of a JPEG or WEBP output.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+
+    Returns:
+        BatchResult: The outcome of the conversion.
+    """
+    return convert_targets(
+        path, [(target_format, out_path)], max_size=max_size, icon_sizes=icon_sizes, target_size=target_size,
+        preset=preset,
+    )[0]
+
+def convert_fanout(
+    path: str,
+    target_formats: Sequence[str],
+    out_dir: str,
+    workers: Optional[int] = None,
+    cache: Optional[ImageCache] = None,
+    max_size: Optional[int] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> List[BatchResult]:
+    """
+    Converts one file to several target formats, decoding it only once.
+
+    Args:
+        path (str): Input file path.
+        target_formats (Sequence[str]): Target formats from the supported formats list.
+        out_dir (str): Output directory, created if missing.
+        workers (Optional[int]): Number of encoder threads. Defaults to one per target.
+        cache (Optional[ImageCache]): Decoded image cache; a hit skips decoding entirely.
+        max_size (Optional[int]): Maximum width and height of the outputs.
+        target_size (Optional[int]): File size budget in bytes of JPEG and WEBP outputs.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+
+    Returns:
+        List[BatchResult]: One result per target format, in the same order.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    targets = [(fmt, output_paths([path], fmt, out_dir)[0]) for fmt in target_formats]
+    results = convert_targets(
+        path, targets, workers=workers or len(targets),
+        collect_metrics=has_hooks(), cache=cache, max_size=max_size, target_size=target_size,
+        preset=preset,
+    )
+    for result in results:
+        emit(result.metrics)
+    return results
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Hashes the content of a file, reading it in chunks.
+
+    Args:
+        path (str): File path.
+        chunk_size (int): Bytes read at a time.
+
+    Returns:
+        str: Hex digest of the content.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def find_duplicates(paths: Sequence[str], workers: Optional[int] = None) -> Dict[int, List[int]]:
+    """
+    Groups byte-identical files without decoding them.
+
+    Only files that share their size with another file are hashed, so
+    batches without duplicates cost one stat per file.
+
+    Args:
+        paths (Sequence[str]): File paths.
+        workers (Optional[int]): Number of hashing threads. hashlib releases
+                                 the GIL, so hashing overlaps with reading.
+
+    Returns:
+        Dict[int, List[int]]: Index of the first file of each duplicated content,
+                              mapped to the indexes of the later identical files.
+    """
+    by_size: Dict[int, List[int]] = {}
+    for index, path in enumerate(paths):
+        try:
+            by_size.setdefault(os.path.getsize(path), []).append(index)
+        except OSError:
+            # Reported by the conversion itself
+            continue
+    candidates = [index for group in by_size.values() if len(group) > 1 for index in group]
+    if not candidates:
+        return {}
+
+    def digest(index: int) -> Optional[str]:
+        try:
+            return file_digest(paths[index])
+        except OSError:
+            return None
+
+    first_by_digest: Dict[str, int] = {}
+    duplicates: Dict[int, List[int]] = {}
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        for index, content in zip(candidates, pool.map(digest, candidates)):
+            if content is None:
+                continue
+            if content in first_by_digest:
+                duplicates.setdefault(first_by_digest[content], []).append(index)
+            else:
+                first_by_digest[content] = index
+    return duplicates
+
+def _link_output(original: BatchResult, source: str, out_path: str, mode: str) -> BatchResult:
+    """
+    Produces a duplicate's output from the output of the original with the same content.
+
+    Args:
+        original (BatchResult): Result of converting the original.
+        source (str): The duplicate input path.
+        out_path (str): The duplicate's output path.
+        mode (str): "link" to hardlink, falling back to a copy, or "copy".
+
+    Returns:
+        BatchResult: The duplicate's result, marked with duplicate_of.
+    """
+    if original.error:
+        error = f"{original.error} (same content as {original.source})"
+        return BatchResult(source, None, error, 0.0, duplicate_of=original.source)
+    start = time.perf_counter()
+    try:
+        if mode == "link":
+            # Linked under a temporary name, as os.link() does not overwrite
+            temp_path = f"{out_path}.{os.getpid()}.tmp"
+            try:
+                os.link(original.output, temp_path)
+                os.replace(temp_path, out_path)
+            except OSError:
+                # No hardlinks on this file system or across devices
+                shutil.copyfile(original.output, out_path)
+        else:
+            shutil.copyfile(original.output, out_path)
+    except OSError as ex:
+        return BatchResult(source, None, f"{type(ex).__name__}: {ex}", time.perf_counter() - start, duplicate_of=original.source)
+    return BatchResult(source, out_path, None, time.perf_counter() - start, duplicate_of=original.source)
+
+def dedupe_report(results: Iterable[BatchResult]) -> DedupeReport:
+    """
+    Summarizes the duplicates found by convert_batch().
+
+    Args:
+        results (Iterable[BatchResult]): Results of a batch.
+
+    Returns:
+        DedupeReport: The summary.
+    """
+    results = list(results)
+    originals = {
+        (result.source, os.path.splitext(result.output)[1]): result.seconds
+        for result in results if result.output and not result.duplicate_of
+    }
+    sources = {result.source for result in results}
+    duplicates = {result.source for result in results if result.duplicate_of}
+    seconds_saved = sum(
+        originals.get((result.duplicate_of, os.path.splitext(result.output)[1]), 0.0) - result.seconds
+        for result in results if result.duplicate_of and result.output
+    )
+    return DedupeReport(len(sources), len(duplicates), len(duplicates) / len(sources) if sources else 0.0, seconds_saved)
+
+def convert_batch(
+    paths: Iterable[str],
+    target_format: Union[str, Sequence[str]],
+    out_dir: str,
+    workers: Optional[int] = None,
+    on_result: Optional[Callable[[BatchResult], None]] = None,
+    is_cancelled: Optional[Callable[[], bool]] = None,
+    buffer_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    dedupe: Optional[str] = "link",
+    icon_sizes: Optional[Sequence[int]] = None,
+    memory_budget: Optional[int] = None,
+    target_size: Optional[int] = None,
+    preset: Optional[str] = None,
+) -> List[BatchResult]:
+    """
+    Converts many files to one or more target formats using a pool of processes.
+
+    Decoding and encoding are CPU bound, so each file is handled in its own
+    worker process and the batch scales with the number of cores.
+    With several target formats each file is still decoded only once.
+    Byte-identical inputs are converted once; the outputs of the other
+    copies are hardlinked or copied from the first one's.
+    Files start only while the memory they are estimated to need, judged
+    from their headers, fits the memory budget; small files are packed in
+    beside large ones. Files that alone exceed the budget are rejected.
+    A failing file does not stop the batch.
+
+    Args:
+        paths (Iterable[str]): Input file paths.
+        target_format (Union[str, Sequence[str]]): Target format, or several.
+        out_dir (str): Output directory, created if missing.
+        workers (Optional[int]): Number of worker processes. Defaults to the CPU count.
+        on_result (Optional[Callable[[BatchResult], None]]): Called in the calling
+            process for each written output, in completion order.
+        is_cancelled (Optional[Callable[[], bool]]): Polled after each file; when it
+            returns True, files that have not started are skipped and those already
+            converting are finished and reported.
+        buffer_size (Optional[int]): Per-worker memory budget for pixel data in bytes.
+            Larger images are converted in bands where the formats allow it.
+        max_size (Optional[int]): Maximum width and height of the outputs.
+        dedupe (Optional[str]): How outputs of duplicate inputs are produced: "link"
+            (hardlink, or a copy where links are not possible), "copy", or None
+            to convert every input.
+        icon_sizes (Optional[Sequence[int]]): Entry sizes of ICO and ICNS outputs.
+        memory_budget (Optional[int]): Estimated pixel memory of the files converted
+            at once, in bytes. None for half of the physical memory, 0 for no limit.
+        target_size (Optional[int]): File size budget in bytes of JPEG and WEBP outputs.
+        preset (Optional[str]): Encoder preset, None for the encoder defaults.
+
+    Returns:
+        List[BatchResult]: One result per input and target format, in input order
+                           then format order. Skipped files are reported with a
+                           "Cancelled" error, files over the memory budget with a
+                           "Rejected" error. Outputs of duplicates have duplicate_of set.
+    """
+    from .scheduler import MemoryScheduler, default_memory_budget, estimate_jobs, rejection_message
+
+    paths = list(paths)
+    formats = [target_format] if isinstance(target_format, str) else list(target_format)
+    os.makedirs(out_dir, exist_ok=True)
+    out_paths = [output_paths(paths, fmt, out_dir) for fmt in formats]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths) or 1))
+    results: List[Optional[List[BatchResult]]] = [None] * len(paths)
+    # Hooks live in this process; workers only collect and send metrics back
+    collect_metrics = has_hooks()
+    duplicates = find_duplicates(paths) if dedupe else {}
+    skipped = {index for group in duplicates.values() for index in group}
+    budget = default_memory_budget() if memory_budget is None else memory_budget or None
+    scheduler = MemoryScheduler(budget, workers)
+
+    def finish(index: int, file_results: List[BatchResult]) -> None:
+        results[index] = file_results
+        for result in file_results:
+            emit(result.metrics)
+        for duplicate in duplicates.get(index, []):
+            results[duplicate] = [
+                _link_output(original, paths[duplicate], out[duplicate], dedupe)
+                for original, out in zip(file_results, out_paths)
+            ]
+        if on_result:
+            for position in [index, *duplicates.get(index, [])]:
+                for result in results[position]:
+                    on_result(result)
+
+    def collect(future: Future) -> None:
+        index = running.pop(future)
+        scheduler.done(index)
+        try:
+            file_results = future.result()
+        except Exception as ex:
+            # The worker process itself died (e.g. out of memory)
+            error = f"{type(ex).__name__}: {ex}"
+            file_results = [BatchResult(paths[index], None, error, 0.0) for _ in formats]
+        finish(index, file_results)
+
+    jobs = [index for index in range(len(paths)) if index not in skipped]
+    if budget:
+        estimates = estimate_jobs(
+            [paths[index] for index in jobs], formats, max_size, target_size=target_size, preset=preset,
+        )
+    else:
+        estimates = [0] * len(jobs)
+    for index, estimate in zip(jobs, estimates):
+        if not scheduler.add(index, estimate):
+            error = rejection_message(estimate, budget)
+            finish(index, [BatchResult(paths[index], None, error, 0.0) for _ in formats])
+
+    running: Dict[Future, int] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            for index in scheduler.ready():
+                future = pool.submit(
+                    convert_targets, paths[index], [(fmt, out[index]) for fmt, out in zip(formats, out_paths)],
+                    buffer_size=buffer_size, collect_metrics=collect_metrics, max_size=max_size,
+                    icon_sizes=icon_sizes, target_size=target_size, preset=preset,
+                )
+                running[future] = index
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                collect(future)
+            if is_cancelled and is_cancelled():
+                scheduler.cancel()
+                # Conversions already running cannot be stopped and write their
+                # outputs, so they are waited for and reported like any other;
+                # only those that never started count as cancelled
+                started = [future for future in running if not future.cancel()]
+                wait(started)
+                for future in started:
+                    collect(future)
+                break
+
+    return [
+        result
+        for path, file_results in zip(paths, results)
+        for result in (file_results or [BatchResult(path, None, "Cancelled", 0.0) for _ in formats])
+    ]
+
 def resource_path(*parts: str) -> str:
     """
         Creates an absolute path from a relative path or absolute path for both .py launch and .exe build.
@@ -0,0 +1,325 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .metrics import emit, has_hooks
+from .scheduler import MemoryScheduler, default_memory_budget, estimate_memory, rejection_message
+from .utils import BatchResult, convert_targets, readable_extensions
+
+# Hot folder mode: files dropped into watched folders are converted as soon
+# as they stop changing. Folders are polled with os.scandir(), which works
+# the same on every platform and needs one stat per file (free on Windows).
+
+MANIFEST_NAME = ".image-converter-manifest.json"
+
+
+class WatchStats(NamedTuple):
+    """
+    Counters of a FolderWatcher.
+
+    Attributes:
+        converted (int): Sources converted successfully.
+        failed (int): Sources that failed to convert.
+        pending (int): Sources waiting to settle or queued for conversion.
+        latencies (List[float]): Seconds from each source's last modification
+                                 to its outputs being written.
+    """
+    converted: int
+    failed: int
+    pending: int
+    latencies: List[float]
+
+
+class Manifest:
+    """
+    Persisted record of converted sources, so restarts skip files that were
+    already converted and have not changed since.
+    """
+
+    def __init__(self, path: str):
+        """
+        Loads the manifest, starting empty if it does not exist yet.
+
+        Args:
+            path (str): JSON file path.
+        """
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        self._dirty = False
+        try:
+            with open(path, encoding="utf-8") as fp:
+                self.entries = json.load(fp)
+        except (OSError, ValueError):
+            pass
+
+    def is_current(self, source: str, size: int, mtime_ns: int, formats: Sequence[str]) -> bool:
+        """
+        Whether source was handled in its current state: converted to all
+        formats, or failed (failures are retried once the file changes).
+        """
+        entry = self.entries.get(source)
+        return bool(entry) and entry["size"] == size and entry["mtime_ns"] == mtime_ns \
+            and (bool(entry.get("error")) or set(formats) <= set(entry["outputs"]))
+
+    def record(self, source: str, size: int, mtime_ns: int, outputs: Dict[str, str], error: Optional[str] = None) -> None:
+        """
+        Records a conversion; call save() to persist it.
+
+        Args:
+            source (str): Absolute source path.
+            size (int): Source size when it was converted.
+            mtime_ns (int): Source modification time when it was converted.
+            outputs (Dict[str, str]): Output path per target format.
+            error (Optional[str]): Error message if the conversion failed.
+        """
+        self.entries[source] = {"size": size, "mtime_ns": mtime_ns, "outputs": outputs}
+        if error:
+            self.entries[source]["error"] = error
+        self._dirty = True
+
+    def save(self) -> None:
+        """
+        Writes the manifest if it changed, replacing the file atomically.
+        """
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as fp:
+            json.dump(self.entries, fp)
+        os.replace(temp_path, self.path)
+        self._dirty = False
+
+
+class FolderWatcher:
+    """
+    Converts image files that appear or change in watched folders.
+
+    A file is converted once its size and modification time have not
+    changed for `settle` seconds, so files that are still being copied in
+    are not picked up half written. Conversions run on a process pool like
+    convert_batch(); the pool is kept filled, but not flooded, so bursts of
+    thousands of files are converted in arrival order.
+    """
+
+    def __init__(
+        self,
+        folders: Sequence[str],
+        target_formats: Sequence[str],
+        out_dir: str,
+        recursive: bool = False,
+        interval: float = 0.5,
+        settle: float = 1.0,
+        workers: Optional[int] = None,
+        manifest_path: Optional[str] = None,
+        max_size: Optional[int] = None,
+        icon_sizes: Optional[Sequence[int]] = None,
+        target_size: Optional[int] = None,
+        preset: Optional[str] = None,
+        memory_budget: Optional[int] = None,
+        on_result: Optional[Callable[[BatchResult], None]] = None,
+        extensions: Optional[Iterable[str]] = None,
+    ):
+        """
+        Initialize the watcher.
+
+        Args:
+            folders (Sequence[str]): Folders to watch.
+            target_formats (Sequence[str]): Target formats from the supported formats list.
+            out_dir (str): Output directory; subfolders of watched folders are mirrored.
+            recursive (bool): Also watch subfolders.
+            interval (float): Seconds between scans while idle.
+            settle (float): Seconds a file must stay unchanged before it is converted.
+            workers (Optional[int]): Number of worker processes. Defaults to the CPU count.
+            manifest_path (Optional[str]): Manifest file, by default inside out_dir.
+            max_size (Optional[int]): Maximum width and height of the outputs.
+            icon_sizes (Optional[Sequence[int]]): Entry sizes of ICO and ICNS outputs.
+            target_size (Optional[int]): File size budget in bytes of JPEG and WEBP outputs.
+            preset (Optional[str]): Encoder preset, None for the encoder defaults.
+            memory_budget (Optional[int]): Estimated pixel memory of the files converted
+                at once, in bytes. None for half of the physical memory, 0 for no limit.
+            on_result (Optional[Callable[[BatchResult], None]]): Called for each output.
+            extensions (Optional[Iterable[str]]): Lower case extensions to convert,
+                by default every extension Pillow can open.
+        """
+        if extensions is None:
+            extensions = readable_extensions()
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.target_formats = list(target_formats)
+        self.out_dir = os.path.abspath(out_dir)
+        self.recursive = recursive
+        self.interval = interval
+        self.settle = settle
+        self.workers = workers or os.cpu_count() or 1
+        self.max_size = max_size
+        self.icon_sizes = icon_sizes
+        self.target_size = target_size
+        self.preset = preset
+        self.on_result = on_result
+        self.extensions = set(extensions)
+        self.manifest = Manifest(manifest_path or os.path.join(self.out_dir, MANIFEST_NAME))
+        self.memory_budget = default_memory_budget() if memory_budget is None else memory_budget or None
+        # A few queued tasks per worker keep the pool busy, while files that
+        # land later are still picked up in order rather than after a backlog
+        self._scheduler = MemoryScheduler(self.memory_budget, self.workers * 2)
+        self._stop = threading.Event()
+        # path -> (size, mtime_ns) seen by the last scan
+        self._seen: Dict[str, Tuple[int, int]] = {}
+        # Settled files waiting for a free worker, in arrival order
+        self._queue: Dict[str, Tuple[int, int]] = {}
+        self._running: Dict[Future, Tuple[str, int, int]] = {}
+        # output path -> the source it belongs to
+        self._claimed: Dict[str, str] = {
+            output: source for source, entry in self.manifest.entries.items() for output in entry["outputs"].values()
+        }
+        self._saved_at = 0.0
+        self._converted = 0
+        self._failed = 0
+        self._latencies: List[float] = []
+
+    def stats(self) -> WatchStats:
+        """
+        Returns the current counters.
+        """
+        running = {path for path, _, _ in self._running.values()}
+        pending = len(self._queue) + len(running) + sum(
+            1 for path, state in self._seen.items()
+            if path not in self._queue and path not in running and path not in self._claimed
+            and not self.manifest.is_current(path, *state, self.target_formats)
+        )
+        return WatchStats(self._converted, self._failed, pending, list(self._latencies))
+
+    def stop(self) -> None:
+        """
+        Asks run() to return after the conversions in progress.
+        """
+        self._stop.set()
+
+    def run(self) -> None:
+        """
+        Watches and converts until stop() is called.
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        collect_metrics = has_hooks()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            next_scan = 0.0
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if now >= next_scan:
+                    self._scan()
+                    next_scan = now + self.interval
+                self._submit(pool, collect_metrics)
+                if self._running:
+                    done, _ = wait(self._running, timeout=max(0.0, next_scan - time.monotonic()), return_when=FIRST_COMPLETED)
+                    self._collect(done)
+                else:
+                    self._stop.wait(max(0.0, next_scan - time.monotonic()))
+            self._collect(wait(self._running).done)
+        self.manifest.save()
+
+    def _scan(self) -> None:
+        now = time.time()
+        current = dict(self._walk())
+        for path, state in current.items():
+            if path in self._claimed or path in self._queue or any(path == running[0] for running in self._running.values()):
+                continue
+            previous = self._seen.get(path)
+            settled = previous == state and now - state[1] / 1e9 >= self.settle
+            if settled and not self.manifest.is_current(path, *state, self.target_formats):
+                self._enqueue(path, state)
+        self._seen = current
+
+    def _enqueue(self, path: str, state: Tuple[int, int]) -> None:
+        try:
+            estimate = estimate_memory(
+                path, self.target_formats, self.max_size, self.target_size, self.preset,
+            ).bytes
+        except Exception:
+            # Unreadable headers fail early in the conversion itself
+            estimate = 0
+        if self._scheduler.add(path, estimate):
+            self._queue[path] = state
+            return
+        error = rejection_message(estimate, self.memory_budget)
+        self._failed += 1
+        self.manifest.record(path, *state, {}, error)
+        if self.on_result:
+            for _ in self.target_formats:
+                self.on_result(BatchResult(path, None, error, 0.0))
+
+    def _walk(self) -> Iterator[Tuple[str, Tuple[int, int]]]:
+        folders = list(self.folders)
+        while folders:
+            folder = folders.pop()
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive and entry.path != self.out_dir:
+                            folders.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in self.extensions:
+                        stat = entry.stat()
+                        yield entry.path, (stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    # Removed between listing and stat
+                    continue
+
+    def _output_path(self, path: str, target_format: str) -> str:
+        root = next(folder for folder in self.folders if path.startswith(folder + os.sep))
+        rel_dir = os.path.relpath(os.path.dirname(path), root)
+        stem, ext = os.path.splitext(os.path.basename(path))
+        out_dir = os.path.normpath(os.path.join(self.out_dir, rel_dir))
+        candidate = os.path.join(out_dir, f"{stem}.{target_format.lower()}")
+        owner = self._claimed.setdefault(candidate, path)
+        if owner != path:
+            # Another source with the same name, e.g. a.png and a.jpg
+            candidate = os.path.join(out_dir, f"{stem}_{ext.lstrip('.').lower()}.{target_format.lower()}")
+        return candidate
+
+    def _submit(self, pool: ProcessPoolExecutor, collect_metrics: bool) -> None:
+        for path in self._scheduler.ready():
+            size, mtime_ns = self._queue.pop(path)
+            targets = [(fmt, self._output_path(path, fmt)) for fmt in self.target_formats]
+            for _, out_path in targets:
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            future = pool.submit(
+                convert_targets, path, targets, collect_metrics=collect_metrics, max_size=self.max_size,
+                icon_sizes=self.icon_sizes, target_size=self.target_size, preset=self.preset,
+            )
+            self._running[future] = (path, size, mtime_ns)
+
+    def _collect(self, done: Iterable[Future]) -> None:
+        for future in done:
+            path, size, mtime_ns = self._running.pop(future)
+            self._scheduler.done(path)
+            try:
+                results = future.result()
+            except Exception as ex:
+                error = f"{type(ex).__name__}: {ex}"
+                results = [BatchResult(path, None, error, 0.0) for _ in self.target_formats]
+            for result in results:
+                emit(result.metrics)
+                if self.on_result:
+                    self.on_result(result)
+            if all(result.output for result in results):
+                self._converted += 1
+                self._latencies.append(time.time() - mtime_ns / 1e9)
+                self.manifest.record(
+                    path, size, mtime_ns,
+                    {fmt: result.output for fmt, result in zip(self.target_formats, results)},
+                )
+            else:
+                self._failed += 1
+                # Not retried until the file changes
+                error = next(result.error for result in results if result.error)
+                self.manifest.record(path, size, mtime_ns, {}, error)
+        # Bursts complete many files per second; one manifest write per second is enough
+        if time.monotonic() - self._saved_at >= 1.0:
+            self.manifest.save()
+            self._saved_at = time.monotonic()
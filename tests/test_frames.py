@@ -0,0 +1,31 @@
+import pytest
+from PIL import Image, ImageSequence
+
+from src.utils import convert_targets
+
+DURATIONS = [40, 80, 120, 60]
+
+
+@pytest.fixture
+def animation(tmp_path):
+    path = str(tmp_path / "source.gif")
+    frames = [Image.new("RGB", (32, 24), (index * 60, 255 - index * 60, 128)) for index in range(len(DURATIONS))]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=DURATIONS, loop=0)
+    return path
+
+
+@pytest.mark.parametrize("target_format", ["GIF", "PNG", "WEBP"])
+def test_animation_keeps_frames_and_durations(animation, target_format, tmp_path):
+    out_path = str(tmp_path / f"out.{target_format.lower()}")
+    result = convert_targets(animation, [(target_format, out_path)])[0]
+    assert result.error is None
+    with Image.open(animation) as source, Image.open(out_path) as out:
+        assert out.n_frames == len(DURATIONS)
+        for expected, frame in zip(ImageSequence.Iterator(source), ImageSequence.Iterator(out)):
+            # WEBP reports a frame's duration once it is loaded
+            frame.load()
+            assert frame.info["duration"] == expected.info["duration"]
+            # Flat colors survive every codec, lossy WEBP within a few levels
+            color = frame.convert("RGB").getpixel((16, 12))
+            assert color == pytest.approx(expected.convert("RGB").getpixel((16, 12)), abs=4)
+        assert out.info.get("loop") == 0
@@ -0,0 +1,51 @@
+import pytest
+from PIL import Image
+
+from src.benchmark import synthetic_image
+from src.icons import icon_pyramid, save_icon
+
+# ICO and ICNS files are read back with Pillow and every entry is compared
+# with the pyramid level it was written from.
+
+
+@pytest.fixture(params=["RGB", "RGBA"])
+def source(request):
+    # Not square, so entries are padded
+    return synthetic_image(300, 200, request.param, "photo")
+
+
+def test_icns_round_trip(source, tmp_path):
+    out_path = str(tmp_path / "out.icns")
+    sizes = [16, 32, 64, 128]
+    save_icon(source, out_path, "ICNS", sizes)
+    entries = {entry.width: entry for entry in icon_pyramid(source, sizes)}
+    with Image.open(out_path) as icon:
+        stored = icon.info["sizes"]
+    # The 32 and 64 pixel entries are also stored as 2x entries of 16 and 32
+    assert set(stored) == {(size, size, 1) for size in sizes} | {(16, 16, 2), (32, 32, 2)}
+    for width, height, scale in stored:
+        with Image.open(out_path) as icon:
+            icon.size = (width, height)
+            icon.load(scale=scale)
+            entry = entries[width * scale]
+            assert icon.size == entry.size
+            assert icon.mode == entry.mode
+            assert icon.tobytes() == entry.tobytes()
+
+
+def test_ico_round_trip(source, tmp_path):
+    out_path = str(tmp_path / "out.ico")
+    sizes = [16, 32, 48, 256]
+    save_icon(source, out_path, "ICO", sizes)
+    with Image.open(out_path) as icon:
+        assert icon.info["sizes"] == {(size, size) for size in sizes}
+        for entry in icon_pyramid(source, sizes):
+            stored = icon.ico.getimage(entry.size)
+            assert stored.size == entry.size
+            assert stored.convert(entry.mode).tobytes() == entry.tobytes()
+
+
+@pytest.mark.parametrize("target_format, sizes", [("ICO", [512]), ("ICNS", [20, 48])])
+def test_save_icon_rejects_unsupported_sizes(source, target_format, sizes, tmp_path):
+    with pytest.raises(ValueError, match=f"no valid {target_format} sizes"):
+        save_icon(source, str(tmp_path / "out.icon"), target_format, sizes)
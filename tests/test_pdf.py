@@ -0,0 +1,129 @@
+import io
+import re
+import zlib
+from typing import List, Tuple
+
+import pytest
+from PIL import Image, PdfParser
+
+from src.benchmark import synthetic_image
+from src.pdf import combine_pdf
+
+# PDFs from combine_pdf() are parsed with Pillow's PdfParser and every page
+# image is decoded again and compared with its source. Stream lengths are
+# indirect objects, which PdfParser cannot follow, so streams are sliced
+# out of the file here.
+
+
+def read_stream(data: bytes, pdf: PdfParser.PdfParser, reference: PdfParser.IndirectReference) -> Tuple[str, bytes]:
+    offset = pdf.xref_table[reference.object_id][0]
+    start = data.index(b"stream\n", offset) + len(b"stream\n")
+    dictionary = data[offset:start].decode("latin-1")
+    length = int(re.search(r"/Length (\d+) 0 R", dictionary).group(1))
+    size = pdf.read_indirect(PdfParser.IndirectReference(length, 0))
+    return dictionary, data[start:start + size]
+
+
+def decode_image(data: bytes, pdf: PdfParser.PdfParser, reference: PdfParser.IndirectReference) -> Image.Image:
+    dictionary, stream = read_stream(data, pdf, reference)
+    size = tuple(int(re.search(rf"/{name} (\d+)", dictionary).group(1)) for name in ("Width", "Height"))
+    indexed = re.search(r"/Indexed /DeviceRGB \d+ <([0-9a-f]*)>", dictionary)
+    if "/DCTDecode" in dictionary:
+        img = Image.open(io.BytesIO(stream))
+    elif "/BitsPerComponent 1" in dictionary:
+        img = Image.frombytes("1", size, zlib.decompress(stream))
+    else:
+        mode = "P" if indexed else "RGB" if "/DeviceRGB" in dictionary else "L"
+        # PNG predictors: rows are prefixed with their filter type, as in a PNG file
+        img = Image.frombytes(mode, size, stream, "zip", mode)
+        if indexed:
+            img.putpalette(bytes.fromhex(indexed.group(1)))
+    mask = re.search(r"/SMask (\d+) 0 R", dictionary)
+    if mask:
+        alpha = decode_image(data, pdf, PdfParser.IndirectReference(int(mask.group(1)), 0))
+        img = img.convert("RGBA")
+        img.putalpha(alpha)
+    return img
+
+
+def read_pages(path: str) -> List[Tuple[List[float], Image.Image]]:
+    with open(path, "rb") as fp:
+        data = fp.read()
+    pdf = PdfParser.PdfParser(buf=data)
+    pages = []
+    for reference in pdf.pages:
+        page = pdf.read_indirect(reference)
+        image = page[b"Resources"][b"XObject"][b"Im0"]
+        pages.append((list(page[b"MediaBox"]), decode_image(data, pdf, image)))
+    return pages
+
+
+def jpeg_round_trip(img: Image.Image) -> Image.Image:
+    out = io.BytesIO()
+    img.save(out, format="JPEG")
+    return Image.open(out)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    # Embedded as stored: 8 bit PNG and JPEG. Re-encoded: the rest.
+    files = [
+        ("gray.png", synthetic_image(64, 48, "L", "photo"), {}),
+        ("rgb.png", synthetic_image(64, 48, "RGB", "photo"), {"dpi": (144, 144)}),
+        ("palette.png", synthetic_image(64, 48, "P", "flat"), {}),
+        ("photo.jpg", synthetic_image(64, 48, "RGB", "photo"), {}),
+        ("bilevel.tif", synthetic_image(64, 48, "1", "flat"), {}),
+        ("alpha.png", synthetic_image(64, 48, "RGBA", "photo"), {}),
+        ("cmyk.tif", synthetic_image(64, 48, "RGB", "photo").convert("CMYK"), {}),
+    ]
+    paths = []
+    for name, img, options in files:
+        path = str(tmp_path / name)
+        img.save(path, **options)
+        paths.append(path)
+    return paths
+
+
+def test_combine_pdf_round_trip(sources, tmp_path):
+    out_path = str(tmp_path / "out.pdf")
+    result = combine_pdf(sources, out_path)
+    assert result.pages == len(sources)
+    assert result.embedded == 4
+    assert result.errors == []
+
+    pages = read_pages(out_path)
+    assert len(pages) == len(sources)
+    for path, (media_box, page) in zip(sources, pages):
+        with Image.open(path) as source:
+            source.load()
+            dpi = source.info.get("dpi", (72, 72))
+            if min(dpi) < 10:
+                # TIFFs saved without a resolution read back as 1 dpi
+                dpi = (72, 72)
+            # Written to four decimals
+            expected_box = [0, 0, source.width * 72 / dpi[0], source.height * 72 / dpi[1]]
+            assert media_box == pytest.approx(expected_box, abs=1e-4)
+            # JPEG files, PNG data and palette and bilevel pages are lossless
+            expected = source
+            if source.mode == "CMYK":
+                expected = jpeg_round_trip(source)
+            elif source.mode == "RGBA":
+                # JPEG encoded color, with the alpha channel as a Flate mask
+                expected = jpeg_round_trip(source.convert("RGB")).convert("RGBA")
+                expected.putalpha(source.getchannel("A"))
+            assert page.mode == expected.mode
+            assert page.size == expected.size
+            assert page.tobytes() == expected.tobytes()
+            if page.mode == "P":
+                assert page.getpalette() == expected.getpalette()
+
+
+def test_combine_pdf_skips_unreadable_inputs(sources, tmp_path):
+    broken = str(tmp_path / "broken.png")
+    with open(broken, "wb") as fp:
+        fp.write(b"not an image")
+    out_path = str(tmp_path / "out.pdf")
+    result = combine_pdf([broken] + sources[:2], out_path)
+    assert result.pages == 2
+    assert [path for path, _ in result.errors] == [broken]
+    assert len(read_pages(out_path)) == 2
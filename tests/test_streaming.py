@@ -0,0 +1,116 @@
+import io
+import os
+
+import pytest
+from PIL import Image, ImageCms
+
+from src.benchmark import synthetic_image
+from src.mapped import MappedSource, can_map, write_mapped
+from src.streaming import can_stream, stream_convert
+from src.utils import apply_plan, conversion_plan, kept_metadata, pillow_format
+
+# The band writers of the streaming and mapped paths against Pillow: each
+# output is read back with Pillow and compared with the source converted
+# and written by Image.save(), as the full-load path does.
+
+MODES = ("RGB", "L", "RGBA", "P", "1", "I;16")
+FORMATS = ("PNG", "TIFF", "BMP", "PPM")
+# Small enough for several bands at the test image size
+BAND_SIZE = 40000
+# Conversions that need the whole image (quantizing, reducing the depth)
+# or a mode the band writer does not store
+WHOLE_IMAGE = {("P", "TIFF"), ("I;16", "BMP"), ("I;16", "PPM")}
+BAND_CASES = [(mode, fmt) for mode in MODES for fmt in FORMATS if (mode, fmt) not in WHOLE_IMAGE]
+
+ICC_PROFILE = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+
+
+def make_source(tmp_path, mode: str) -> str:
+    path = str(tmp_path / "source.tif")
+    synthetic_image(300, 257, mode, "photo").save(path, dpi=(300, 300), icc_profile=ICC_PROFILE)
+    return path
+
+
+def expected_image(path: str, target_format: str) -> Image.Image:
+    with Image.open(path) as img:
+        img.load()
+        return apply_plan(img, conversion_plan(img, target_format))
+
+
+def assert_same_image(out_path: str, expected: Image.Image, target_format: str) -> None:
+    saved = io.BytesIO()
+    expected.save(saved, format=pillow_format(target_format), **kept_metadata(expected))
+    with Image.open(out_path) as out, Image.open(saved) as reference:
+        out.load()
+        reference.load()
+        assert out.mode == reference.mode
+        assert out.size == reference.size
+        assert out.tobytes() == reference.tobytes()
+        if out.mode == "P":
+            assert out.getpalette() == reference.getpalette()
+        assert out.info.get("icc_profile") == reference.info.get("icc_profile")
+        assert out.info.get("dpi") == pytest.approx(reference.info.get("dpi"))
+
+
+@pytest.mark.parametrize("mode, target_format", BAND_CASES)
+def test_stream_convert_matches_pillow(mode, target_format, tmp_path):
+    source = make_source(tmp_path, mode)
+    out_path = str(tmp_path / f"out.{target_format.lower()}")
+    result = stream_convert(source, target_format, out_path, buffer_size=BAND_SIZE)
+    assert result.streamed
+    assert result.bands > 1
+    assert_same_image(out_path, expected_image(source, target_format), target_format)
+
+
+@pytest.mark.parametrize("mode, target_format", BAND_CASES)
+def test_write_mapped_matches_pillow(mode, target_format, tmp_path):
+    source = make_source(tmp_path, mode)
+    out_path = str(tmp_path / f"out.{target_format.lower()}")
+    with Image.open(source) as img:
+        assert can_map(img, target_format)
+        with MappedSource(source, img) as mapping:
+            write_mapped(mapping, out_path, target_format, band_size=BAND_SIZE)
+    assert_same_image(out_path, expected_image(source, target_format), target_format)
+
+
+@pytest.mark.parametrize("mode, target_format", sorted(WHOLE_IMAGE))
+def test_stream_convert_loads_whole_image(mode, target_format, tmp_path):
+    source = make_source(tmp_path, mode)
+    out_path = str(tmp_path / f"out.{target_format.lower()}")
+    with Image.open(source) as img:
+        assert not can_stream(img, target_format)
+    assert not stream_convert(source, target_format, out_path, buffer_size=BAND_SIZE).streamed
+    assert_same_image(out_path, expected_image(source, target_format), target_format)
+
+
+def test_png_writer_matches_pillow_size(tmp_path):
+    # Same row filters and zlib settings as Image.save()
+    path = str(tmp_path / "source.ppm")
+    synthetic_image(300, 257, "RGB", "photo").save(path)
+    streamed, saved = str(tmp_path / "streamed.png"), str(tmp_path / "saved.png")
+    stream_convert(path, "PNG", streamed, buffer_size=BAND_SIZE)
+    with Image.open(path) as img:
+        img.save(saved)
+    assert os.path.getsize(streamed) == os.path.getsize(saved)
+
+
+def test_stream_convert_falls_back_with_output_options(tmp_path):
+    path = str(tmp_path / "source.ppm")
+    synthetic_image(300, 257, "RGB", "photo").save(path)
+    with Image.open(path) as img:
+        assert not can_stream(img, "JPEG")
+
+    jpeg_path = str(tmp_path / "out.jpeg")
+    result = stream_convert(path, "JPEG", jpeg_path, buffer_size=BAND_SIZE, target_size=8 * 1024)
+    assert not result.streamed
+    assert os.path.getsize(jpeg_path) <= 8 * 1024
+
+    ico_path = str(tmp_path / "out.ico")
+    stream_convert(path, "ICO", ico_path, buffer_size=BAND_SIZE, icon_sizes=[16, 32])
+    with Image.open(ico_path) as icon:
+        assert icon.info["sizes"] == {(16, 16), (32, 32)}
+
+    # A preset that tunes the encoder is applied by the full-load path
+    png_path = str(tmp_path / "out.png")
+    assert not stream_convert(path, "PNG", png_path, buffer_size=BAND_SIZE, preset="smallest").streamed
+    assert_same_image(png_path, expected_image(path, "PNG"), "PNG")
@@ -0,0 +1,61 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from src.benchmark import synthetic_image
+from src.targetsize import encode_to_size, save_to_size
+from src.utils import convert_targets
+
+BUDGET = 12 * 1024
+
+
+@pytest.fixture(scope="module")
+def photo():
+    return synthetic_image(320, 240, "RGB", "photo")
+
+
+def encoded_size(img: Image.Image, target_format: str, quality: int, **options) -> int:
+    out = io.BytesIO()
+    img.save(out, format=target_format, quality=quality, **options)
+    return out.tell()
+
+
+@pytest.mark.parametrize("target_format, options, highest", [
+    ("JPEG", {"optimize": True}, 95),
+    ("WEBP", {"method": 4}, 100),
+])
+def test_encode_to_size_picks_highest_fitting_quality(photo, target_format, options, highest):
+    result = encode_to_size(photo, target_format, BUDGET)
+    assert result.fits
+    assert len(result.data) <= BUDGET
+    assert len(result.data) == encoded_size(photo, target_format, result.quality, **options)
+    if result.quality < highest:
+        assert encoded_size(photo, target_format, result.quality + 1, **options) > BUDGET
+    with Image.open(io.BytesIO(result.data)) as img:
+        assert img.format == target_format
+        assert img.size == photo.size
+
+
+def test_save_to_size_writes_nothing_when_nothing_fits(photo, tmp_path):
+    out_path = str(tmp_path / "out.jpeg")
+    with pytest.raises(ValueError, match="cannot fit JPEG"):
+        save_to_size(photo, out_path, "JPEG", 100)
+    assert not os.path.exists(out_path)
+
+
+def test_convert_targets_with_target_size_and_preset(photo, tmp_path):
+    source = str(tmp_path / "source.png")
+    photo.save(source)
+    targets = [(fmt, str(tmp_path / f"out.{fmt.lower()}")) for fmt in ("JPEG", "WEBP", "PNG")]
+    results = convert_targets(source, targets, target_size=BUDGET, preset="smallest")
+    assert [result.error for result in results] == [None, None, None]
+    for fmt, out_path in targets[:2]:
+        assert os.path.getsize(out_path) <= BUDGET
+    # The preset's encoder parameters are used for the probes
+    with Image.open(targets[0][1]) as jpeg:
+        assert jpeg.info.get("progressive")
+    # Formats without a quality setting ignore the size budget
+    with Image.open(targets[2][1]) as png:
+        assert png.tobytes() == photo.tobytes()